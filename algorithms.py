@@ -1,113 +1,825 @@
+import io
 import os
 import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image
-from models import CompressionResult
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from PIL import ExifTags, Image, JpegImagePlugin, PngImagePlugin, WebPImagePlugin, features
+from models import CompressionResult, CompressionTimings
+from profiling import MemoryTracker, StageTimer
+
+# Only JPEG, PNG and WebP are read and written (batch.IMAGE_EXTENSIONS). They are imported above;
+# marking Pillow as initialized keeps Image.open/save from importing its other ~40 format plugins
+# (WebP is not among the preinit plugins, so every WebP file would trigger that otherwise).
+IMAGE_PLUGINS = (JpegImagePlugin, PngImagePlugin, WebPImagePlugin)
+Image._initialized = max(Image._initialized, 2)
+
+BYTES_PER_MB = 1024 * 1024
+
+# JPEG draft decode keeps this much extra resolution for the final Lanczos pass
+DRAFT_GAP = 2.0
+# Resize with integer reduce() first while the image is this many times larger than the target
+RESIZE_REDUCING_GAP = 3.0
+
+# Output rows per strip in the low-memory resize path
+STRIP_ROWS = 256
+
+# Encoder effort presets: speed vs. output size (numbers in README, "Effort presets").
+# max is the default and keeps the slowest, smallest settings.
+# png_search: try several PNG strategies (optimize_png) instead of one encode;
+# every zlib level and quantizer listed is tried, the first ones are the single-encode choice.
+EFFORT_PRESETS = {
+    "fast": {"jpeg_optimize": False, "jpeg_progressive": False, "webp_method": 0,
+             "png_levels": (1,), "png_quantizers": (Image.Quantize.FASTOCTREE,), "png_search": False},
+    "balanced": {"jpeg_optimize": True, "jpeg_progressive": False, "webp_method": 4,
+                 "png_levels": (6,), "png_quantizers": (Image.Quantize.FASTOCTREE,), "png_search": True},
+    "max": {"jpeg_optimize": True, "jpeg_progressive": True, "webp_method": 6,
+            "png_levels": (9, 6), "png_quantizers": (Image.Quantize.FASTOCTREE,), "png_search": True},
+}
+DEFAULT_EFFORT = "max"
+
+# libimagequant gives better palettes per byte, but is an optional Pillow build feature
+if features.check("libimagequant"):
+    EFFORT_PRESETS["max"]["png_quantizers"] = (Image.Quantize.LIBIMAGEQUANT,) + EFFORT_PRESETS["max"]["png_quantizers"]
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+# Output format chosen per image: the smallest of AUTO_CANDIDATES (encode_auto).
+# JPEG comes first: its size bounds the slower PNG search and the WebP probe early.
+AUTO_FORMAT = "AUTO"
+AUTO_CANDIDATES = ("JPEG", "PNG", "WEBP")
+# libwebp returns its output at once, so a slow WebP encode can't be cut off midway.
+# It is skipped when a method=0 probe is this many times larger than the best finished
+# candidate: higher methods saved at most ~45% over method 0 in our measurements.
+AUTO_WEBP_PROBE_MARGIN = 2.0
+# Retry quality when a lossy re-encode came out larger than the source (compress_image)
+FAILSAFE_QUALITY = {"JPEG": 85, "JPG": 85, "WEBP": 80}
+# JPEG writes these modes after prepare_for_format; WebP converts anything to RGB(A),
+# but clamps deeper-than-8-bit modes to white, so AUTO keeps those in PNG
+_JPEG_MODES = ("1", "L", "RGB", "RGBX", "CMYK", "YCbCr", "RGBA", "P", "LA", "PA")
+_HIGH_DEPTH_MODES = ("I", "I;16", "I;16B", "I;16L", "F")
+_EXTENSION_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+# Metadata policies (compress_image):
+# strip  - nothing is written, pixels stay as stored
+# icc    - only the ICC profile is kept
+# orient - EXIF orientation is applied to the pixels, the ICC profile is kept, EXIF is dropped
+METADATA_POLICIES = ("strip", "icc", "orient")
+DEFAULT_METADATA = "orient"
+# img.info entries that end up in the output file as metadata blocks
+_METADATA_KEYS = ("exif", "icc_profile", "xmp", "XML:com.adobe.xmp", "comment")
+# Metadata in a JPEG header that icc and orient don't write: such a source is never passed through.
+# "photoshop" holds IPTC blocks (APP13), which no policy keeps.
+_DROPPED_METADATA_KEYS = tuple(key for key in _METADATA_KEYS if key != "icc_profile") + ("photoshop",)
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT, 3: Image.Transpose.ROTATE_180, 4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE, 6: Image.Transpose.ROTATE_270, 7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Base JPEG quantization tables (ITU-T T.81, Annex K), natural order like img.quantization.
+# libjpeg and most encoders scale these by the quality setting.
+_JPEG_BASE_TABLES = (
+    [16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+     14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+     18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+     49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99],
+    [17, 18, 24, 47, 99, 99, 99, 99, 18, 21, 26, 66, 99, 99, 99, 99,
+     24, 26, 56, 99, 99, 99, 99, 99, 47, 66, 99, 99, 99, 99, 99, 99] + [99] * 32,
+)
+
+# What compress_image does with the source (plan_source):
+# reencode    - normal encode at the requested quality
+# capped      - JPEG source saved at a lower quality: re-encoded at the source quality
+# passthrough - JPEG source already at or below the requested quality: copied unchanged
+SOURCE_ACTIONS = ("reencode", "capped", "passthrough")
+
+# Pillow stores every multi-band mode with 4 bytes per pixel
+_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "I;16L": 2}
+
+# Modes the PNG encoder writes as they are; everything else is converted to RGB(A)
+PNG_MODES = ("1", "L", "LA", "I", "I;16", "P", "RGB", "RGBA")
+
+# mkstemp creates files as 0600; outputs should get normal umask permissions
+_UMASK = os.umask(0)
+os.umask(_UMASK)
 
 def get_size_mb(path: str) -> float:
-    return os.path.getsize(path) / (1024 * 1024)
+    return os.path.getsize(path) / BYTES_PER_MB
+
+def format_from_path(path: str) -> str:
+    fmt = os.path.splitext(path)[1].lstrip(".").upper()
+    return "JPEG" if fmt == "JPG" else fmt
+
+def with_format_extension(path: str, output_format: Optional[str]) -> str:
+    """
+    Swaps the extension to match output_format (keeps .jpeg for JPEG).
+    AUTO keeps the path: compress_image swaps it once the format is chosen.
+    """
+    if not output_format or output_format.upper() == AUTO_FORMAT or format_from_path(path) == output_format.upper():
+        return path
+    return os.path.splitext(path)[0] + FORMAT_EXTENSIONS[output_format.upper()]
+
+def pixel_bytes(mode: str) -> int:
+    return _PIXEL_BYTES.get(mode, 4)
+
+def image_bytes(img: Image.Image) -> int:
+    """Size of the decoded pixel buffer Pillow holds for the image."""
+    return img.width * img.height * pixel_bytes(img.mode)
+
+def encode_to_bytes(img: Image.Image, **save_params) -> bytes:
+    """Encodes the image into an in-memory buffer instead of a file."""
+    buffer = io.BytesIO()
+    img.save(buffer, **save_params)
+    return buffer.getvalue()
+
+class _EncodeCutoff(Exception):
+    """Raised by _BoundedBuffer once an encode has outgrown its limit."""
+
+class _BoundedBuffer(io.BytesIO):
+    """In-memory output that aborts the encoder as soon as it grows past limit()."""
+
+    def __init__(self, limit: Callable[[], Optional[int]]):
+        super().__init__()
+        self._limit = limit
+
+    def write(self, data) -> int:
+        limit = self._limit()
+        if limit is not None and self.tell() + len(data) > limit:
+            raise _EncodeCutoff()
+        return super().write(data)
+
+class _BestSize:
+    """Smallest finished encode so far; shared by encodes racing in threads."""
+
+    def __init__(self):
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[int]:
+        return self._size
+
+    def offer(self, size: int):
+        with self._lock:
+            if self._size is None or size < self._size:
+                self._size = size
+
+def encode_bounded(img: Image.Image, limit: Callable[[], Optional[int]], **save_params) -> Optional[bytes]:
+    """
+    Like encode_to_bytes, but returns None as soon as the output exceeds limit().
+    Streaming encoders (PNG) stop after the chunk that crossed the limit;
+    JPEG and WebP hand over their output at the end and are only dropped then.
+    """
+    buffer = _BoundedBuffer(limit)
+    try:
+        img.save(buffer, **save_params)
+    except _EncodeCutoff:
+        return None
+    return buffer.getvalue()
+
+def _atomic_replace(output_path: str, write_tmp) -> None:
+    """
+    Writes through a temp file in the output folder and swaps it in with os.replace,
+    so a crash never leaves a half-written output behind.
+    """
+    folder = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+    try:
+        os.close(fd)
+        write_tmp(tmp_path)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def write_bytes_atomic(output_path: str, data: bytes) -> None:
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+    _atomic_replace(output_path, write)
+
+def copy_file_atomic(input_path: str, output_path: str) -> None:
+    _atomic_replace(output_path, lambda tmp_path: shutil.copy2(input_path, tmp_path))
+
+def link_or_copy_atomic(input_path: str, output_path: str) -> bool:
+    """Hardlinks input_path as output_path, or copies it where links are not possible. True if linked."""
+    def link(tmp_path):
+        os.unlink(tmp_path)
+        os.link(input_path, tmp_path)
+    try:
+        _atomic_replace(output_path, link)
+        return True
+    except OSError:
+        # Other filesystem, or links are not supported (FAT, some network shares)
+        copy_file_atomic(input_path, output_path)
+        return False
+
+def target_size(size: Tuple[int, int], resize_ratio: float) -> Tuple[int, int]:
+    return max(1, int(size[0] * resize_ratio)), max(1, int(size[1] * resize_ratio))
+
+def draft_for_ratio(img: Image.Image, resize_ratio: float, original_size: Tuple[int, int]):
+    """
+    JPEG декодируется сразу в уменьшенном виде (DCT scaling через draft).
+    Работает только до img.load(); после загрузки ничего не делает.
+    """
+    if img.format == "JPEG":
+        target = target_size(original_size, resize_ratio)
+        img.draft(img.mode, (int(target[0] * DRAFT_GAP), int(target[1] * DRAFT_GAP)))
+
+def resize_for_ratio(img: Image.Image, resize_ratio: float) -> Image.Image:
+    """
+    Уменьшает изображение в resize_ratio раз.
+    JPEG декодируется сразу в уменьшенном виде (draft), крупные шаги
+    делает reduce() (reducing_gap), финальный точный размер - Lanczos.
+    """
+    original_size = img.size
+    draft_for_ratio(img, resize_ratio, original_size)
+    return img.resize(target_size(original_size, resize_ratio), Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+
+def resize_in_strips(img: Image.Image, size: Tuple[int, int], strip_rows: int = STRIP_ROWS) -> Image.Image:
+    """
+    Lanczos-ресайз полосами выходного изображения: кроме исходника и результата
+    в памяти только одна полоса. box= заставляет Pillow брать пиксели и за границей
+    полосы, поэтому швов нет (отличие от цельного resize - не больше 1 уровня).
+    """
+    result = Image.new(img.mode, size)
+    scale_y = img.height / size[1]
+    for top in range(0, size[1], strip_rows):
+        bottom = min(size[1], top + strip_rows)
+        strip = img.resize(
+            (size[0], bottom - top), Image.Resampling.LANCZOS,
+            box=(0, top * scale_y, img.width, bottom * scale_y)
+        )
+        result.paste(strip, (0, top))
+    return result
+
+def metadata_bytes(info: Dict[str, Any]) -> int:
+    """Size of the metadata blocks (EXIF, ICC, XMP, comment) in an img.info dict."""
+    return sum(len(info[key]) for key in _METADATA_KEYS if isinstance(info.get(key), (bytes, str)))
+
+def _to_srgb(img: Image.Image, icc_profile: bytes) -> Image.Image:
+    """Переводит пиксели из встроенного профиля в sRGB (littlecms через ImageCms)."""
+    from PIL import ImageCms
+
+    if img.mode == "P":
+        img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+    if img.mode not in ("RGB", "RGBA", "CMYK"):
+        # Grayscale profiles differ from sRGB only in the tone curve: dropped without conversion
+        return img
+    source_profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+    srgb = ImageCms.createProfile("sRGB")
+    return ImageCms.profileToProfile(img, source_profile, srgb, outputMode="RGBA" if img.mode == "RGBA" else "RGB")
+
+@lru_cache(maxsize=None)
+def _jpeg_scaled_tables():
+    """Качество - 1 -> таблицы (яркость, цветность), как их записывает libjpeg. Считаются при первом вызове."""
+    import numpy as np
+
+    qualities = np.arange(1, 101)
+    scales = np.where(qualities < 50, 5000 // qualities, 200 - 2 * qualities)
+    return np.clip((np.array(_JPEG_BASE_TABLES)[None] * scales[:, None, None] + 50) // 100, 1, 255)
+
+def warm_up() -> None:
+    """
+    Загружает заранее то, что модуль импортирует лениво (numpy, таблицы JPEG), чтобы
+    первое задание рабочего процесса не платило за это. Используется как инициализатор пулов.
+    """
+    _jpeg_scaled_tables()
+
+def estimate_jpeg_quality(quantization: Optional[Dict[int, Any]]) -> Optional[int]:
+    """
+    Оценивает качество (1-100), с которым сохранён JPEG, по таблицам квантования
+    (img.quantization): ближайшее масштабирование стандартных таблиц libjpeg.
+    Для нестандартных таблиц (фотоаппараты, Photoshop) это эквивалентное качество.
+    """
+    import numpy as np
+
+    if not quantization or 0 not in quantization:
+        return None
+    tables = [0, 1] if 1 in quantization else [0]
+    actual = np.array([list(quantization[table]) for table in tables])
+    if actual.shape[1] != 64:
+        return None
+    errors = np.abs(_jpeg_scaled_tables()[:, tables] - actual).sum(axis=(1, 2))
+    return int(np.argmin(errors)) + 1
+
+def plan_source(
+    source_quality: Optional[int], quality: int, output_format: str, resize_ratio: float,
+    metadata: str = DEFAULT_METADATA, to_srgb: bool = False, info: Optional[Dict[str, Any]] = None
+) -> Tuple[str, int]:
+    """
+    Решает до декодирования, что делать с JPEG-исходником (SOURCE_ACTIONS):
+    возвращает (действие, качество кодирования).
+    Перекодирование выше качества исходника только раздувает файл артефактами,
+    поэтому качество ограничивается качеством исходника, а если ничего не меняется
+    (тот же формат, без ресайза, без strip/sRGB, и в info - заголовке исходника -
+    нет метаданных, которые политика удалила бы) - файл копируется как есть.
+    """
+    if source_quality is None or output_format.upper() not in ("JPEG", "JPG") or source_quality > quality:
+        return "reencode", quality
+    # EXIF (and with it any orientation), XMP, comments and IPTC are dropped by icc and orient alike
+    droppable = any((info or {}).get(key) for key in _DROPPED_METADATA_KEYS)
+    if resize_ratio >= 1.0 and metadata != "strip" and not to_srgb and not droppable:
+        return "passthrough", source_quality
+    if source_quality == quality:
+        return "reencode", quality
+    return "capped", source_quality
+
+def apply_metadata_policy(
+    img: Image.Image, info: Dict[str, Any], policy: str = DEFAULT_METADATA, to_srgb: bool = False
+) -> Image.Image:
+    """
+    Применяет политику метаданных (METADATA_POLICIES) к изображению с метаданными info
+    (img.info исходника - после ресайза их может уже не быть).
+    to_srgb: пиксели переводятся из встроенного профиля в sRGB, профиль не сохраняется.
+    В img.info результата остаётся только то, что будет записано в файл.
+    """
+    if policy not in METADATA_POLICIES:
+        raise ValueError(f"Неизвестная политика метаданных: {policy}")
+    icc_profile = info.get("icc_profile")
+
+    if policy == "orient" and info.get("exif"):
+        exif = Image.Exif()
+        exif.load(info["exif"])
+        method = _ORIENTATION_TRANSPOSE.get(exif.get(ExifTags.Base.Orientation, 1))
+        if method is not None:
+            img = img.transpose(method)
+    if to_srgb and icc_profile:
+        img = _to_srgb(img, icc_profile)
+        icc_profile = None
+
+    img.info = {key: value for key, value in img.info.items() if key not in _METADATA_KEYS}
+    if icc_profile and policy in ("icc", "orient"):
+        img.info["icc_profile"] = icc_profile
+    return img
+
+def oriented_size(size: Tuple[int, int], info: Dict[str, Any], policy: str = DEFAULT_METADATA) -> Tuple[int, int]:
+    """Размер после apply_metadata_policy: orient поворачивает на 90° при EXIF-ориентации 5-8."""
+    if policy == "orient" and info.get("exif"):
+        exif = Image.Exif()
+        exif.load(info["exif"])
+        if exif.get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8):
+            return size[1], size[0]
+    return size
+
+def prepare_for_format(
+    img: Image.Image, quality: int, output_format: str, effort: str = DEFAULT_EFFORT
+) -> Tuple[Image.Image, Dict[str, Any]]:
+    """
+    Готовит изображение к сохранению в формате: конвертирует режим, квантизует PNG
+    и возвращает параметры для img.save(). Используется и оценщиком размера.
+    effort - пресет из EFFORT_PRESETS (скорость кодирования против размера).
+    """
+    if effort not in EFFORT_PRESETS:
+        raise ValueError(f"Неизвестный пресет: {effort}")
+    preset = EFFORT_PRESETS[effort]
+    save_params = {}
+    # Encoders only write a profile when it is passed explicitly (quantize drops img.info)
+    icc_profile = img.info.get("icc_profile")
+    if icc_profile:
+        save_params["icc_profile"] = icc_profile
+
+    if output_format.upper() in ["JPEG", "JPG"]:
+        # Convert to RGB if needed
+        if img.mode in ("RGBA", "P", "LA", "PA"):
+            img = img.convert("RGB")
+        
+        # JPEG Optimization: subsampling=2 (4:2:0) if quality < 95, subsampling=0 if quality >= 95
+        subsampling = 2 if quality < 95 else 0
+        
+        save_params.update({
+            "format": "JPEG",
+            "quality": quality,
+            "progressive": preset["jpeg_progressive"],
+            "optimize": preset["jpeg_optimize"],
+            "subsampling": subsampling
+        })
+        
+    elif output_format.upper() == "WEBP":
+        # method=6 (max): самое медленное, но эффективное сжатие
+        save_params.update({
+            "format": "WEBP",
+            "quality": quality,
+            "method": preset["webp_method"]
+        })
+        
+    elif output_format.upper() == "PNG":
+        # PNG - lossless, quality там нет. 
+        # Если нужно сильное сжатие, уменьшаем цвета (Quantization)
+        save_params.update({"format": "PNG", "compress_level": preset["png_levels"][0]})
+        # Если качество ниже 100, применяем адаптивное уменьшение цветов
+        if quality < 100:
+            img = img.quantize(colors=png_colors(quality), method=preset["png_quantizers"][0])
+
+    else:
+        raise ValueError(f"Неподдерживаемый формат: {output_format}")
+
+    return img, save_params
+
+def png_colors(quality: int) -> int:
+    """Конвертируем качество 1-100 в количество цветов палитры (2-256)."""
+    return max(2, int(256 * (quality / 100)))
+
+def _png_base(img: Image.Image) -> Image.Image:
+    """
+    Lossless starting point for PNG: converts modes PNG can't store
+    and drops an alpha channel in which every pixel is fully opaque.
+    """
+    if img.mode not in PNG_MODES:
+        img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+    if img.mode in ("RGBA", "LA") and img.getchannel("A").getextrema() == (255, 255):
+        img = img.convert(img.mode[:-1])
+    return img
+
+def _palette_source(img: Image.Image) -> Image.Image:
+    """Quantizers only accept RGB(A) reliably."""
+    if img.mode in ("RGB", "RGBA"):
+        return img
+    if img.mode in ("I", "I;16", "I;16B", "I;16L"):
+        # 16-bit samples: a plain conversion clamps everything above 255 to white
+        img = img.convert("I").point(lambda v: v / 257).convert("L")
+    return img.convert("RGBA" if "A" in img.mode or img.has_transparency_data else "RGB")
+
+def _exact_palette(img: Image.Image) -> Optional[Image.Image]:
+    """
+    Lossless palette version of an RGB(A) image with at most 256 colors, otherwise None.
+    Quantizers may merge close colors, so indices are built directly from the unique pixels.
+    Works in strips of rows: besides the result only one RGBA strip is held at a time.
+    """
+    import numpy as np
+
+    found = img.getcolors(256)
+    if found is None:
+        return None
+    rgba = [color if len(color) == 4 else color + (255,) for _, color in found]
+    colors = np.unique(np.array(rgba, dtype=np.uint8).view(np.uint32).ravel())
+    indices = np.empty((img.height, img.width), dtype=np.uint8)
+    for top in range(0, img.height, STRIP_ROWS):
+        bottom = min(top + STRIP_ROWS, img.height)
+        strip = img.crop((0, top, img.width, bottom)).convert("RGBA")
+        pixels = np.asarray(strip).view(np.uint32)[..., 0]
+        indices[top:bottom] = np.searchsorted(colors, pixels)
+    palette = colors.view(np.uint8).reshape(-1, 4)
+    result = Image.frombytes("P", img.size, indices)
+    result.putpalette(palette[:, :3].tobytes())
+    if img.mode == "RGBA":
+        result.info["transparency"] = palette[:, 3].tobytes()
+    return result
+
+def _smallest_png(
+    make_variant: Callable[[], Optional[Image.Image]], levels, best: _BestSize,
+    limit: Callable[[], Optional[int]], memory: Optional[MemoryTracker] = None, name: str = "png variant",
+    icc_profile: Optional[bytes] = None
+) -> Optional[bytes]:
+    variant = make_variant()
+    if variant is None:
+        return None
+    if memory:
+        memory.hold(name, image_bytes(variant))
+    if variant.mode == "P":
+        # Lower zlib levels only ever won on truecolor data in our measurements
+        levels = levels[:1]
+    data = None
+    for level in levels:
+        encoded = encode_bounded(variant, limit, format="PNG", compress_level=level, icc_profile=icc_profile)
+        if encoded is not None and (data is None or len(encoded) < len(data)):
+            data = encoded
+            best.offer(len(data))
+    if memory:
+        # The variant image is dropped, its encode waits for the comparison
+        if data is None:
+            memory.release(name)
+        else:
+            memory.hold(name, len(data))
+    return data
+
+def optimize_png(
+    img: Image.Image, quality: int, effort: str = DEFAULT_EFFORT, max_workers: Optional[int] = None,
+    memory: Optional[MemoryTracker] = None, limit: Optional[Callable[[], Optional[int]]] = None
+) -> Optional[bytes]:
+    """
+    Кодирует PNG несколькими стратегиями параллельно и возвращает самый маленький результат:
+    truecolor без лишней альфы (quality 100), точная палитра (<= 256 цветов, без потерь),
+    квантизация каждым квантизатором пресета (quality < 100, не больше png_colors(quality)
+    цветов), каждый вариант - на всех уровнях zlib пресета.
+    Pillow отпускает GIL при квантизации и кодировании, поэтому хватает потоков.
+    max_workers=1 кодирует варианты по одному (в памяти не больше одного варианта).
+    memory - учёт пиковой памяти вызова (варианты и их закодированные данные).
+    Кодирование варианта прерывается, как только он перерос самый маленький готовый
+    или limit() (ограничение вызывающего); если переросли все - возвращает None.
+    """
+    if effort not in EFFORT_PRESETS:
+        raise ValueError(f"Неизвестный пресет: {effort}")
+    preset = EFFORT_PRESETS[effort]
+    base = _png_base(img)
+    if memory and base is not img:
+        memory.hold("png base", image_bytes(base))
+    if not preset["png_search"]:
+        source = base if quality == 100 else _palette_source(base)
+        prepared, save_params = prepare_for_format(source, quality, "PNG", effort)
+        data = encode_bounded(prepared, limit or (lambda: None), **save_params)
+        if memory:
+            memory.hold("png variant", image_bytes(prepared) + len(data or b""))
+            memory.release("png variant")
+            memory.release("png base")
+        return data
+
+    variants: List[Callable[[], Optional[Image.Image]]] = []
+    if quality == 100:
+        # Below 100 a quantized palette always beat truecolor in our measurements
+        variants.append(lambda: base)
+    if base.mode in ("RGB", "RGBA"):
+        variants.append(lambda: _exact_palette(base))
+    if quality < 100:
+        colors = png_colors(quality)
+        source = _palette_source(base)
+        if memory and source is not base:
+            memory.hold("png palette source", image_bytes(source))
+        for quantizer in preset["png_quantizers"]:
+            # Only Fast Octree and libimagequant support RGBA
+            if source.mode == "RGBA" and quantizer not in (Image.Quantize.FASTOCTREE, Image.Quantize.LIBIMAGEQUANT):
+                continue
+            variants.append(lambda quantizer=quantizer: source.quantize(colors=colors, method=quantizer))
+
+    # Every variant carries the same profile (quantized variants lose img.info)
+    icc_profile = img.info.get("icc_profile")
+    # Variants race each other: an encode stops once it outgrows the smallest finished one.
+    # The winner is never cut off, so the result is the same as encoding all of them.
+    best = _BestSize()
+
+    def bound() -> Optional[int]:
+        sizes = [size for size in (best.get(), limit() if limit else None) if size is not None]
+        return min(sizes) if sizes else None
+
+    def smallest(index):
+        return _smallest_png(
+            variants[index], preset["png_levels"], best, bound, memory, f"png variant {index}", icc_profile
+        )
+
+    workers = min(len(variants), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(smallest, range(len(variants))))
+    else:
+        results = [smallest(index) for index in range(len(variants))]
+    if memory:
+        for name in ["png base", "png palette source"] + [f"png variant {i}" for i in range(len(variants))]:
+            memory.release(name)
+    return min((data for data in results if data is not None), key=len, default=None)
+
+def uses_alpha(img: Image.Image) -> bool:
+    """True, если хотя бы один пиксель не полностью непрозрачен."""
+    if img.mode in ("RGBA", "LA", "PA"):
+        return img.getchannel("A").getextrema()[0] < 255
+    if img.has_transparency_data:
+        # Palette or tRNS transparency: only the pixels decide whether it is used
+        return img.convert("RGBA").getchannel("A").getextrema()[0] < 255
+    return False
+
+def encode_auto(
+    img: Image.Image, quality: int, effort: str = DEFAULT_EFFORT, max_workers: Optional[int] = None,
+    memory: Optional[MemoryTracker] = None
+) -> Tuple[str, bytes]:
+    """
+    Формат AUTO: кодирует кандидатов AUTO_CANDIDATES с одним и тем же качеством
+    параллельно из одного изображения и возвращает (формат, данные) самого маленького.
+    JPEG не участвует, если альфа-канал действительно используется или режим
+    ему не подходит; изображения глубже 8 бит кодируются только в PNG.
+    Кандидат прерывается, как только его вывод перерос самый маленький готовый;
+    медленный WebP пропускается, если быстрая проба (method=0) заведомо проигрывает
+    (AUTO_WEBP_PROBE_MARGIN). max_workers=1 кодирует кандидатов по одному.
+    """
+    if img.mode in _HIGH_DEPTH_MODES:
+        formats = ["PNG"]
+    else:
+        formats = [
+            fmt for fmt in AUTO_CANDIDATES
+            if fmt != "JPEG" or (img.mode in _JPEG_MODES and not uses_alpha(img))
+        ]
+    best = _BestSize()
+    # Set once any candidate other than WebP has finished (or was cut off)
+    others_done = threading.Event()
+
+    def encode(fmt: str) -> Optional[bytes]:
+        try:
+            if fmt == "PNG":
+                data = optimize_png(img, quality, effort, max_workers=max_workers, memory=memory, limit=best.get)
+            else:
+                prepared, save_params = prepare_for_format(img, quality, fmt, effort)
+                if memory and prepared is not img:
+                    memory.hold(f"auto {fmt}", image_bytes(prepared))
+                data = None
+                if fmt == "WEBP" and save_params["method"] > 0:
+                    probe = len(encode_to_bytes(prepared, **{**save_params, "method": 0}))
+                    others_done.wait()
+                    limit = best.get()
+                    if limit is None or probe <= limit * AUTO_WEBP_PROBE_MARGIN:
+                        data = encode_bounded(prepared, best.get, **save_params)
+                else:
+                    data = encode_bounded(prepared, best.get, **save_params)
+                if memory:
+                    memory.release(f"auto {fmt}")
+            if data is not None:
+                best.offer(len(data))
+                if memory:
+                    memory.hold(f"auto {fmt} encoded", len(data))
+            return data
+        finally:
+            # Also on errors: the WebP candidate must never wait forever
+            if fmt != "WEBP":
+                others_done.set()
+
+    workers = min(len(formats), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(encode, formats))
+    else:
+        results = [encode(fmt) for fmt in formats]
+    if memory:
+        for fmt in formats:
+            memory.release(f"auto {fmt} encoded")
+    # The smallest encode is never cut off; ties go to the earlier candidate
+    return min(((fmt, data) for fmt, data in zip(formats, results) if data is not None), key=lambda r: len(r[1]))
+
+def encode_for_format(img: Image.Image, quality: int, output_format: str, effort: str = DEFAULT_EFFORT) -> bytes:
+    """Готовит и кодирует изображение в памяти; PNG проходит через optimize_png, AUTO - через encode_auto."""
+    if output_format.upper() == AUTO_FORMAT:
+        return encode_auto(img, quality, effort)[1]
+    if output_format.upper() == "PNG":
+        return optimize_png(img, quality, effort)
+    prepared, save_params = prepare_for_format(img, quality, output_format, effort)
+    return encode_to_bytes(prepared, **save_params)
 
 def compress_image(
     input_path: str, 
     output_path: str, 
     quality: int, 
     output_format: str, 
-    resize_ratio: float
+    resize_ratio: float,
+    timing_hook: Optional[Callable[[CompressionTimings], None]] = None,
+    effort: str = DEFAULT_EFFORT,
+    low_memory: bool = False,
+    metadata: str = DEFAULT_METADATA,
+    to_srgb: bool = False
 ) -> CompressionResult:
     """
     Сжимает изображение с использованием продвинутых алгоритмов Pillow.
     Выбрасывает исключения при ошибках, вместо возврата кортежей.
+    Время каждого этапа попадает в result.timings и, если задан, в timing_hook,
+    пиковый объём буферов - в result.timings.peak_memory_bytes.
+    Исходник освобождается сразу после ресайза или конвертации, копий полного размера нет.
+    low_memory: для очень больших изображений - ресайз полосами, PNG-варианты по одному.
+    metadata/to_srgb: см. apply_metadata_policy; сэкономленные на метаданных байты -
+    в result.metadata_bytes_saved.
+    JPEG-исходник сначала оценивается по таблицам квантования (plan_source): решение
+    и оценка качества - в result.source_action и result.source_quality.
+    output_format=AUTO: самый маленький из AUTO_CANDIDATES (encode_auto), расширение
+    output_path меняется под выбранный формат - итоговый путь в result.output_path.
     """
     
     # Валидация путей
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Файл не найден: {input_path}")
 
+    timer = StageTimer()
+    memory = MemoryTracker()
     try:
-        with Image.open(input_path) as img:
+        with timer.stage("open"):
+            source = Image.open(input_path)
+
+        with source as img:
             original_res = img.size
-            original_size = get_size_mb(input_path)
+            original_format = img.format
+            original_bytes = os.path.getsize(input_path)
+            original_size = original_bytes / BYTES_PER_MB
+            timer.timings.bytes_read = original_bytes
 
-            # 1. Ресайз (Lanczos - лучший фильтр для даунскейлинга)
+            # 0. Анализ исходника по заголовку: JPEG не перекодируется с качеством выше своего
+            with timer.stage("analyze"):
+                source_quality = estimate_jpeg_quality(getattr(img, "quantization", None)) \
+                    if original_format == "JPEG" else None
+                source_action, quality = plan_source(
+                    source_quality, quality, output_format, resize_ratio, metadata, to_srgb, img.info
+                )
+            if source_action == "passthrough":
+                # Re-encoding could only grow the file or lose quality: copy it without decoding
+                with timer.stage("write"):
+                    copy_file_atomic(input_path, output_path)
+                timer.timings.bytes_written = original_bytes
+                if timing_hook:
+                    timing_hook(timer.timings)
+                return CompressionResult(
+                    original_size_mb=original_size,
+                    compressed_size_mb=original_size,
+                    compression_ratio=0.0,
+                    original_resolution=original_res,
+                    final_resolution=original_res,
+                    output_path=output_path,
+                    timings=timer.timings,
+                    source_quality=source_quality,
+                    source_action=source_action
+                )
+
+            # 1. Декодирование (для JPEG сразу в уменьшенном виде) и ресайз до точного размера
             if resize_ratio < 1.0:
-                new_width = int(original_res[0] * resize_ratio)
-                new_height = int(original_res[1] * resize_ratio)
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                draft_for_ratio(img, resize_ratio, original_res)
+            with timer.stage("decode"):
+                img.load()
+            memory.hold("image", image_bytes(img))
+            # Read after load: PNG chunks behind the image data are parsed only then
+            source_info = dict(img.info)
+
+            if resize_ratio < 1.0:
+                with timer.stage("resize"):
+                    if low_memory:
+                        img = resize_in_strips(img, target_size(original_res, resize_ratio))
+                    else:
+                        img = img.resize(
+                            target_size(original_res, resize_ratio), Image.Resampling.LANCZOS,
+                            reducing_gap=RESIZE_REDUCING_GAP
+                        )
+                memory.replace("image", image_bytes(img))
+                # The full-resolution decode is not needed any more
+                source.close()
+
+            # Orientation and color conversion run after the resize, on fewer pixels
+            with timer.stage("metadata"):
+                processed = apply_metadata_policy(img, source_info, metadata, to_srgb)
+            if processed is not img:
+                memory.replace("image", image_bytes(processed))
+                if img is source:
+                    source.close()
+                img = processed
+            metadata_saved = metadata_bytes(source_info) - metadata_bytes(img.info)
             
             final_res = img.size
 
-            # 2. Сохранение с оптимизацией под формат
-            save_params = {}
-
-            if output_format.upper() in ["JPEG", "JPG"]:
-                # Convert to RGB if needed
-                if img.mode in ("RGBA", "P"): 
-                    img = img.convert("RGB")
-                
-                # JPEG Optimization: subsampling=2 (4:2:0) if quality < 95, subsampling=0 if quality >= 95
-                subsampling = 2 if quality < 95 else 0
-                
-                save_params.update({
-                    "format": "JPEG",
-                    "quality": quality,
-                    "progressive": True,
-                    "optimize": True,
-                    "subsampling": subsampling
-                })
-                
-            elif output_format.upper() == "WEBP":
-                # method=6: самое медленное, но эффективное сжатие
-                save_params.update({
-                    "format": "WEBP",
-                    "quality": quality,
-                    "method": 6 
-                })
-                
+            if output_format.upper() == AUTO_FORMAT:
+                # AUTO: all candidate formats in parallel, the smallest wins and sets the extension
+                with timer.stage("encode"):
+                    output_format, data = encode_auto(
+                        img, quality, effort, max_workers=1 if low_memory else None, memory=memory
+                    )
+                memory.hold("encoded", len(data))
+                if len(data) > original_bytes and original_format in FORMAT_EXTENSIONS:
+                    # The original is kept below: it needs its own extension
+                    output_format = original_format
+                output_path = with_format_extension(output_path, output_format)
             elif output_format.upper() == "PNG":
-                # PNG - lossless, quality там нет. 
-                # Если нужно сильное сжатие, уменьшаем цвета (Quantization)
-                save_params["format"] = "PNG"
-                # Если качество ниже 100, применяем адаптивное уменьшение цветов
-                if quality < 100:
-                    # Конвертируем качество 1-100 в количество цветов (2-256)
-                    colors = max(2, int(256 * (quality / 100)))
-                    img = img.quantize(colors=colors, method=2) # method 2 = FastOctree
-
+                # PNG: several strategies in parallel, the smallest in-memory result wins
+                with timer.stage("encode"):
+                    data = optimize_png(img, quality, effort, max_workers=1 if low_memory else None, memory=memory)
+                memory.hold("encoded", len(data))
             else:
-                raise ValueError(f"Неподдерживаемый формат: {output_format}")
+                # 2. Подготовка под формат (конвертация, параметры сохранения)
+                with timer.stage("prepare"):
+                    prepared, save_params = prepare_for_format(img, quality, output_format, effort)
+                if prepared is not img:
+                    # Only the converted image is used from here on
+                    memory.replace("image", image_bytes(prepared))
+                    if img is source:
+                        source.close()
+                    img = prepared
 
-            # Сохраняем изображение в память для возможного пересохранения
-            img_copy = img.copy()
-            
-            # Сохраняем
-            img.save(output_path, **save_params)
+                # All candidates are encoded in memory; only the winner touches the disk
+                with timer.stage("encode"):
+                    data = encode_to_bytes(img, **save_params)
+                memory.hold("encoded", len(data))
 
-            # SIZE GUARANTEE: Compare compressed_size with original_size
-            compressed_size = get_size_mb(output_path)
-            
-            # FAILSAFE: If compressed_size > original_size, attempt recovery
-            if compressed_size > original_size:
-                if output_format.upper() in ["JPEG", "JPG"]:
-                    # Attempt second save with quality=85 and subsampling=2
-                    img_copy.save(output_path, format="JPEG", quality=85, optimize=True, progressive=True, subsampling=2)
-                    compressed_size = get_size_mb(output_path)
-                    
-                    # If STILL larger, copy original to ensure best version
-                    if compressed_size > original_size:
-                        shutil.copy2(input_path, output_path)
-                        compressed_size = original_size
-                elif output_format.upper() == "WEBP":
-                    # For WebP, try quality=80
-                    img_copy.save(output_path, format="WEBP", quality=80, method=6)
-                    compressed_size = get_size_mb(output_path)
-                    
-                    if compressed_size > original_size:
-                        shutil.copy2(input_path, output_path)
-                        compressed_size = original_size
-                else:
-                    # For PNG and other formats, copy original
-                    shutil.copy2(input_path, output_path)
+                # SIZE GUARANTEE: Compare compressed size with original size
+                # FAILSAFE: If the output is larger, retry once with safer settings.
+                # Encoding never modifies the image, so the retry reuses it instead of a kept copy.
+                # A retry at or above the quality just used (e.g. capped to the source) can't be smaller.
+                failsafe_quality = FAILSAFE_QUALITY.get(output_format.upper())
+                if len(data) > original_bytes and failsafe_quality is not None and failsafe_quality < quality:
+                    with timer.stage("failsafe"):
+                        if output_format.upper() == "WEBP":
+                            retry = encode_to_bytes(img, **{**save_params, "quality": failsafe_quality})
+                        else:
+                            retry = encode_to_bytes(img, **{**save_params, "quality": failsafe_quality, "subsampling": 2})
+                    memory.replace("encoded", len(retry))
+                    data = retry
+
+            # If STILL larger (or PNG), keep the original file as the best version
+            with timer.stage("write"):
+                if len(data) > original_bytes:
+                    copy_file_atomic(input_path, output_path)
                     compressed_size = original_size
+                    timer.timings.bytes_written = original_bytes
+                    # The original keeps all of its metadata
+                    metadata_saved = 0
+                else:
+                    write_bytes_atomic(output_path, data)
+                    compressed_size = len(data) / BYTES_PER_MB
+                    timer.timings.bytes_written = len(data)
+
+            timer.timings.peak_memory_bytes = memory.peak
+            if timing_hook:
+                timing_hook(timer.timings)
             
             return CompressionResult(
                 original_size_mb=original_size,
@@ -115,9 +827,390 @@ def compress_image(
                 compression_ratio=((original_size - compressed_size) / original_size) * 100,
                 original_resolution=original_res,
                 final_resolution=final_res,
-                output_path=output_path
+                output_path=output_path,
+                timings=timer.timings,
+                metadata_bytes_saved=metadata_saved,
+                source_quality=source_quality,
+                source_action=source_action
             )
 
     except Exception as e:
         # Пробрасываем ошибку наверх, интерфейс сам решит, как её показать
-        raise RuntimeError(f"Ошибка при обработке изображения: {str(e)}")
\ No newline at end of file
+        raise RuntimeError(f"Ошибка при обработке изображения: {str(e)}")
+
+def _search_quality(
+    img: Image.Image, output_format: str, max_bytes: int, min_bytes: int, min_quality: int,
+    timer: StageTimer, effort: str = DEFAULT_EFFORT
+):
+    """
+    Binary search for the highest quality whose encode fits into max_bytes.
+    Returns (data or None, smallest encode size seen, encode count).
+    """
+    lo, hi = min_quality, 100
+    best = None
+    smallest = None
+    iterations = 0
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        with timer.stage("encode"):
+            data = encode_for_format(img, quality, output_format, effort)
+        iterations += 1
+        smallest = len(data) if smallest is None else min(smallest, len(data))
+
+        if len(data) <= max_bytes:
+            best = data
+            # Close enough to the budget: more encodes would gain almost nothing
+            if len(data) >= min_bytes:
+                break
+            lo = quality + 1
+        else:
+            hi = quality - 1
+    return best, smallest, iterations
+
+def compress_to_target(
+    input_path: str,
+    output_path: str,
+    max_bytes: int,
+    output_format: str,
+    resize_ratio: float = 1.0,
+    tolerance: float = 0.05,
+    min_quality: int = 5,
+    min_resize_ratio: float = 0.05,
+    timing_hook: Optional[Callable[[CompressionTimings], None]] = None,
+    effort: str = DEFAULT_EFFORT,
+    metadata: str = DEFAULT_METADATA,
+    to_srgb: bool = False
+) -> CompressionResult:
+    """
+    Сжимает изображение так, чтобы файл уложился в max_bytes.
+    Бинарный поиск по качеству на кодировании в памяти; если даже минимальное
+    качество не помещается, уменьшаем resize_ratio и повторяем поиск.
+    Исходник декодируется один раз; metadata/to_srgb - как в compress_image.
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Файл не найден: {input_path}")
+
+    timer = StageTimer()
+    try:
+        with timer.stage("open"):
+            opened = Image.open(input_path)
+
+        with opened as source:
+            with timer.stage("decode"):
+                source.load()
+            original_res = source.size
+            original_format = source.format
+            original_bytes = os.path.getsize(input_path)
+            original_size = original_bytes / BYTES_PER_MB
+            timer.timings.bytes_read = original_bytes
+            min_bytes = int(max_bytes * (1 - tolerance))
+
+            # Applied once before the search: every scale tried is cut from the oriented image
+            source_info = dict(source.info)
+            with timer.stage("metadata"):
+                base = apply_metadata_policy(source, source_info, metadata, to_srgb)
+            metadata_saved = metadata_bytes(source_info) - metadata_bytes(base.info)
+
+            ratio = min(resize_ratio, 1.0)
+            iterations = 0
+            while True:
+                img = base
+                if ratio < 1.0:
+                    with timer.stage("resize"):
+                        img = base.resize(
+                            target_size(base.size, ratio), Image.Resampling.LANCZOS,
+                            reducing_gap=RESIZE_REDUCING_GAP
+                        )
+
+                data, smallest, count = _search_quality(
+                    img, output_format, max_bytes, min_bytes, min_quality, timer, effort
+                )
+                iterations += count
+                if data is not None:
+                    break
+                if ratio <= min_resize_ratio:
+                    raise ValueError(f"Не удалось уложиться в {max_bytes} байт")
+
+                # Bytes scale roughly with pixel count: jump close to the needed scale,
+                # but always step down by at least 10%
+                ratio = max(min_resize_ratio, min(ratio * 0.9, ratio * (max_bytes / smallest) ** 0.5))
+
+            # Same guarantee as compress_image: when the source already fits the budget,
+            # a re-encode that fills the budget must not replace it with a larger file.
+            # Like AUTO, a kept original of another format gets its own extension.
+            final_res = img.size
+            with timer.stage("write"):
+                if len(data) > original_bytes and original_format in FORMAT_EXTENSIONS:
+                    output_path = with_format_extension(output_path, original_format)
+                    copy_file_atomic(input_path, output_path)
+                    compressed_size = original_size
+                    timer.timings.bytes_written = original_bytes
+                    final_res = original_res
+                    # The original keeps all of its metadata
+                    metadata_saved = 0
+                else:
+                    write_bytes_atomic(output_path, data)
+                    compressed_size = len(data) / BYTES_PER_MB
+                    timer.timings.bytes_written = len(data)
+
+            if timing_hook:
+                timing_hook(timer.timings)
+
+            return CompressionResult(
+                original_size_mb=original_size,
+                compressed_size_mb=compressed_size,
+                compression_ratio=((original_size - compressed_size) / original_size) * 100,
+                original_resolution=original_res,
+                final_resolution=final_res,
+                output_path=output_path,
+                iterations=iterations,
+                timings=timer.timings,
+                metadata_bytes_saved=metadata_saved
+            )
+
+    except Exception as e:
+        raise RuntimeError(f"Ошибка при обработке изображения: {str(e)}")
+
+
+def _search_quality_for_ssim(
+    img: Image.Image, output_format: str, min_ssim: float, min_quality: int,
+    timer: StageTimer, effort: str = DEFAULT_EFFORT
+):
+    """
+    Binary search for the lowest quality whose decoded encode scores at least min_ssim
+    against img. Returns (data, score, encode count); falls back to quality 100.
+    """
+    from quality_metrics import SSIMScorer
+
+    with timer.stage("score"):
+        scorer = SSIMScorer(img)
+    lo, hi = min_quality, 100
+    best = None
+    last = None
+    iterations = 0
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        with timer.stage("encode"):
+            data = encode_for_format(img, quality, output_format, effort)
+        iterations += 1
+        with timer.stage("score"):
+            with Image.open(io.BytesIO(data)) as decoded:
+                last = (data, scorer.score(decoded))
+
+        if last[1] >= min_ssim:
+            best = last
+            hi = quality - 1
+        else:
+            lo = quality + 1
+
+    # Nothing reached the threshold: the last try was quality 100, the best we can do
+    data, score = best or last
+    return data, score, iterations
+
+def compress_to_quality(
+    input_path: str,
+    output_path: str,
+    min_ssim: float,
+    output_format: str,
+    resize_ratio: float = 1.0,
+    min_quality: int = 5,
+    timing_hook: Optional[Callable[[CompressionTimings], None]] = None,
+    effort: str = DEFAULT_EFFORT,
+    metadata: str = DEFAULT_METADATA,
+    to_srgb: bool = False
+) -> CompressionResult:
+    """
+    Сжимает с минимальным качеством, при котором SSIM (по яркости) относительно
+    уменьшенного исходника не ниже min_ssim. Кандидаты кодируются в памяти теми же
+    параметрами, что и в compress_image; достигнутый SSIM попадает в result.ssim.
+    metadata/to_srgb - как в compress_image (SSIM считается уже по повёрнутому изображению).
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Файл не найден: {input_path}")
+
+    timer = StageTimer()
+    try:
+        with timer.stage("open"):
+            opened = Image.open(input_path)
+
+        with opened as img:
+            original_res = img.size
+            original_bytes = os.path.getsize(input_path)
+            original_size = original_bytes / BYTES_PER_MB
+            timer.timings.bytes_read = original_bytes
+
+            if resize_ratio < 1.0:
+                draft_for_ratio(img, resize_ratio, original_res)
+            with timer.stage("decode"):
+                img.load()
+            source_info = dict(img.info)
+            if resize_ratio < 1.0:
+                with timer.stage("resize"):
+                    img = img.resize(
+                        target_size(original_res, resize_ratio), Image.Resampling.LANCZOS,
+                        reducing_gap=RESIZE_REDUCING_GAP
+                    )
+            with timer.stage("metadata"):
+                img = apply_metadata_policy(img, source_info, metadata, to_srgb)
+            metadata_saved = metadata_bytes(source_info) - metadata_bytes(img.info)
+
+            data, score, iterations = _search_quality_for_ssim(
+                img, output_format, min_ssim, min_quality, timer, effort
+            )
+
+            with timer.stage("write"):
+                write_bytes_atomic(output_path, data)
+            compressed_size = len(data) / BYTES_PER_MB
+            timer.timings.bytes_written = len(data)
+
+            if timing_hook:
+                timing_hook(timer.timings)
+
+            return CompressionResult(
+                original_size_mb=original_size,
+                compressed_size_mb=compressed_size,
+                compression_ratio=((original_size - compressed_size) / original_size) * 100,
+                original_resolution=original_res,
+                final_resolution=img.size,
+                output_path=output_path,
+                iterations=iterations,
+                timings=timer.timings,
+                ssim=score,
+                metadata_bytes_saved=metadata_saved
+            )
+
+    except Exception as e:
+        raise RuntimeError(f"Ошибка при обработке изображения: {str(e)}")
+
+def variant_path(output_base: str, width: int, output_format: str) -> str:
+    """photos/cat + 640 + WEBP -> photos/cat-640w.webp"""
+    return f"{output_base}-{width}w{FORMAT_EXTENSIONS[output_format.upper()]}"
+
+def compress_variants(
+    input_path: str,
+    output_base: str,
+    widths: List[int],
+    formats: List[str],
+    quality: int,
+    effort: str = DEFAULT_EFFORT,
+    max_workers: Optional[int] = None,
+    timing_hook: Optional[Callable[[CompressionTimings], None]] = None,
+    metadata: str = DEFAULT_METADATA,
+    to_srgb: bool = False
+) -> List[CompressionResult]:
+    """
+    Набор адаптивных вариантов (ширины x форматы) из одного декодирования.
+    Пирамида: каждая ширина уменьшается из следующей большей, а не из оригинала;
+    все варианты кодируются параллельно. Ширины больше исходной обрезаются до неё.
+    metadata/to_srgb - как в compress_image; ширины относятся к повёрнутому изображению.
+    Возвращает результаты от большей ширины к меньшей, в порядке formats.
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Файл не найден: {input_path}")
+    if not widths or not formats:
+        raise ValueError("Нужна хотя бы одна ширина и один формат")
+
+    timer = StageTimer()
+    try:
+        with timer.stage("open"):
+            source = Image.open(input_path)
+
+        with source as img:
+            original_res = img.size
+            original_format = img.format
+            original_bytes = os.path.getsize(input_path)
+            original_size = original_bytes / BYTES_PER_MB
+            timer.timings.bytes_read = original_bytes
+
+            # Widths are those of the displayed image: EXIF rotation swaps the sides
+            display_res = oriented_size(original_res, img.info, metadata)
+            widths = sorted({min(int(w), display_res[0]) for w in widths}, reverse=True)
+            largest_ratio = widths[0] / display_res[0]
+            if largest_ratio < 1.0:
+                draft_for_ratio(img, largest_ratio, original_res)
+            with timer.stage("decode"):
+                img.load()
+            source_info = dict(img.info)
+            with timer.stage("metadata"):
+                img = apply_metadata_policy(img, source_info, metadata, to_srgb)
+            metadata_saved = metadata_bytes(source_info) - metadata_bytes(img.info)
+
+            # Every level comes from the previous (larger) one, so each resize works on few pixels
+            levels = []
+            with timer.stage("resize"):
+                level = img
+                for width in widths:
+                    size = (width, max(1, round(display_res[1] * width / display_res[0])))
+                    if level.size != size:
+                        level = level.resize(size, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+                    levels.append(level)
+
+            def encode_variant(level, output_format):
+                output_path = variant_path(output_base, level.width, output_format)
+                data = encode_for_format(level, quality, output_format, effort)
+                # Same guarantee as compress_image: a full-size re-encode never grows the file
+                if level.size == display_res and output_format.upper() == original_format and len(data) > original_bytes:
+                    copy_file_atomic(input_path, output_path)
+                    # The original keeps all of its metadata
+                    return output_path, level.size, original_bytes, 0
+                write_bytes_atomic(output_path, data)
+                return output_path, level.size, len(data), metadata_saved
+
+            with timer.stage("encode"):
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    futures = [
+                        pool.submit(encode_variant, level, output_format)
+                        for level in levels for output_format in formats
+                    ]
+                    variants = [future.result() for future in futures]
+            timer.timings.bytes_written = sum(written for _, _, written, _ in variants)
+
+            if timing_hook:
+                timing_hook(timer.timings)
+
+            results = []
+            for output_path, final_res, written, saved in variants:
+                compressed_size = written / BYTES_PER_MB
+                results.append(CompressionResult(
+                    original_size_mb=original_size,
+                    compressed_size_mb=compressed_size,
+                    compression_ratio=((original_size - compressed_size) / original_size) * 100,
+                    original_resolution=original_res,
+                    final_resolution=final_res,
+                    output_path=output_path,
+                    metadata_bytes_saved=saved
+                ))
+            return results
+
+    except Exception as e:
+        raise RuntimeError(f"Ошибка при обработке изображения: {str(e)}")
+
+def srcset_manifest(results: List[CompressionResult], base_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Описание набора вариантов для <picture>/srcset: по одной строке srcset на формат
+    (в порядке появления форматов) и список файлов. Пути - относительно base_dir.
+    """
+    def url(path):
+        return (os.path.relpath(path, base_dir) if base_dir else path).replace(os.sep, "/")
+
+    def mime_type(result):
+        return _EXTENSION_MIME_TYPES[os.path.splitext(result.output_path)[1].lower()]
+
+    # Formats keep the caller's order (e.g. WebP before the JPEG fallback)
+    sources: Dict[str, List[str]] = {mime_type(result): [] for result in results}
+    variants = []
+    for result in sorted(results, key=lambda r: r.final_resolution[0]):
+        width, height = result.final_resolution
+        sources[mime_type(result)].append(f"{url(result.output_path)} {width}w")
+        variants.append({
+            "path": url(result.output_path), "type": mime_type(result), "width": width, "height": height,
+            "bytes": round(result.compressed_size_mb * BYTES_PER_MB)
+        })
+
+    width, height = results[0].original_resolution if results else (0, 0)
+    return {
+        "width": width,
+        "height": height,
+        "sources": [{"type": mime, "srcset": ", ".join(srcset)} for mime, srcset in sources.items()],
+        "variants": variants
+    }
@@ -0,0 +1,310 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, replace
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from algorithms import (
+    AUTO_FORMAT, DEFAULT_EFFORT, DEFAULT_METADATA, FORMAT_EXTENSIONS, compress_image, compress_to_quality,
+    compress_to_target, format_from_path, get_size_mb, link_or_copy_atomic, warm_up, with_format_extension
+)
+from cache import ResultCache, file_digest, make_key
+from memory import default_memory_budget, estimate_peak_bytes
+from models import BatchSummary, CompressionResult
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# Qt keeps its own threads alive, so forking the GUI process is unsafe.
+# Spawn is also what Windows (and the frozen EXE) uses anyway.
+_POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+
+@dataclass
+class BatchJob:
+    input_path: str
+    output_path: str
+    quality: int
+    output_format: str
+    resize_ratio: float
+    # Byte budget: switches the job to compress_to_target (quality is then ignored)
+    max_bytes: Optional[int] = None
+    # Perceptual threshold: switches the job to compress_to_quality (quality is then ignored)
+    min_ssim: Optional[float] = None
+    # Encoder effort preset (algorithms.EFFORT_PRESETS)
+    effort: str = DEFAULT_EFFORT
+    # Strip-wise resize without full-size copies (set by the scheduler for oversized inputs)
+    low_memory: bool = False
+    # Metadata policy (algorithms.METADATA_POLICIES) and sRGB conversion, in every mode
+    metadata: str = DEFAULT_METADATA
+    to_srgb: bool = False
+
+
+def is_image_file(path: str) -> bool:
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_image_files(paths: Iterable[str]) -> Iterator[str]:
+    """
+    Yields supported image files from the given paths.
+    Folders are walked lazily, so huge trees are never listed up front.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_image_file(name):
+                        yield os.path.join(root, name)
+        elif is_image_file(path):
+            yield path
+
+
+def suggest_output_path(input_path: str, output_dir: Optional[str] = None, output_format: Optional[str] = None) -> str:
+    folder, filename = os.path.split(input_path)
+    name, ext = os.path.splitext(filename)
+    return with_format_extension(os.path.join(output_dir or folder, f"{name}_compressed{ext}"), output_format)
+
+
+# Per-process result cache, opened by the pool initializer
+_worker_cache: Optional[ResultCache] = None
+
+
+def _init_worker(cache_dir: Optional[str], cache_max_bytes: int):
+    global _worker_cache
+    warm_up()
+    if cache_dir:
+        _worker_cache = ResultCache(cache_dir, cache_max_bytes)
+
+
+def run_job(job: BatchJob) -> CompressionResult:
+    """Pool entry point: must stay a module-level function to be picklable."""
+    if _worker_cache is None:
+        return compress_job(job)
+
+    params = asdict(job)
+    del params["input_path"], params["output_path"]
+    key = make_key(file_digest(job.input_path), params)
+
+    # AUTO picks the format per file: the cached output decides the extension
+    auto = job.output_format.upper() == AUTO_FORMAT
+    result = _worker_cache.restore(key, job.output_path, match_stored_extension=auto)
+    if result is None:
+        result = compress_job(job)
+        _worker_cache.store(key, result)
+    return result
+
+
+def reuse_result(result: CompressionResult, job: BatchJob, duplicate_of: str) -> CompressionResult:
+    """Puts the output compressed from duplicate_of in place for job and describes it as job's result."""
+    output_path = job.output_path
+    if job.output_format.upper() == AUTO_FORMAT:
+        output_path = with_format_extension(output_path, format_from_path(result.output_path))
+    if os.path.abspath(output_path) != os.path.abspath(result.output_path):
+        link_or_copy_atomic(result.output_path, output_path)
+    original_size = get_size_mb(job.input_path)
+    return replace(
+        result,
+        original_size_mb=original_size,
+        compression_ratio=(original_size - result.compressed_size_mb) / original_size * 100 if original_size else 0.0,
+        output_path=output_path,
+        cached=False,
+        timings=None,
+        duplicate_of=duplicate_of
+    )
+
+
+def compress_job(job: BatchJob) -> CompressionResult:
+    """Runs the compression mode selected by the job's fields."""
+    if job.min_ssim is not None:
+        return compress_to_quality(
+            job.input_path, job.output_path, job.min_ssim,
+            job.output_format, job.resize_ratio, effort=job.effort, metadata=job.metadata, to_srgb=job.to_srgb
+        )
+    if job.max_bytes is not None:
+        return compress_to_target(
+            job.input_path, job.output_path, job.max_bytes,
+            job.output_format, job.resize_ratio, effort=job.effort, metadata=job.metadata, to_srgb=job.to_srgb
+        )
+    return compress_image(
+        job.input_path, job.output_path, job.quality,
+        job.output_format, job.resize_ratio, effort=job.effort, low_memory=job.low_memory,
+        metadata=job.metadata, to_srgb=job.to_srgb
+    )
+
+
+class BatchScheduler:
+    """
+    Runs compression jobs on a process pool.
+    Only a bounded number of jobs is submitted at a time, so the job iterable
+    can be a lazy directory walk of any size.
+
+    With a memory budget, each job's peak memory is estimated from the image
+    header and a job is only started while the running jobs leave room for it.
+    Inputs that don't fit the budget at all run in low-memory mode, alone if needed.
+    memory_budget=None uses half of the physical RAM, 0 disables the limit.
+
+    dedupe ("exact" or "near", see dedupe.py) compresses each group of duplicate
+    inputs once and hardlinks or copies the output for the rest of the group.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        cache_max_bytes: int = 1024 * 1024 * 1024,
+        memory_budget: Optional[int] = None,
+        dedupe: Optional[str] = None
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.dedupe = dedupe
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        if memory_budget is None:
+            # Unknown RAM (no os.sysconf on Windows): no limit
+            memory_budget = default_memory_budget() or 0
+        self.memory_budget = memory_budget
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Thread-safe. Queued jobs are dropped, running jobs finish normally."""
+        self._cancel_event.set()
+
+    def admit(self, job: BatchJob) -> Tuple[BatchJob, int]:
+        """Returns the job to run (low-memory if it wouldn't fit otherwise) and its estimated peak bytes."""
+        if not self.memory_budget:
+            return job, 0
+        try:
+            peak = estimate_peak_bytes(job.input_path, job.resize_ratio, job.low_memory, job.output_format, job.effort)
+            if peak > self.memory_budget and not job.low_memory and job.max_bytes is None and job.min_ssim is None:
+                job = replace(job, low_memory=True)
+                peak = estimate_peak_bytes(job.input_path, job.resize_ratio, low_memory=True,
+                                           output_format=job.output_format, effort=job.effort)
+        except Exception:
+            # Unreadable header: the worker reports the real error
+            peak = 0
+        return job, peak
+
+    def run(
+        self,
+        jobs: Iterable[BatchJob],
+        on_progress: Optional[Callable[[int, BatchJob], None]] = None,
+        on_result: Optional[Callable[[BatchJob, Optional[CompressionResult], Optional[str]], None]] = None
+    ) -> BatchSummary:
+        """
+        on_progress gets the number of finished jobs; on_result gets each job
+        with its result, or with an error message if it failed.
+        """
+        summary = BatchSummary()
+        job_iter = iter(jobs)
+        # With a budget only running jobs are submitted, so admitted memory is really in use
+        max_in_flight = self.max_workers if self.memory_budget else self.max_workers * 2
+        completed = 0
+        reserved = 0
+        waiting = None
+
+        # Dedupe: the first job of a group runs, the others wait for its result
+        deduplicator = None
+        if self.dedupe:
+            from dedupe import Deduplicator
+            deduplicator = Deduplicator(self.dedupe)
+        parked: Dict[int, List[BatchJob]] = {}
+        # group -> (leader input, its result or None if it failed)
+        finished: Dict[int, Tuple[str, Optional[CompressionResult]]] = {}
+        # Duplicates whose group leader failed: they run on their own
+        requeued: Deque[BatchJob] = deque()
+
+        def finish(job, result, error):
+            nonlocal completed
+            if error is None:
+                summary.results.append(result)
+            else:
+                summary.failures.append((job.input_path, error))
+            completed += 1
+            if on_result:
+                on_result(job, result, error)
+            if on_progress:
+                on_progress(completed, job)
+
+        def reuse(job, group):
+            leader_path, result = finished[group]
+            try:
+                finish(job, reuse_result(result, job, leader_path), None)
+            except Exception as e:
+                finish(job, None, str(e))
+
+        def next_job() -> Tuple[Optional[BatchJob], Optional[int]]:
+            while True:
+                if requeued:
+                    return requeued.popleft(), None
+                job = next(job_iter, None)
+                if job is None or deduplicator is None:
+                    return job, None
+                group = deduplicator.group(job)
+                if group is None or (group in finished and finished[group][1] is None):
+                    # Unreadable, or its leader failed
+                    return job, None
+                if group in finished:
+                    reuse(job, group)
+                elif group in parked:
+                    parked[group].append(job)
+                else:
+                    parked[group] = []
+                    return job, group
+
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=_POOL_CONTEXT,
+            initializer=_init_worker, initargs=(self.cache_dir, self.cache_max_bytes)
+        ) as executor:
+            # Spawns and initializes the workers while the first jobs are read and admitted
+            executor.submit(warm_up)
+            pending = {}
+            while True:
+                while not self.cancelled and len(pending) < max_in_flight:
+                    if waiting is None:
+                        job, group = next_job()
+                        if job is None:
+                            break
+                        waiting = self.admit(job) + (group,)
+                    job, peak, group = waiting
+                    # A job bigger than the whole budget still runs, but only on its own
+                    if pending and reserved + peak > self.memory_budget:
+                        break
+                    pending[executor.submit(run_job, job)] = (job, peak, group)
+                    reserved += peak
+                    waiting = None
+
+                if self.cancelled:
+                    for future in list(pending):
+                        if future.cancel():
+                            reserved -= pending.pop(future)[1]
+
+                if not pending:
+                    break
+
+                # Short timeout so a cancel request is noticed while jobs are running
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, peak, group = pending.pop(future)
+                    reserved -= peak
+                    result, error = None, None
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        error = str(e)
+                    finish(job, result, error)
+                    if group is not None:
+                        finished[group] = (job.input_path, result)
+                        for duplicate in parked.pop(group):
+                            if result is None:
+                                requeued.append(duplicate)
+                            else:
+                                reuse(duplicate, group)
+
+        summary.cancelled = self.cancelled
+        return summary
@@ -0,0 +1,165 @@
+"""
+Throughput benchmark for algorithms.compress_image.
+
+    python -m benchmarks.bench_compress --profile quick
+    python -m benchmarks.bench_compress --save-baseline       # store reference numbers
+    python -m benchmarks.bench_compress --baseline benchmarks/baseline.json --threshold 0.15
+    python -m benchmarks.bench_compress --effort fast balanced max   # compare effort presets
+
+Every (kind, format, quality, resize[, effort]) cell runs in a fresh process so peak RSS
+is measured per cell. Exit code 1 means a regression against the baseline.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import PIL
+
+from algorithms import DEFAULT_EFFORT, EFFORT_PRESETS, compress_image
+from batch import FORMAT_EXTENSIONS
+from benchmarks.corpus import CORPUS_VERSION, KINDS, build_corpus
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MATRIX = {
+    "quick": {"formats": ("JPEG", "WEBP", "PNG"), "qualities": (60, 85), "resizes": (1.0, 0.5)},
+    "full": {"formats": ("JPEG", "WEBP", "PNG"), "qualities": (40, 60, 85, 95), "resizes": (1.0, 0.5, 0.25)},
+}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_cell(
+    paths: List[str], output_format: str, quality: int, resize_ratio: float, repeat: int, effort: str = DEFAULT_EFFORT
+) -> Dict:
+    """Runs in a child process: compresses every path `repeat` times, keeps the best pass."""
+    with tempfile.TemporaryDirectory() as tmp:
+        best = None
+        output_bytes = 0
+        for _ in range(repeat):
+            output_bytes = 0
+            start = time.perf_counter()
+            for i, path in enumerate(paths):
+                out = os.path.join(tmp, f"{i}{FORMAT_EXTENSIONS[output_format]}")
+                compress_image(path, out, quality, output_format, resize_ratio, effort=effort)
+                output_bytes += os.path.getsize(out)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return {"seconds": best, "output_bytes": output_bytes, "peak_rss_mb": _peak_rss_mb()}
+
+
+def cell_key(kind: str, output_format: str, quality: int, resize_ratio: float, effort: str = DEFAULT_EFFORT) -> str:
+    # The default effort keeps the old key, so existing baselines stay comparable
+    key = f"{kind}/{output_format}/q{quality}/r{resize_ratio:g}"
+    return key if effort == DEFAULT_EFFORT else f"{key}/{effort}"
+
+
+def run_benchmark(profile: str, corpus_dir: str, repeat: int, efforts=(DEFAULT_EFFORT,)) -> Dict:
+    corpus = build_corpus(corpus_dir, profile)
+    matrix = MATRIX[profile]
+    context = multiprocessing.get_context("spawn")
+    results = {}
+
+    for kind in KINDS:
+        images = [img for img in corpus if img.kind == kind]
+        paths = [img.path for img in images]
+        input_bytes = sum(img.size_bytes for img in images)
+        for fmt in matrix["formats"]:
+            for quality in matrix["qualities"]:
+                for resize in matrix["resizes"]:
+                    for effort in efforts:
+                        key = cell_key(kind, fmt, quality, resize, effort)
+                        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                            cell = executor.submit(run_cell, paths, fmt, quality, resize, repeat, effort).result()
+                        results[key] = {
+                            "images_per_sec": len(paths) / cell["seconds"],
+                            "mb_per_sec": input_bytes / (1024 * 1024) / cell["seconds"],
+                            "peak_rss_mb": cell["peak_rss_mb"],
+                            "output_ratio": cell["output_bytes"] / input_bytes,
+                        }
+                        print(f"{key:41} {results[key]['images_per_sec']:8.2f} img/s "
+                              f"{results[key]['mb_per_sec']:8.2f} MB/s ratio {results[key]['output_ratio']:.3f}",
+                              file=sys.stderr)
+
+    return {
+        "meta": {
+            "profile": profile,
+            "repeat": repeat,
+            "efforts": list(efforts),
+            "corpus_version": CORPUS_VERSION,
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.15, size_threshold: float = 0.01) -> List[str]:
+    """
+    Returns human-readable regressions of current vs baseline results.
+    Speed and memory use `threshold`; output size is deterministic, so it uses a tighter one.
+    """
+    regressions = []
+    for key, base in baseline["results"].items():
+        cur = current["results"].get(key)
+        if cur is None:
+            continue
+        if cur["images_per_sec"] < base["images_per_sec"] * (1 - threshold):
+            regressions.append(f"{key}: throughput {base['images_per_sec']:.2f} -> {cur['images_per_sec']:.2f} img/s")
+        if cur["output_ratio"] > base["output_ratio"] * (1 + size_threshold):
+            regressions.append(f"{key}: output ratio {base['output_ratio']:.4f} -> {cur['output_ratio']:.4f}")
+        if base["peak_rss_mb"] and cur["peak_rss_mb"] and cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold):
+            regressions.append(f"{key}: peak RSS {base['peak_rss_mb']:.1f} -> {cur['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_compress")
+    parser.add_argument("--profile", choices=sorted(MATRIX), default="quick")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes per cell, the best one is kept")
+    parser.add_argument("--effort", nargs="+", choices=list(EFFORT_PRESETS), default=[DEFAULT_EFFORT],
+                        help=f"Effort presets to measure (default: {DEFAULT_EFFORT})")
+    parser.add_argument("--corpus-dir", default=os.path.join(HERE, ".corpus"))
+    parser.add_argument("--output", default=os.path.join(HERE, "results.json"))
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown (default: 0.15)")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write results to benchmarks/baseline.json")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.profile, args.corpus_dir, args.repeat, args.effort)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(os.path.join(HERE, "baseline.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Startup benchmark: import time of the entry points in fresh interpreters.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 20 --budget cli=150
+
+Each import runs in its own process (bytecode compiled beforehand), the fastest
+of --repeat runs is kept. Exit code 1 means an entry point is over its time budget
+or loaded a module it must leave for later (numpy, PyQt5 in headless entry points).
+"""
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Import time budgets in ms, with headroom for slower CI machines.
+# interface includes PyQt5 itself (roughly half of it).
+BUDGETS_MS = {"cli": 150, "server": 200, "batch": 150, "interface": 300}
+# Imported on first use only: numpy by JPEG analysis, dedupe and SSIM, PyQt5 by the GUI
+DEFERRED_MODULES = {
+    "cli": ("numpy", "PyQt5", "quality_metrics", "sqlite3"),
+    "server": ("numpy", "PyQt5", "quality_metrics"),
+    "batch": ("numpy", "PyQt5", "quality_metrics"),
+    "interface": ("numpy", "quality_metrics", "batch"),
+}
+# Pillow plugins an entry point may have loaded (see algorithms.IMAGE_PLUGINS)
+MAX_IMAGE_PLUGINS = 5
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module: str) -> Dict:
+    """Imports module in a fresh interpreter; returns its import time and the loaded modules."""
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run_benchmark(modules: Sequence[str], repeat: int) -> Dict:
+    compileall.compile_dir(ROOT, quiet=1)
+    results = {}
+    for module in modules:
+        runs = [measure_import(module) for _ in range(repeat)]
+        loaded = set(runs[0]["modules"])
+        results[module] = {
+            "ms": min(run["seconds"] for run in runs) * 1000,
+            "deferred_loaded": sorted(
+                name for name in DEFERRED_MODULES.get(module, ())
+                if name in loaded
+            ),
+            "image_plugins": sorted(name for name in loaded if name.endswith("ImagePlugin")),
+        }
+    return results
+
+
+def check(results: Dict, budgets: Dict[str, float]) -> List[str]:
+    """Human-readable violations: over budget, deferred modules loaded, plugins loaded."""
+    violations = []
+    for module, result in results.items():
+        budget = budgets.get(module)
+        if budget is not None and result["ms"] > budget:
+            violations.append(f"{module}: import took {result['ms']:.0f} ms, budget {budget:.0f} ms")
+        if result["deferred_loaded"]:
+            violations.append(f"{module}: imports {', '.join(result['deferred_loaded'])} at startup")
+        if len(result["image_plugins"]) > MAX_IMAGE_PLUGINS:
+            violations.append(f"{module}: loads {len(result['image_plugins'])} Pillow plugins")
+    return violations
+
+
+def parse_budget(value: str):
+    module, _, ms = value.partition("=")
+    try:
+        return module, float(ms)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected MODULE=MS, got {value!r}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_startup")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS), help="Entry points (default: all)")
+    parser.add_argument("--repeat", type=int, default=10, help="Fresh interpreters per module, the fastest counts")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[], metavar="MODULE=MS",
+                        help="Override a module's budget in ms")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    modules = list(args.modules)
+    if "interface" in modules:
+        try:
+            import PyQt5  # noqa: F401
+        except ImportError:
+            print("PyQt5 not installed, skipping interface", file=sys.stderr)
+            modules.remove("interface")
+
+    budgets = {**BUDGETS_MS, **dict(args.budget)}
+    results = run_benchmark(modules, args.repeat)
+    for module, result in results.items():
+        print(f"{module:<10} {result['ms']:7.1f} ms  (budget {budgets.get(module, float('nan')):.0f} ms, "
+              f"{len(result['image_plugins'])} Pillow plugins)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"budgets_ms": budgets, "results": results}, f, indent=2)
+
+    violations = check(results, budgets)
+    for violation in violations:
+        print(f"STARTUP REGRESSION {violation}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Deterministic synthetic benchmark corpus.
+
+Every image is derived from a fixed seed, so the same corpus (byte-identical
+inputs) is produced on every machine and run.
+"""
+import json
+import math
+import os
+import random
+from dataclasses import asdict, dataclass
+from typing import List
+
+from PIL import Image, ImageDraw, ImageFilter
+
+CORPUS_VERSION = 1
+KINDS = ("photo", "screenshot", "alpha")
+
+# Megapixel sizes per profile
+PROFILES = {
+    "quick": (0.3, 1.0, 2.0),
+    "full": (0.3, 2.0, 12.0, 24.0, 50.0),
+}
+
+
+@dataclass
+class CorpusImage:
+    path: str
+    kind: str
+    megapixels: float
+    width: int
+    height: int
+    size_bytes: int
+
+
+def _dimensions(megapixels: float):
+    # 3:2 aspect ratio, like most camera sensors
+    width = int(math.sqrt(megapixels * 1_000_000 * 3 / 2))
+    return width, int(width * 2 / 3)
+
+
+def _noise_tile(rng: random.Random, size: int = 512) -> Image.Image:
+    return Image.frombytes("L", (size, size), rng.randbytes(size * size))
+
+
+def _tiled(tile: Image.Image, size) -> Image.Image:
+    img = Image.new(tile.mode, size)
+    for top in range(0, size[1], tile.height):
+        for left in range(0, size[0], tile.width):
+            img.paste(tile, (left, top))
+    return img
+
+
+def make_photo(size, seed: int) -> Image.Image:
+    """Smooth structures plus sensor-like grain."""
+    rng = random.Random(seed)
+    cx, cy = rng.uniform(-0.8, -0.4), rng.uniform(-0.2, 0.2)
+    extent = (cx - 1.2, cy - 0.8, cx + 1.2, cy + 0.8)
+    small = (max(1, size[0] // 4), max(1, size[1] // 4))
+    structure = Image.effect_mandelbrot(small, extent, 80).filter(ImageFilter.GaussianBlur(2))
+    red = structure.resize(size, Image.Resampling.BICUBIC)
+    green = Image.linear_gradient("L").resize(size, Image.Resampling.BICUBIC)
+    blue = Image.radial_gradient("L").resize(size, Image.Resampling.BICUBIC)
+    base = Image.merge("RGB", (red, green, blue))
+    grain = _tiled(_noise_tile(rng), size).convert("RGB")
+    return Image.blend(base, grain, 0.12)
+
+
+def make_screenshot(size, seed: int) -> Image.Image:
+    """Flat UI panels, text and sharp edges."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, (245, 245, 247))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, size[0], 48), fill=(32, 33, 36))
+    draw.rectangle((0, 48, size[0] // 6, size[1]), fill=(230, 232, 236))
+    for top in range(64, size[1] - 20, 22):
+        left = size[0] // 6 + 16
+        words = " ".join(rng.choice(("compress", "image", "quality", "resize", "pixel", "format")) for _ in range(12))
+        draw.text((left, top), words, fill=(30, 30, 30))
+        if rng.random() < 0.15:
+            x = rng.randrange(left, max(left + 1, size[0] - 120))
+            draw.rectangle((x, top, x + 100, top + 18), fill=(59, 130, 246))
+    return img
+
+
+def make_alpha(size, seed: int) -> Image.Image:
+    """RGBA artwork: shapes with soft edges on a transparent background."""
+    rng = random.Random(seed)
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(24):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randrange(max(2, min(size) // 20), max(3, min(size) // 4))
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256), rng.randrange(128, 256))
+        draw.ellipse((x0 - r, y0 - r, x0 + r, y0 + r), fill=color)
+    return img.filter(ImageFilter.GaussianBlur(1.5))
+
+
+def _save(kind: str, img: Image.Image, path: str):
+    if kind == "photo":
+        img.save(path, "JPEG", quality=92)
+    else:
+        img.save(path, "PNG")
+
+
+def build_corpus(directory: str, profile: str = "quick") -> List[CorpusImage]:
+    """Creates (or reuses) the corpus for a profile and returns its manifest."""
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, f"manifest-{profile}-v{CORPUS_VERSION}.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            images = [CorpusImage(**entry) for entry in json.load(f)]
+        if all(os.path.exists(img.path) for img in images):
+            return images
+
+    makers = {"photo": make_photo, "screenshot": make_screenshot, "alpha": make_alpha}
+    images = []
+    for megapixels in PROFILES[profile]:
+        size = _dimensions(megapixels)
+        seed = int(megapixels * 1000)
+        for kind in KINDS:
+            ext = "jpg" if kind == "photo" else "png"
+            path = os.path.join(directory, f"{kind}-{megapixels:g}mp.{ext}")
+            if not os.path.exists(path):
+                _save(kind, makers[kind](size, seed), path)
+            images.append(CorpusImage(path, kind, megapixels, size[0], size[1], os.path.getsize(path)))
+
+    with open(manifest_path, "w") as f:
+        json.dump([asdict(img) for img in images], f, indent=2)
+    return images
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+
+from algorithms import copy_file_atomic
+from models import CompressionResult
+
+# Bump when compress_image output changes for the same parameters
+CACHE_VERSION = 5
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """Fast content hash of a file (BLAKE2b, 128 bit)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(input_digest: str, params: Dict[str, Any]) -> str:
+    """Cache key: input content + every parameter that affects the output."""
+    payload = json.dumps({"v": CACHE_VERSION, "input": input_digest, "params": params}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent content-addressed cache of compression results.
+
+    An SQLite index maps cache keys to the stored CompressionResult and to the
+    last output written for it. A hit is served by validating that output
+    (size + mtime unchanged) or by copying the stored output blob from
+    cache_dir/objects. Blobs are evicted least-recently-used once their total
+    size exceeds max_bytes; index rows are kept so outputs can still be validated.
+    Safe to share between processes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Imported here: batch and the CLI load this module even when no cache is used
+        import sqlite3
+
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                output_size INTEGER NOT NULL,
+                output_mtime_ns INTEGER NOT NULL,
+                blob_size INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used) WHERE blob_size > 0;
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0);
+        """)
+
+    def close(self):
+        self._db.close()
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "objects", key[:2], key)
+
+    def _count(self, name: str):
+        if name == "hits":
+            self.hits += 1
+        else:
+            self.misses += 1
+        self._db.execute("UPDATE stats SET value = value + 1 WHERE name = ?", (name,))
+
+    def restore(self, key: str, output_path: str, match_stored_extension: bool = False) -> Optional[CompressionResult]:
+        """
+        Returns the cached result with output_path in place, or None on a miss.
+        match_stored_extension: output_path takes the extension of the cached output.
+        """
+        row = self._db.execute(
+            "SELECT result, output_path, output_size, output_mtime_ns, blob_size FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        result_json, stored_path, size, mtime_ns, blob_size = row
+        if match_stored_extension:
+            output_path = os.path.splitext(output_path)[0] + os.path.splitext(stored_path)[1]
+        try:
+            stat = os.stat(output_path)
+            valid = (os.path.abspath(output_path) == stored_path
+                     and stat.st_size == size and stat.st_mtime_ns == mtime_ns)
+        except OSError:
+            valid = False
+
+        try:
+            if not valid:
+                if not blob_size:
+                    self._count("misses")
+                    return None
+                copy_file_atomic(self._blob_path(key), output_path)
+                stat = os.stat(output_path)
+        except OSError:
+            # Blob evicted by another process in the meantime
+            self._count("misses")
+            return None
+
+        self._db.execute(
+            "UPDATE entries SET output_path = ?, output_mtime_ns = ?, last_used = ? WHERE key = ?",
+            (os.path.abspath(output_path), stat.st_mtime_ns, time.time(), key)
+        )
+        self._count("hits")
+
+        fields = json.loads(result_json)
+        fields.pop("timings", None)
+        fields["original_resolution"] = tuple(fields["original_resolution"])
+        fields["final_resolution"] = tuple(fields["final_resolution"])
+        fields["output_path"] = output_path
+        fields["cached"] = True
+        return CompressionResult(**fields)
+
+    def store(self, key: str, result: CompressionResult):
+        """Records a fresh result and keeps a copy of its output as a blob."""
+        stat = os.stat(result.output_path)
+        blob_size = 0
+        if stat.st_size <= self.max_bytes:
+            blob_path = self._blob_path(key)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            copy_file_atomic(result.output_path, blob_path)
+            blob_size = stat.st_size
+
+        fields = asdict(result)
+        fields.pop("cached", None)
+        fields.pop("timings", None)
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, json.dumps(fields), os.path.abspath(result.output_path), stat.st_size,
+             stat.st_mtime_ns, blob_size, time.time())
+        )
+        self._evict()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(blob_size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT key, blob_size FROM entries WHERE blob_size > 0 ORDER BY last_used"
+        ).fetchall()
+        for key, blob_size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._blob_path(key))
+            except FileNotFoundError:
+                pass
+            self._db.execute("UPDATE entries SET blob_size = 0 WHERE key = ?", (key,))
+            total -= blob_size
+
+    def stats(self) -> Dict[str, int]:
+        """Lifetime counters across all runs, plus the current blob store size."""
+        stats = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+        stats["blob_bytes"] = self._db.execute("SELECT COALESCE(SUM(blob_size), 0) FROM entries").fetchone()[0]
+        stats["entries"] = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return stats
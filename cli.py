@@ -0,0 +1,341 @@
+"""
+Headless command line interface (no PyQt5 import, works without a display).
+
+    python -m cli photos/ -q 80 --resize 0.5 --format WEBP -o out/ --jobs 8
+
+Writes one JSON line per file to stdout with the CompressionResult fields.
+With --queue, the files are spread over workers on several hosts (see workqueue.py).
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import sys
+from dataclasses import asdict
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from algorithms import (
+    AUTO_FORMAT, DEFAULT_EFFORT, DEFAULT_METADATA, EFFORT_PRESETS, METADATA_POLICIES, compress_variants,
+    srcset_manifest
+)
+from batch import BatchJob, BatchScheduler, format_from_path, is_image_file, suggest_output_path, with_format_extension
+from dedupe import DEDUPE_MODES
+from profiling import TimingStats
+
+
+def _matches(rel_path: str, patterns: Sequence[str]) -> bool:
+    rel_path = rel_path.replace(os.sep, "/")
+    name = os.path.basename(rel_path)
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def iter_inputs(
+    paths: Sequence[str], include: Sequence[str] = (), exclude: Sequence[str] = ()
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Lazily yields (path, path relative to its root folder) for every image to process.
+    Files given directly have no root (relative path is None).
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            if is_image_file(path):
+                yield path, None
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, path)
+                if not is_image_file(name):
+                    continue
+                if include and not _matches(rel, include):
+                    continue
+                if exclude and _matches(rel, exclude):
+                    continue
+                yield full, rel
+
+
+def output_path_for(input_path: str, rel_path: Optional[str], output_dir: Optional[str], output_format: str) -> str:
+    """Mirrors folder structure into output_dir, or writes *_compressed files next to the source."""
+    if not output_dir:
+        return suggest_output_path(input_path, output_format=output_format)
+    target = os.path.join(output_dir, rel_path or os.path.basename(input_path))
+    return with_format_extension(target, output_format)
+
+
+def make_job(args, path: str, rel: Optional[str]) -> BatchJob:
+    fmt = args.format or format_from_path(path)
+    output_path = output_path_for(path, rel, args.output_dir, fmt)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    max_bytes = args.target_kb * 1024 if args.target_kb else None
+    return BatchJob(
+        path, output_path, args.quality, fmt, args.resize, max_bytes, args.min_ssim, args.effort,
+        metadata=args.metadata, to_srgb=args.srgb
+    )
+
+
+def build_jobs(args) -> Iterator[BatchJob]:
+    for path, rel in iter_inputs(args.paths, args.include, args.exclude):
+        yield make_job(args, path, rel)
+
+
+def watch_job_factory(args):
+    """Maps a changed file under one of the watched folders to its job (None if filtered out)."""
+    roots = [os.path.abspath(path) for path in args.paths]
+
+    def job_for(path: str) -> Optional[BatchJob]:
+        path = os.path.abspath(path)
+        root = next((r for r in roots if path.startswith(r + os.sep)), None)
+        if root is None:
+            return None
+        rel = os.path.relpath(path, root)
+        if args.include and not _matches(rel, args.include):
+            return None
+        if args.exclude and _matches(rel, args.exclude):
+            return None
+        return make_job(args, path, rel)
+    return job_for
+
+
+def variant_base(path: str, rel: Optional[str], output_dir: Optional[str]) -> str:
+    """Output path without extension; compress_variants appends -<width>w.<ext>."""
+    target = os.path.join(output_dir, rel or os.path.basename(path)) if output_dir else path
+    return os.path.splitext(target)[0]
+
+
+def run_variants(args, report) -> int:
+    """Responsive image sets: every input is decoded once and written at each width and format."""
+    manifest = {}
+    failed = 0
+    for path, rel in iter_inputs(args.paths, args.include, args.exclude):
+        base = variant_base(path, rel, args.output_dir)
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        formats = args.variant_formats or [args.format or format_from_path(path)]
+        try:
+            results = compress_variants(
+                path, base, args.widths, formats, args.quality, effort=args.effort, max_workers=args.jobs,
+                metadata=args.metadata, to_srgb=args.srgb
+            )
+        except Exception as e:
+            failed += 1
+            report(path, None, str(e))
+            continue
+        for result in results:
+            report(path, result, None)
+        if args.manifest:
+            manifest_dir = os.path.dirname(os.path.abspath(args.manifest))
+            manifest[os.path.relpath(path, manifest_dir).replace(os.sep, "/")] = srcset_manifest(results, manifest_dir)
+
+    if args.manifest:
+        with open(args.manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return 1 if failed else 0
+
+
+def run_watch(args, scheduler: BatchScheduler) -> int:
+    from watch import FolderWatcher
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+    state_path = args.state or os.path.join(args.output_dir or args.paths[0], ".compressor-watch.json")
+    watcher = FolderWatcher(
+        args.paths, watch_job_factory(args), scheduler, state_path,
+        settle=args.settle, poll_interval=args.poll_interval
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def format_queue_status(status) -> str:
+    return (
+        f"queue: {status.done_chunks}/{status.chunks} chunks done, {status.processed} compressed, "
+        f"{status.failed} failed by {len(status.workers)} workers in {status.elapsed:.1f}s: "
+        f"{status.images_per_sec:.2f} img/s, {status.mb_per_sec:.2f} MB/s aggregate"
+        + (f"; {status.expired_leases} expired leases" if status.expired_leases else "")
+    )
+
+
+def run_queue(args, scheduler_options, report) -> int:
+    """Enqueues the inputs and/or works on (or reports) a shared work queue."""
+    from workqueue import QueueWorker, WorkQueue, create_queue, run_local_nodes
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+    if args.paths:
+        manifest = create_queue(args.queue, build_jobs(args), args.chunk_size, args.lease_ttl)
+        print(f"queued {manifest['files']} files in {manifest['chunks']} chunks", file=sys.stderr)
+
+    if args.status:
+        status = WorkQueue(args.queue).status()
+        record = asdict(status)
+        record.update(images_per_sec=status.images_per_sec, mb_per_sec=status.mb_per_sec, complete=status.complete)
+        sys.stdout.write(json.dumps(record) + "\n")
+        return 0
+    if args.nodes:
+        status = run_local_nodes(args.queue, args.nodes, scheduler_options)
+    elif args.work:
+        worker = QueueWorker(WorkQueue(args.queue), lambda: BatchScheduler(**scheduler_options))
+        try:
+            worker.run(on_result=report)
+        except KeyboardInterrupt:
+            worker.stop()
+        status = WorkQueue(args.queue).status()
+    else:
+        return 0
+    print(format_queue_status(status), file=sys.stderr)
+    return 1 if status.failed or not status.complete else 0
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Compress images without the GUI.")
+    parser.add_argument("paths", nargs="*", help="Image files and/or folders (walked recursively)")
+    parser.add_argument("-q", "--quality", type=int, default=85, help="Quality 1-100 (default: 85)")
+    parser.add_argument("-r", "--resize", type=float, default=1.0, help="Resize ratio, e.g. 0.5 (default: 1.0)")
+    parser.add_argument("-f", "--format", type=str.upper, choices=["JPEG", "PNG", "WEBP", AUTO_FORMAT],
+                        help="Output format; AUTO keeps the smallest of JPEG, WebP and PNG per image "
+                             "(default: same as input)")
+    parser.add_argument("-e", "--effort", choices=list(EFFORT_PRESETS), default=DEFAULT_EFFORT,
+                        help=f"Encoder effort: speed vs. output size (default: {DEFAULT_EFFORT})")
+    parser.add_argument("-m", "--metadata", choices=METADATA_POLICIES, default=DEFAULT_METADATA,
+                        help="strip: write no metadata, icc: keep the ICC profile only, "
+                             f"orient: apply EXIF rotation to the pixels and keep ICC (default: {DEFAULT_METADATA})")
+    parser.add_argument("--srgb", action="store_true",
+                        help="Convert pixels from the embedded color profile to sRGB and drop the profile")
+    parser.add_argument("-o", "--output-dir", help="Mirror results into this folder (default: next to sources)")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="Only process files matching this glob (repeatable)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="Skip files matching this glob (repeatable)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="Result cache folder: unchanged inputs are not compressed again")
+    parser.add_argument("--cache-size", type=int, default=1024, metavar="MB",
+                        help="Max size of cached outputs in MB (default: 1024)")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="RAM for image buffers across all workers (default: half of RAM, 0: no limit)")
+    parser.add_argument("--dedupe", choices=DEDUPE_MODES, default=None,
+                        help="Compress duplicate inputs once and link or copy the output: exact (identical files) "
+                             "or near (also re-exported copies of the same picture)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print per-stage time percentiles to stderr at the end")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and compress new or changed files in the given folders")
+    parser.add_argument("--state", metavar="FILE",
+                        help="Watch state file (default: .compressor-watch.json in the output or first folder)")
+    parser.add_argument("--settle", type=float, default=2.0, metavar="SECONDS",
+                        help="Watch: a file is processed once unchanged this long (default: 2)")
+    parser.add_argument("--poll-interval", type=float, default=2.0, metavar="SECONDS",
+                        help="Watch: scan interval where inotify is unavailable (default: 2)")
+    parser.add_argument("--target-kb", type=int, default=None,
+                        help="Fit each file into this many KB (searches quality and scale)")
+    parser.add_argument("--min-ssim", type=float, default=None,
+                        help="Use the lowest quality whose SSIM is at least this, e.g. 0.98")
+    parser.add_argument("--widths", type=int, nargs="+", metavar="PX",
+                        help="Responsive set: write every input at these widths (name-<width>w.<ext>)")
+    parser.add_argument("--variant-formats", type=str.upper, nargs="+", choices=["JPEG", "PNG", "WEBP"],
+                        metavar="FORMAT", help="Responsive set: formats to write (default: --format or input format)")
+    parser.add_argument("--manifest", metavar="FILE",
+                        help="Responsive set: write a JSON srcset manifest of all variants")
+    parser.add_argument("--queue", metavar="DIR",
+                        help="Shared work queue folder: inputs given are enqueued there (see --work)")
+    parser.add_argument("--work", action="store_true",
+                        help="Queue: claim and compress chunks until the whole queue is done (run on every host)")
+    parser.add_argument("--nodes", type=int, default=None, metavar="N",
+                        help="Queue: run N local worker processes standing in for hosts, each with --jobs workers")
+    parser.add_argument("--status", action="store_true",
+                        help="Queue: print progress and aggregate throughput as JSON")
+    parser.add_argument("--chunk-size", type=int, default=256, metavar="FILES",
+                        help="Queue: files per claimed chunk (default: 256)")
+    parser.add_argument("--lease-ttl", type=float, default=120.0, metavar="SECONDS",
+                        help="Queue: a chunk whose worker stops renewing its lease this long is claimed again "
+                             "(default: 120)")
+    args = parser.parse_args(argv)
+
+    if not args.paths and not (args.queue and (args.work or args.nodes or args.status)):
+        parser.error("the following arguments are required: paths")
+    if (args.work or args.nodes or args.status) and not args.queue:
+        parser.error("--work, --nodes and --status need --queue")
+    if args.queue and (args.watch or args.widths):
+        parser.error("--queue cannot be combined with --watch or --widths")
+    if args.chunk_size <= 0 or args.lease_ttl <= 0 or (args.nodes is not None and args.nodes <= 0):
+        parser.error("--chunk-size, --lease-ttl and --nodes must be positive")
+    if not 1 <= args.quality <= 100:
+        parser.error("--quality must be between 1 and 100")
+    if not 0 < args.resize <= 1:
+        parser.error("--resize must be in (0, 1]")
+    if args.min_ssim is not None and args.target_kb:
+        parser.error("--min-ssim and --target-kb cannot be combined")
+    if args.min_ssim is not None and not 0 < args.min_ssim <= 1:
+        parser.error("--min-ssim must be in (0, 1]")
+    if args.watch and not all(os.path.isdir(path) for path in args.paths):
+        parser.error("--watch needs folders")
+    if (args.variant_formats or args.manifest) and not args.widths:
+        parser.error("--variant-formats and --manifest need --widths")
+    if args.widths and (args.watch or args.target_kb or args.min_ssim is not None or args.resize != 1.0):
+        parser.error("--widths cannot be combined with --watch, --target-kb, --min-ssim or --resize")
+    if args.format == AUTO_FORMAT and (args.target_kb or args.min_ssim is not None or args.widths):
+        parser.error("--format auto cannot be combined with --target-kb, --min-ssim or --widths")
+    if args.widths and min(args.widths) <= 0:
+        parser.error("--widths must be positive")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    timing_stats = TimingStats()
+
+    def write_record(input_path, result, error, output_path=None):
+        record = {"input_path": input_path}
+        if result is not None:
+            record.update(asdict(result))
+            if result.timings:
+                timing_stats.add(result.timings)
+        else:
+            record.update({"output_path": output_path, "error": error})
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+    def report(job, result, error):
+        write_record(job.input_path, result, error, job.output_path)
+
+    if args.widths:
+        return run_variants(args, write_record)
+
+    memory_budget = args.memory_budget * 1024 * 1024 if args.memory_budget is not None else None
+    scheduler_options = dict(
+        max_workers=args.jobs, cache_dir=args.cache, cache_max_bytes=args.cache_size * 1024 * 1024,
+        memory_budget=memory_budget, dedupe=args.dedupe
+    )
+    if args.queue:
+        return run_queue(args, scheduler_options, report)
+    scheduler = BatchScheduler(**scheduler_options)
+    if args.watch:
+        return run_watch(args, scheduler)
+    summary = scheduler.run(build_jobs(args), on_result=report)
+
+    print(
+        f"{len(summary.results)} compressed, {len(summary.failures)} failed: "
+        f"{summary.original_size_mb:.2f}MB -> {summary.compressed_size_mb:.2f}MB "
+        f"(-{summary.compression_ratio:.1f}%)",
+        file=sys.stderr
+    )
+    if summary.metadata_bytes_saved:
+        print(f"metadata: {summary.metadata_bytes_saved / 1024:.1f} KB removed", file=sys.stderr)
+    if summary.duplicates:
+        print(f"dedupe: {summary.duplicates} duplicates ({summary.duplicate_input_mb:.2f}MB) reused "
+              f"instead of compressed", file=sys.stderr)
+    if summary.passthrough_count:
+        print(f"passthrough: {summary.passthrough_count} JPEGs already at or below the requested quality, "
+              f"copied unchanged", file=sys.stderr)
+    if args.cache:
+        processed = len(summary.results) + len(summary.failures)
+        print(f"cache: {summary.cache_hits} hits, {processed - summary.cache_hits} misses", file=sys.stderr)
+    if args.timings and timing_stats.samples:
+        print(timing_stats.report(), file=sys.stderr)
+    return 1 if summary.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Duplicate detection for batches: inputs that would produce the same output are
+compressed once, and the result is reused for the rest of the group.
+
+exact - byte-identical inputs (content hash) with identical job settings
+near  - additionally re-exported copies: same dimensions and settings, dHash within
+        max_distance bits and a tiny colour thumbnail within max_color_diff. Hash
+        matches are only candidates: both images are then compared block by block
+        on a CONFIRM_SIZE decode, so pictures that share a layout (screenshots that
+        differ in a label) never get each other's output
+"""
+import json
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from cache import file_digest
+
+if TYPE_CHECKING:
+    # Imported where needed: the CLI loads this module for DEDUPE_MODES even without --dedupe
+    import numpy as np
+
+DEDUPE_MODES = ("exact", "near")
+# Differing dHash bits still counted as the same picture (re-encodes flip a few at most)
+DEFAULT_MAX_DISTANCE = 2
+# Mean absolute difference (0-255) of the 8x9 RGBA thumbnails: keeps flat images
+# of different colours apart, whose dHashes are all equal
+DEFAULT_MAX_COLOR_DIFF = 4.0
+HASH_SIZE = 8
+# Longer edge of the decode that confirms a near match
+CONFIRM_SIZE = 512
+# Largest mean absolute difference (0-255) in any 8x8 block of that decode: re-encodes
+# stay well below it, a changed price, SKU or label exceeds it in the blocks it covers
+CONFIRM_BLOCK = 8
+DEFAULT_MAX_BLOCK_DIFF = 6.0
+
+
+def image_signature(path: str) -> Tuple[Tuple[int, int], "np.ndarray", "np.ndarray"]:
+    """
+    (size, dHash bits, thumbnail) of an image from a tiny decode.
+    JPEGs are drafted at 1/8 scale, so only a fraction of the pixels is decoded.
+    """
+    import numpy as np
+
+    with Image.open(path) as img:
+        size = img.size
+        img.draft("RGB", (HASH_SIZE * 4, HASH_SIZE * 4))
+        small = img.convert("RGBA").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    thumb = np.asarray(small, dtype=np.int16)
+    gray = np.asarray(small.convert("L"), dtype=np.int16)
+    # dHash: is each pixel brighter than its left neighbour
+    bits = (gray[:, 1:] > gray[:, :-1]).ravel()
+    return size, bits, thumb
+
+
+def confirmation_pixels(path: str) -> "np.ndarray":
+    """RGBA pixels at CONFIRM_SIZE; images of equal size always give arrays of equal shape."""
+    import numpy as np
+
+    with Image.open(path) as img:
+        scale = min(1.0, CONFIRM_SIZE / max(img.size))
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img.draft("RGB", size)
+        return np.asarray(img.convert("RGBA").resize(size, Image.Resampling.BOX), dtype=np.int16)
+
+
+def max_block_diff(first: "np.ndarray", second: "np.ndarray") -> float:
+    """Largest mean absolute difference over the CONFIRM_BLOCK blocks of two equal-shape arrays."""
+    diff = abs(first - second)
+    height, width = diff.shape[0], diff.shape[1]
+    # Edge blocks are padded with edge values: their pixels still count
+    pad_h, pad_w = -height % CONFIRM_BLOCK, -width % CONFIRM_BLOCK
+    if pad_h or pad_w:
+        import numpy as np
+
+        diff = np.pad(diff, ((0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+    blocks = diff.reshape(diff.shape[0] // CONFIRM_BLOCK, CONFIRM_BLOCK, diff.shape[1] // CONFIRM_BLOCK,
+                          CONFIRM_BLOCK, diff.shape[2])
+    return float(blocks.mean(axis=(1, 3, 4)).max())
+
+
+def job_params(job) -> str:
+    """Every job setting that affects the output, as a stable key."""
+    params = asdict(job)
+    del params["input_path"], params["output_path"]
+    return json.dumps(params, sort_keys=True)
+
+
+class Deduplicator:
+    """
+    Assigns each job a group id; jobs in the same group share one compression.
+    group() returns None for inputs that can't be read (the worker reports the error).
+    """
+
+    def __init__(
+        self, mode: str = "exact", max_distance: int = DEFAULT_MAX_DISTANCE,
+        max_color_diff: float = DEFAULT_MAX_COLOR_DIFF, max_block_diff: float = DEFAULT_MAX_BLOCK_DIFF
+    ):
+        if mode not in DEDUPE_MODES:
+            raise ValueError(f"unknown dedupe mode: {mode}")
+        self.mode = mode
+        self.max_distance = max_distance
+        self.max_color_diff = max_color_diff
+        self.max_block_diff = max_block_diff
+        # group -> input of its first job, the reference a near match is confirmed against
+        self._leaders: Dict[int, str] = {}
+        self._exact: Dict[Tuple[str, str], int] = {}
+        # (settings, size) -> group ids with their stacked dHashes and thumbnails
+        self._near: Dict[Tuple[str, Tuple[int, int]], Tuple[List[int], "np.ndarray", "np.ndarray"]] = {}
+        self._groups = 0
+
+    def group(self, job) -> Optional[int]:
+        params = job_params(job)
+        try:
+            exact_key = (file_digest(job.input_path), params)
+        except OSError:
+            return None
+        if exact_key in self._exact:
+            return self._exact[exact_key]
+
+        group = None
+        signature = None
+        if self.mode == "near":
+            try:
+                size, bits, thumb = signature = image_signature(job.input_path)
+            except Exception:
+                return None
+            group = self._confirmed_match(job.input_path, self._match((params, size), bits, thumb))
+
+        if group is None:
+            group = self._groups
+            self._groups += 1
+            self._leaders[group] = job.input_path
+            if signature is not None:
+                self._add((params, signature[0]), group, signature[1], signature[2])
+        self._exact[exact_key] = group
+        return group
+
+    def _confirmed_match(self, path: str, candidates: List[int]) -> Optional[int]:
+        """First candidate group whose leader matches path block by block."""
+        pixels = None
+        for group in candidates:
+            try:
+                if pixels is None:
+                    pixels = confirmation_pixels(path)
+                if max_block_diff(pixels, confirmation_pixels(self._leaders[group])) <= self.max_block_diff:
+                    return group
+            except Exception:
+                # Unreadable now: never reuse an output that can't be confirmed
+                continue
+        return None
+
+    def _match(self, key, bits: "np.ndarray", thumb: "np.ndarray") -> List[int]:
+        """Groups whose hash and thumbnail are close enough to be candidates."""
+        import numpy as np
+
+        if key not in self._near:
+            return []
+        groups, all_bits, thumbs = self._near[key]
+        # All candidates of the same size and settings are compared at once
+        distances = (all_bits != bits).sum(axis=1)
+        color_diffs = np.abs(thumbs - thumb).mean(axis=(1, 2, 3))
+        matches = np.flatnonzero((distances <= self.max_distance) & (color_diffs <= self.max_color_diff))
+        return [groups[i] for i in matches]
+
+    def _add(self, key, group: int, bits: "np.ndarray", thumb: "np.ndarray"):
+        import numpy as np
+
+        if key in self._near:
+            groups, all_bits, thumbs = self._near[key]
+            self._near[key] = (groups + [group], np.vstack([all_bits, bits]), np.concatenate([thumbs, thumb[None]]))
+        else:
+            self._near[key] = ([group], bits[None], thumb[None])
@@ -0,0 +1,173 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+from algorithms import (
+    BYTES_PER_MB, DEFAULT_EFFORT, DEFAULT_METADATA, encode_for_format, estimate_jpeg_quality, plan_source
+)
+from probe import MetadataProbe
+
+
+@dataclass
+class _SourceSample:
+    """Everything the estimator keeps from a single decode of the source file."""
+    original_res: Tuple[int, int]
+    original_bytes: int
+    working: Image.Image          # whole image, downscaled to WORKING_MAX_SIDE
+    tiles: List[Image.Image]      # full-resolution crops spread over the image
+    source_quality: Optional[int] = None    # JPEG sources only
+    info: Dict[str, Any] = field(default_factory=dict)    # header metadata, for plan_source
+
+
+class SizeEstimator:
+    """
+    Predicts the output size of compress_image by trial-encoding samples
+    with the real encoder settings (encode_for_format).
+
+    Each file is decoded once. Small targets are encoded whole from the
+    downscaled working copy; for large targets the working copy encode is
+    extrapolated using a grid of full-resolution tiles scaled to the target.
+    Thread-safe, so it can be shared by background workers.
+    """
+
+    WORKING_MAX_SIDE = 1024
+    TILE_SIZE = 384
+    TILE_GRID = 3
+
+    def __init__(self, cache_size: int = 256, source_cache_size: int = 8, probe: MetadataProbe = None):
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._sources = OrderedDict()
+        self._source_cache_size = source_cache_size
+        self._lock = threading.Lock()
+        # Shared with the GUI, so file sizes of a dropped batch are read once
+        self.probe = probe or MetadataProbe()
+
+    def estimate(
+        self, path: str, quality: int, resize_ratio: float, output_format: str, effort: str = DEFAULT_EFFORT,
+        metadata: str = DEFAULT_METADATA, to_srgb: bool = False
+    ) -> float:
+        """Returns the estimated output size in MB."""
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        key = (file_key, quality, round(resize_ratio, 4), output_format.upper(), effort, metadata, to_srgb)
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+            source = self._load_source(file_key)
+            # Same up-front decision as compress_image: passed-through files keep their size
+            action, quality = plan_source(
+                source.source_quality, quality, output_format, resize_ratio, metadata, to_srgb, source.info
+            )
+            if action == "passthrough":
+                estimated_bytes = source.original_bytes
+            else:
+                estimated_bytes = self._estimate_bytes(source, quality, resize_ratio, output_format, effort)
+            # compress_image never produces a file larger than the original
+            estimated = min(estimated_bytes, source.original_bytes) / BYTES_PER_MB
+
+            self._cache[key] = estimated
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return estimated
+
+    def _load_source(self, file_key) -> _SourceSample:
+        if file_key in self._sources:
+            self._sources.move_to_end(file_key)
+            return self._sources[file_key]
+
+        path, _, size = file_key
+        with Image.open(path) as img:
+            source_quality = estimate_jpeg_quality(getattr(img, "quantization", None)) if img.format == "JPEG" else None
+            info = dict(img.info)
+            img.load()
+            width, height = img.size
+            tiles = []
+            tile = min(self.TILE_SIZE, width, height)
+            for row in range(self.TILE_GRID):
+                for col in range(self.TILE_GRID):
+                    left = (width - tile) * (2 * col + 1) // (2 * self.TILE_GRID)
+                    top = (height - tile) * (2 * row + 1) // (2 * self.TILE_GRID)
+                    tiles.append(img.crop((left, top, left + tile, top + tile)))
+
+            working = img.copy()
+            working.thumbnail((self.WORKING_MAX_SIDE, self.WORKING_MAX_SIDE), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        source = _SourceSample((width, height), size, working, tiles, source_quality, info)
+        self._sources[file_key] = source
+        if len(self._sources) > self._source_cache_size:
+            self._sources.popitem(last=False)
+        return source
+
+    def _estimate_bytes(
+        self, source: _SourceSample, quality: int, resize_ratio: float, output_format: str, effort: str
+    ) -> int:
+        ratio = min(resize_ratio, 1.0)
+        target_w = max(1, int(source.original_res[0] * ratio))
+        target_h = max(1, int(source.original_res[1] * ratio))
+
+        # The working copy already holds enough pixels: encode the whole target
+        if target_w <= source.working.width and target_h <= source.working.height:
+            sample = source.working.resize((target_w, target_h), Image.Resampling.LANCZOS)
+            return len(encode_for_format(sample, quality, output_format, effort))
+
+        # Otherwise the working copy gives the content-wide bytes per pixel at its own
+        # scale, and the full-resolution tiles measure how that changes at the target scale
+        working_scale = source.working.width / source.original_res[0]
+        working = source.working
+        overhead = self._overhead(working, quality, output_format, effort)
+        working_bpp = (len(encode_for_format(working, quality, output_format, effort)) - overhead) / \
+            (working.width * working.height)
+
+        scale_factor = self._tiles_bpp(source, ratio, quality, output_format, effort) / \
+            self._tiles_bpp(source, working_scale, quality, output_format, effort)
+        return int(overhead + working_bpp * scale_factor * target_w * target_h)
+
+    @staticmethod
+    def _overhead(img: Image.Image, quality: int, output_format: str, effort: str) -> int:
+        # Headers and tables are paid once per file, not per pixel
+        return len(encode_for_format(img.crop((0, 0, 1, 1)), quality, output_format, effort))
+
+    def _tiles_bpp(
+        self, source: _SourceSample, ratio: float, quality: int, output_format: str, effort: str
+    ) -> float:
+        tile_bytes = 0
+        tile_pixels = 0
+        for tile in source.tiles:
+            scaled = tile.resize(
+                (max(1, int(tile.width * ratio)), max(1, int(tile.height * ratio))),
+                Image.Resampling.LANCZOS
+            )
+            encoded = len(encode_for_format(scaled, quality, output_format, effort))
+            tile_bytes += max(1, encoded - self._overhead(scaled, quality, output_format, effort))
+            tile_pixels += scaled.width * scaled.height
+        return tile_bytes / tile_pixels
+
+    def estimate_many(
+        self, items: List[Tuple[str, str]], quality: int, resize_ratio: float,
+        sample_size: int = 8, effort: str = DEFAULT_EFFORT, metadata: str = DEFAULT_METADATA, to_srgb: bool = False
+    ) -> float:
+        """
+        Estimates the total output size (MB) of (path, format) items.
+        Large batches are sampled evenly and scaled by the share of input bytes sampled.
+        """
+        if not items:
+            return 0.0
+        step = max(1, len(items) // sample_size)
+        sample = items[::step][:sample_size]
+
+        estimated = sum(
+            self.estimate(path, quality, resize_ratio, fmt, effort, metadata, to_srgb) for path, fmt in sample
+        )
+        if len(sample) == len(items):
+            return estimated
+        sizes = {path: info.file_size for path, info in self.probe.probe_many(path for path, _ in items).items() if info}
+        sampled_bytes = sum(sizes.get(path, 0) for path, _ in sample)
+        total_bytes = sum(sizes.values())
+        return estimated * total_bytes / sampled_bytes if sampled_bytes else 0.0
@@ -1,45 +1,141 @@
 import sys
 import os
+from typing import TYPE_CHECKING
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QFileDialog, QMessageBox, QProgressBar, QFrame, QSlider
+    QFileDialog, QMessageBox, QProgressBar, QFrame, QSlider, QCheckBox, QSpinBox, QDoubleSpinBox,
+    QComboBox, QScrollArea, QApplication
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QMimeData, QTimer
-from PyQt5.QtGui import QDragEnterEvent, QDropEvent
-from PIL import Image
-from algorithms import compress_image, get_size_mb
-from models import CompressionResult
+from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QImage, QPixmap
+from algorithms import AUTO_FORMAT, BYTES_PER_MB, DEFAULT_EFFORT, DEFAULT_METADATA, EFFORT_PRESETS, format_from_path
+from estimator import SizeEstimator
+from preview import PreviewRenderer
+from probe import MetadataProbe
+from models import BatchSummary, CompressionResult
+from profiling import format_stages
+
+if TYPE_CHECKING:
+    # batch (process pool, result cache) is imported on first use: it isn't needed to show the window
+    from batch import BatchJob
 
 # --- WORKER THREAD ---
 class CompressionWorker(QThread):
     finished = pyqtSignal(CompressionResult)
     error = pyqtSignal(str)
 
-    def __init__(self, input_path, output_path, quality, output_format, resize_ratio):
+    def __init__(self, job: "BatchJob"):
         super().__init__()
-        self.input_path = input_path
-        self.output_path = output_path
-        self.quality = quality
-        self.output_format = output_format
-        self.resize_ratio = resize_ratio
+        # Same job description as batch mode, so both paths pick the mode identically
+        self.job = job
 
     def run(self):
+        from batch import compress_job
+
         try:
-            result = compress_image(
-                self.input_path, self.output_path, self.quality, 
-                self.output_format, self.resize_ratio
-            )
+            result = compress_job(self.job)
             self.finished.emit(result)
         except Exception as e:
             self.error.emit(str(e))
 
+class BatchWorker(QThread):
+    """Drives a BatchScheduler off the GUI thread and reports per-file progress."""
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(BatchSummary)
+
+    def __init__(self, jobs, max_workers=None):
+        from batch import BatchScheduler
+
+        super().__init__()
+        self.jobs = jobs
+        # Identical files in a dropped folder are compressed once
+        self.scheduler = BatchScheduler(max_workers, dedupe="exact")
+
+    def cancel(self):
+        self.scheduler.cancel()
+
+    def run(self):
+        total = len(self.jobs)
+        summary = self.scheduler.run(self.jobs, lambda done, job: self.progress.emit(done, total))
+        self.finished.emit(summary)
+
+class EstimationWorker(QThread):
+    """Runs the sampled-encode size estimate off the GUI thread."""
+    estimated = pyqtSignal(int, float)
+
+    def __init__(self, estimator, request_id, items, quality, resize_ratio, effort=DEFAULT_EFFORT,
+                 metadata=DEFAULT_METADATA):
+        super().__init__()
+        self.estimator = estimator
+        self.request_id = request_id
+        self.items = items
+        self.quality = quality
+        self.resize_ratio = resize_ratio
+        self.effort = effort
+        self.metadata = metadata
+
+    def run(self):
+        try:
+            size = self.estimator.estimate_many(
+                self.items, self.quality, self.resize_ratio, effort=self.effort, metadata=self.metadata
+            )
+        except Exception:
+            size = -1.0
+        self.estimated.emit(self.request_id, size)
+
+class ProbeWorker(QThread):
+    """Reads image headers (size, dimensions) off the GUI thread."""
+    probed = pyqtSignal(int, object)
+
+    def __init__(self, probe, request_id, paths):
+        super().__init__()
+        self.probe = probe
+        self.request_id = request_id
+        self.paths = paths
+
+    def run(self):
+        self.probed.emit(self.request_id, self.probe.probe_many(self.paths))
+
+class PreviewWorker(QThread):
+    """Renders the before/after preview crop off the GUI thread."""
+    rendered = pyqtSignal(int, object)
+
+    def __init__(self, renderer, request_id, is_stale, path, quality, resize_ratio, output_format, effort, metadata):
+        super().__init__()
+        self.renderer = renderer
+        self.request_id = request_id
+        self.is_stale = is_stale
+        self.path = path
+        self.quality = quality
+        self.resize_ratio = resize_ratio
+        self.output_format = output_format
+        self.effort = effort
+        self.metadata = metadata
+
+    def run(self):
+        try:
+            preview = self.renderer.render(
+                self.path, self.quality, self.resize_ratio, self.output_format, self.effort, self.is_stale,
+                metadata=self.metadata
+            )
+        except Exception:
+            preview = None
+        self.rendered.emit(self.request_id, preview)
+
+def pil_to_pixmap(img):
+    rgba = img.convert("RGBA")
+    qimage = QImage(rgba.tobytes(), rgba.width, rgba.height, rgba.width * 4, QImage.Format_RGBA8888)
+    # copy() detaches the QImage from the Python bytes buffer
+    return QPixmap.fromImage(qimage.copy())
+
 # --- DRAG & DROP WIDGET ---
 class DropArea(QLabel):
     file_dropped = pyqtSignal(str)
+    files_dropped = pyqtSignal(list)
 
     def __init__(self):
         super().__init__()
-        self.setText("☁ Drag image here\nor click to select")
+        self.setText("☁ Drag images or folders here\nor click to select")
         self.setAlignment(Qt.AlignCenter)
         self.setAcceptDrops(True)
         self.setObjectName("dropArea")
@@ -51,29 +147,43 @@ class DropArea(QLabel):
             event.ignore()
 
     def dropEvent(self, event: QDropEvent):
+        from batch import iter_image_files
+
         urls = event.mimeData().urls()
         if urls:
-            file_path = urls[0].toLocalFile()
-            # Check file extension
-            if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                self.file_dropped.emit(file_path)
-            else:
+            # Folders are expanded recursively, unsupported files are skipped
+            paths = list(iter_image_files(url.toLocalFile() for url in urls))
+            if not paths:
                 QMessageBox.warning(self, "Error", "Only images are supported (JPG, PNG, WEBP)")
+            elif len(paths) == 1:
+                self.file_dropped.emit(paths[0])
+            else:
+                self.files_dropped.emit(paths)
 
     def mousePressEvent(self, event):
         # Click on area opens input file selection dialog (select_input_file)
         if event.button() == Qt.LeftButton:
             self.file_dropped.emit("CLICK")
 
+PREVIEW_TITLE = "Preview: original | compressed"
+WINDOW_WIDTH = 380
+# Height that shows every card at once; smaller screens get a scrollable window
+CONTENT_HEIGHT = 1035
+
 # --- MAIN WINDOW ---
 class ImageCompressorApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Image Compressor Pro")
-        self.setFixedSize(380, 650)
-        
+        self.setFixedWidth(WINDOW_WIDTH)
+
+        # The cards scroll vertically, so the window fits 768 px screens
         self.central_widget = QWidget()
-        self.setCentralWidget(self.central_widget)
+        self.scroll_area = QScrollArea()
+        self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.scroll_area.setWidget(self.central_widget)
+        self.setCentralWidget(self.scroll_area)
         self.layout = QVBoxLayout(self.central_widget)
         self.layout.setContentsMargins(15, 15, 15, 15)
         self.layout.setSpacing(8)
@@ -82,20 +192,42 @@ class ImageCompressorApp(QMainWindow):
         self.original_size_mb = 0.0
         self.original_width = 0
         self.original_height = 0
+
+        # Files queued for batch compression (empty in single-file mode)
+        self.batch_paths = []
         
-        # Debounce timer for size estimation
+        # Header probing runs in background workers and is cached for the estimator
+        self.probe = MetadataProbe()
+        self.probe_request = 0
+        self.probe_workers = set()
+
+        # Size estimation runs in background workers; only the latest request is shown
+        self.estimator = SizeEstimator(probe=self.probe)
+        self.estimation_request = 0
+        self.estimation_workers = set()
+
+        # Preview: at most one render runs; requests made meanwhile collapse into the latest
+        self.preview_renderer = PreviewRenderer()
+        self.preview_request = 0
+        self.preview_worker = None
+        self.preview_pending = None
+
+        # Debounce timer for size estimation and preview
         self.estimation_timer = QTimer()
         self.estimation_timer.setSingleShot(True)
         self.estimation_timer.timeout.connect(self.update_estimated_size)
+        self.estimation_timer.timeout.connect(self.update_preview)
 
         self.setup_ui()
         self.apply_stylesheet()
+        self.fit_to_screen()
 
     def setup_ui(self):
         # 1. Drag & Drop Area
         self.drop_area = DropArea()
         self.drop_area.setFixedHeight(80)
         self.drop_area.file_dropped.connect(self.handle_file_drop)
+        self.drop_area.files_dropped.connect(self.handle_files_drop)
         self.layout.addWidget(self.drop_area)
 
         # 2. Paths Card
@@ -105,6 +237,8 @@ class ImageCompressorApp(QMainWindow):
         
         self.input_entry = self._create_row(path_layout, "Input:", read_only=True)
         self.output_entry = self._create_row(path_layout, "Output:")
+        # Output extension decides the format, so it affects the estimate
+        self.output_entry.textChanged.connect(self.on_slider_changed)
         
         # Output path selection button
         self.btn_save = QPushButton("Select save location...")
@@ -169,6 +303,78 @@ class ImageCompressorApp(QMainWindow):
         self.resize_slider.valueChanged.connect(lambda v: self.resize_value_label.setText(f"{v}%"))
         resize_setting.addWidget(self.resize_slider)
         settings_layout.addLayout(resize_setting)
+
+        # Target Size Setting: search quality (and scale) to fit a byte budget
+        target_setting = QHBoxLayout()
+        self.target_checkbox = QCheckBox("Target size")
+        self.target_checkbox.setObjectName("sectionLabel")
+        self.target_checkbox.toggled.connect(self.on_target_mode_toggled)
+        self.target_spinbox = QSpinBox()
+        self.target_spinbox.setRange(1, 1024 * 1024)
+        self.target_spinbox.setValue(200)
+        self.target_spinbox.setSuffix(" KB")
+        self.target_spinbox.setObjectName("targetSpinBox")
+        self.target_spinbox.setEnabled(False)
+        self.target_spinbox.valueChanged.connect(self.on_slider_changed)
+        target_setting.addWidget(self.target_checkbox)
+        target_setting.addStretch()
+        target_setting.addWidget(self.target_spinbox)
+        settings_layout.addLayout(target_setting)
+
+        # Perceptual Setting: lowest quality that keeps SSIM above the threshold
+        ssim_setting = QHBoxLayout()
+        self.ssim_checkbox = QCheckBox("Min SSIM")
+        self.ssim_checkbox.setObjectName("sectionLabel")
+        self.ssim_checkbox.toggled.connect(self.on_ssim_mode_toggled)
+        self.ssim_spinbox = QDoubleSpinBox()
+        self.ssim_spinbox.setRange(0.5, 0.999)
+        self.ssim_spinbox.setDecimals(3)
+        self.ssim_spinbox.setSingleStep(0.005)
+        self.ssim_spinbox.setValue(0.98)
+        self.ssim_spinbox.setObjectName("targetSpinBox")
+        self.ssim_spinbox.setEnabled(False)
+        ssim_setting.addWidget(self.ssim_checkbox)
+        ssim_setting.addStretch()
+        ssim_setting.addWidget(self.ssim_spinbox)
+        settings_layout.addLayout(ssim_setting)
+
+        # Encoder Effort: Fast for previews, Max for the smallest final files
+        effort_setting = QHBoxLayout()
+        effort_title = QLabel("Effort")
+        effort_title.setObjectName("sectionLabel")
+        self.effort_combo = QComboBox()
+        for effort in EFFORT_PRESETS:
+            self.effort_combo.addItem(effort.capitalize(), effort)
+        self.effort_combo.setCurrentIndex(self.effort_combo.findData(DEFAULT_EFFORT))
+        self.effort_combo.setObjectName("targetSpinBox")
+        self.effort_combo.currentIndexChanged.connect(self.on_slider_changed)
+        effort_setting.addWidget(effort_title)
+        effort_setting.addStretch()
+        effort_setting.addWidget(self.effort_combo)
+        settings_layout.addLayout(effort_setting)
+
+        # Metadata: what of EXIF / ICC ends up in the output
+        metadata_setting = QHBoxLayout()
+        metadata_title = QLabel("Metadata")
+        metadata_title.setObjectName("sectionLabel")
+        self.metadata_combo = QComboBox()
+        for policy, label in (("orient", "Rotate + ICC"), ("icc", "ICC only"), ("strip", "Strip all")):
+            self.metadata_combo.addItem(label, policy)
+        self.metadata_combo.setCurrentIndex(self.metadata_combo.findData(DEFAULT_METADATA))
+        self.metadata_combo.setObjectName("targetSpinBox")
+        # The policy decides whether a JPEG can be passed through, so it affects the estimate
+        self.metadata_combo.currentIndexChanged.connect(self.on_slider_changed)
+        metadata_setting.addWidget(metadata_title)
+        metadata_setting.addStretch()
+        metadata_setting.addWidget(self.metadata_combo)
+        settings_layout.addLayout(metadata_setting)
+
+        # Auto Format: the smallest of JPEG / WebP / PNG per image, ignoring the output extension
+        self.auto_format_checkbox = QCheckBox("Auto format")
+        self.auto_format_checkbox.setObjectName("sectionLabel")
+        self.auto_format_checkbox.setToolTip("Keep the smallest of JPEG, WebP and PNG for every image")
+        self.auto_format_checkbox.toggled.connect(self.on_auto_format_toggled)
+        settings_layout.addWidget(self.auto_format_checkbox)
         
         # Resolution and Estimated Size at bottom of settings card
         info_container = QVBoxLayout()
@@ -187,7 +393,20 @@ class ImageCompressorApp(QMainWindow):
         settings_layout.addLayout(info_container)
         self.layout.addWidget(settings_card)
 
-        # 4. Progress & Action
+        # 4. Preview Card: centre crop before / after compression
+        preview_card = self._create_card(PREVIEW_TITLE)
+        preview_layout = preview_card.layout()
+        images_row = QHBoxLayout()
+        images_row.setSpacing(8)
+        self.preview_before = self._create_preview_label()
+        self.preview_after = self._create_preview_label()
+        images_row.addWidget(self.preview_before)
+        images_row.addWidget(self.preview_after)
+        preview_layout.addLayout(images_row)
+        self.preview_label = preview_card.findChild(QLabel, "cardTitle")
+        self.layout.addWidget(preview_card)
+
+        # 5. Progress & Action
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 0) # Infinite loading style
         self.progress_bar.hide()
@@ -200,8 +419,24 @@ class ImageCompressorApp(QMainWindow):
         self.compress_button.clicked.connect(self.start_compression)
         self.layout.addWidget(self.compress_button)
 
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setFixedHeight(32)
+        self.cancel_button.setObjectName("secondaryButton")
+        self.cancel_button.clicked.connect(self.cancel_batch)
+        self.cancel_button.hide()
+        self.layout.addWidget(self.cancel_button)
+
         self.layout.addStretch() # Push everything up
 
+    def fit_to_screen(self):
+        """Starts as tall as the content, but never taller than the screen's free area."""
+        screen = QApplication.primaryScreen()
+        height = CONTENT_HEIGHT
+        if screen is not None:
+            # Leaves room for the title bar
+            height = min(height, screen.availableGeometry().height() - 40)
+        self.resize(WINDOW_WIDTH, height)
+
     def apply_stylesheet(self):
         """Apply minimal dark theme stylesheet"""
         self.setStyleSheet("""
@@ -220,6 +455,12 @@ class ImageCompressorApp(QMainWindow):
                 padding: 10px;
                 background: #18181b;
             }
+
+            QScrollArea {
+                border: none;
+                padding: 0;
+                background: #09090b;
+            }
             
             QLabel {
                 border: none;
@@ -227,6 +468,14 @@ class ImageCompressorApp(QMainWindow):
                 font-size: 10pt;
             }
             
+            QLabel#previewImage {
+                border: 1px solid #27272a;
+                border-radius: 4px;
+                padding: 0px;
+                background: #09090b;
+                color: #71717a;
+            }
+            
             QLabel#estimatedSizeLabel {
                 font-size: 12pt;
                 font-weight: bold;
@@ -278,6 +527,14 @@ class ImageCompressorApp(QMainWindow):
                 color: #fafafa;
             }
             
+            QSpinBox#targetSpinBox, QDoubleSpinBox#targetSpinBox, QComboBox#targetSpinBox {
+                background-color: #09090b;
+                border: 1px solid #27272a;
+                border-radius: 8px;
+                padding: 4px 8px;
+                color: #fafafa;
+            }
+            
             QLineEdit#inputField:focus {
                 border-color: #3b82f6;
             }
@@ -331,6 +588,13 @@ class ImageCompressorApp(QMainWindow):
         card.setLayout(layout)
         return card
     
+    def _create_preview_label(self):
+        label = QLabel("-")
+        label.setObjectName("previewImage")
+        label.setAlignment(Qt.AlignCenter)
+        label.setFixedSize(120, 120)
+        return label
+
     def _create_row(self, parent_layout, label_text, read_only=False):
         row = QHBoxLayout()
         row.setSpacing(12)
@@ -359,6 +623,8 @@ class ImageCompressorApp(QMainWindow):
             self.select_input_file()
         else:
             # File was dropped or selected via dialog - update entries only
+            self.batch_paths = []
+            self.output_entry.setPlaceholderText("File path...")
             self.input_entry.setText(path)
             # Automatically generate output path (suggestion only, no dialog)
             folder, filename = os.path.split(path)
@@ -366,32 +632,66 @@ class ImageCompressorApp(QMainWindow):
             new_name = f"{name}_compressed{ext}"
             self.output_entry.setText(os.path.join(folder, new_name))
             
-            # Get original file size and dimensions for estimation
-            if os.path.exists(path):
-                self.original_size_mb = get_size_mb(path)
-                try:
-                    with Image.open(path) as img:
-                        self.original_width, self.original_height = img.size
-                except Exception:
-                    self.original_width = 0
-                    self.original_height = 0
-                self.update_estimated_size()
-            else:
-                self.original_size_mb = 0.0
-                self.original_width = 0
-                self.original_height = 0
-                self.est_label.setText("Estimated Size: -")
-                self.resolution_label.setText("New Resolution: -")
+            # Size and dimensions are read from the header off the GUI thread
+            self.start_probe([path])
+
+    def handle_files_drop(self, paths):
+        """
+        Queues several files for batch compression.
+        Output entry switches to an optional output folder.
+        """
+        self.batch_paths = list(paths)
+        self.input_entry.setText(f"{len(self.batch_paths)} files selected")
+        self.output_entry.clear()
+        self.output_entry.setPlaceholderText("Output folder (default: next to each file)")
+
+        self.start_probe(self.batch_paths)
+
+    def start_probe(self, paths):
+        self.probe_request += 1
+        self.original_size_mb = 0.0
+        self.original_width = 0
+        self.original_height = 0
+        self.est_label.setText("Estimated Size: reading...")
+        self.resolution_label.setText("New Resolution: -")
+        self.show_preview(None)
+        worker = ProbeWorker(self.probe, self.probe_request, paths)
+        worker.probed.connect(self.on_probe_ready)
+        worker.finished.connect(lambda: self.probe_workers.discard(worker))
+        self.probe_workers.add(worker)
+        worker.start()
+
+    def on_probe_ready(self, request_id, infos):
+        # A newer drop replaced this one
+        if request_id != self.probe_request:
+            return
+        readable = [info for info in infos.values() if info]
+        self.original_size_mb = sum(info.file_size for info in readable) / BYTES_PER_MB
+        if not self.batch_paths and readable:
+            self.original_width, self.original_height = readable[0].size
+        if not readable:
+            self.est_label.setText("Estimated Size: -")
+            return
+        self.update_estimated_size()
+        self.update_preview()
 
     def select_input_file(self):
-        """Opens file selection dialog for input file using getOpenFileName."""
-        path, _ = QFileDialog.getOpenFileName(self, "Select File", "", "Images (*.jpg *.png *.webp)")
-        if path:
+        """Opens file selection dialog for input files using getOpenFileNames."""
+        paths, _ = QFileDialog.getOpenFileNames(self, "Select Files", "", "Images (*.jpg *.jpeg *.png *.webp)")
+        if len(paths) == 1:
             # Pass the selected path to handle_file_drop (no save dialog triggered)
-            self.handle_file_drop(path)
+            self.handle_file_drop(paths[0])
+        elif paths:
+            self.handle_files_drop(paths)
 
     def select_output_file(self):
         """Opens file save dialog for output file using getSaveFileName."""
+        if self.batch_paths:
+            folder = QFileDialog.getExistingDirectory(self, "Output Folder", self.output_entry.text())
+            if folder:
+                self.output_entry.setText(folder)
+            return
+
         current_out = self.output_entry.text()
         start_dir = os.path.dirname(current_out) if current_out else ""
         path, _ = QFileDialog.getSaveFileName(
@@ -412,8 +712,60 @@ class ImageCompressorApp(QMainWindow):
             self.compress_button.setText("Compressing...")
         else:
             self.progress_bar.hide()
+            self.cancel_button.hide()
             self.compress_button.setText("Compress Image")
 
+    def target_max_bytes(self):
+        """Byte budget in target-size mode, None otherwise."""
+        if not self.target_checkbox.isChecked():
+            return None
+        return self.target_spinbox.value() * 1024
+
+    def min_ssim(self):
+        """SSIM threshold in perceptual mode, None otherwise."""
+        return self.ssim_spinbox.value() if self.ssim_checkbox.isChecked() else None
+
+    def make_job(self, in_path, out_path, fmt):
+        from batch import BatchJob
+
+        return BatchJob(
+            in_path, out_path, self.quality_slider.value(), fmt, self.resize_slider.value() / 100.0,
+            self.target_max_bytes(), self.min_ssim(), self.effort_combo.currentData(),
+            metadata=self.metadata_combo.currentData()
+        )
+
+    def output_format(self, path):
+        """AUTO in auto-format mode, otherwise the format of the path's extension."""
+        return AUTO_FORMAT if self.auto_format_checkbox.isChecked() else format_from_path(path)
+
+    def on_auto_format_toggled(self, enabled):
+        # Target and SSIM searches run on a single known format
+        if enabled:
+            self.target_checkbox.setChecked(False)
+            self.ssim_checkbox.setChecked(False)
+        self.update_estimated_size()
+        self.update_preview()
+
+    def on_target_mode_toggled(self, enabled):
+        # In target mode quality is searched automatically; Size acts as the upper bound
+        if enabled:
+            self.ssim_checkbox.setChecked(False)
+            self.auto_format_checkbox.setChecked(False)
+        self.target_spinbox.setEnabled(enabled)
+        self.quality_slider.setEnabled(not enabled and not self.ssim_checkbox.isChecked())
+        self.update_estimated_size()
+        self.update_preview()
+
+    def on_ssim_mode_toggled(self, enabled):
+        # Quality is searched per image; modes are mutually exclusive
+        if enabled:
+            self.target_checkbox.setChecked(False)
+            self.auto_format_checkbox.setChecked(False)
+        self.ssim_spinbox.setEnabled(enabled)
+        self.quality_slider.setEnabled(not enabled and not self.target_checkbox.isChecked())
+        self.update_estimated_size()
+        self.update_preview()
+
     def on_slider_changed(self):
         """Triggered when any slider changes - starts debounced timer"""
         self.estimation_timer.stop()
@@ -427,17 +779,7 @@ class ImageCompressorApp(QMainWindow):
             return
         
         quality = self.quality_slider.value()
-        resize = self.resize_slider.value()
-        resize_ratio = resize / 100.0
-        
-        # Special case: if quality is 100 and resize is 100, Est. Size = Original Size
-        if quality == 100 and resize == 100:
-            estimated_size = self.original_size_mb
-        else:
-            # Formula: EstSize = OriginalSize * (Quality/100) * ((Resize/100)^2)
-            estimated_size = self.original_size_mb * (quality / 100.0) * ((resize / 100.0) ** 2)
-        
-        self.est_label.setText(f"Estimated Size: {estimated_size:.2f} MB")
+        resize_ratio = self.resize_slider.value() / 100.0
         
         # Update resolution display
         if self.original_width > 0 and self.original_height > 0:
@@ -446,11 +788,110 @@ class ImageCompressorApp(QMainWindow):
             self.resolution_label.setText(f"New Resolution: {new_width} × {new_height} px")
         else:
             self.resolution_label.setText("New Resolution: -")
+
+        max_bytes = self.target_max_bytes()
+        if max_bytes is not None:
+            self.estimation_request += 1
+            files = len(self.batch_paths) or 1
+            self.est_label.setText(f"Target Size: ≤ {max_bytes * files / (1024 * 1024):.2f} MB")
+            return
+        if self.min_ssim() is not None:
+            # Size depends on the per-image quality search, there is nothing to estimate up front
+            self.estimation_request += 1
+            self.est_label.setText(f"Target SSIM: ≥ {self.min_ssim():.3f}")
+            return
+
+        if self.batch_paths:
+            items = [(path, self.output_format(path)) for path in self.batch_paths]
+        else:
+            in_path = self.input_entry.text()
+            fmt = self.output_format(self.output_entry.text())
+            if fmt not in ("JPEG", "PNG", "WEBP", AUTO_FORMAT):
+                fmt = format_from_path(in_path)
+            items = [(in_path, fmt)]
+
+        self.est_label.setText("Estimated Size: calculating...")
+        self.estimation_request += 1
+        worker = EstimationWorker(
+            self.estimator, self.estimation_request, items, quality, resize_ratio, self.effort_combo.currentData(),
+            self.metadata_combo.currentData()
+        )
+        worker.estimated.connect(self.on_estimate_ready)
+        worker.finished.connect(lambda: self.estimation_workers.discard(worker))
+        self.estimation_workers.add(worker)
+        worker.start()
+
+    def on_estimate_ready(self, request_id, estimated_size):
+        # Results of outdated requests are dropped
+        if request_id != self.estimation_request:
+            return
+        if estimated_size < 0:
+            self.est_label.setText("Estimated Size: -")
+        else:
+            self.est_label.setText(f"Estimated Size: {estimated_size:.2f} MB")
     
+    def update_preview(self):
+        """Requests a preview for the current settings; an older render still running is abandoned."""
+        self.preview_request += 1
+        in_path = self.input_entry.text()
+        # Batch, target and SSIM modes have no single file / known quality to show
+        searched = self.target_max_bytes() is not None or self.min_ssim() is not None
+        # original_size_mb stays 0 until the probe has read a valid header
+        if self.batch_paths or searched or self.original_size_mb <= 0:
+            self.preview_pending = None
+            self.show_preview(None)
+            return
+
+        fmt = self.output_format(self.output_entry.text())
+        if fmt not in ("JPEG", "PNG", "WEBP", AUTO_FORMAT):
+            fmt = format_from_path(in_path)
+        self.preview_pending = (
+            in_path, self.quality_slider.value(), self.resize_slider.value() / 100.0,
+            fmt, self.effort_combo.currentData(), self.metadata_combo.currentData()
+        )
+        if self.preview_worker is None:
+            self._start_preview_worker()
+
+    def _start_preview_worker(self):
+        request_id = self.preview_request
+        worker = PreviewWorker(
+            self.preview_renderer, request_id, lambda: self.preview_request != request_id, *self.preview_pending
+        )
+        self.preview_pending = None
+        worker.rendered.connect(self.on_preview_ready)
+        worker.finished.connect(self.on_preview_worker_finished)
+        self.preview_worker = worker
+        worker.start()
+
+    def on_preview_worker_finished(self):
+        self.preview_worker = None
+        # Only the newest of the requests made during the render is started
+        if self.preview_pending is not None:
+            self._start_preview_worker()
+
+    def on_preview_ready(self, request_id, preview):
+        if request_id != self.preview_request:
+            return
+        self.show_preview(preview)
+
+    def show_preview(self, preview):
+        if preview is None:
+            for label in (self.preview_before, self.preview_after):
+                label.clear()
+                label.setText("-")
+            self.preview_label.setText(PREVIEW_TITLE)
+            return
+        size = self.preview_before.size()
+        for label, img in ((self.preview_before, preview.before), (self.preview_after, preview.after)):
+            label.setPixmap(pil_to_pixmap(img).scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.preview_label.setText(f"{PREVIEW_TITLE} ({preview.encoded_bytes / 1024:.1f} KB crop)")
+
     def start_compression(self):
+        if self.batch_paths:
+            self.start_batch_compression()
+            return
+
         try:
-            quality = self.quality_slider.value()
-            resize = self.resize_slider.value() / 100.0
             in_path = self.input_entry.text()
             out_path = self.output_entry.text()
 
@@ -459,25 +900,95 @@ class ImageCompressorApp(QMainWindow):
             if not out_path:
                 raise ValueError("Specify a save path!")
             
-            fmt = out_path.split(".")[-1].upper()
-            if fmt == "JPG": fmt = "JPEG"
+            fmt = self.output_format(out_path)
 
         except ValueError as e:
             QMessageBox.warning(self, "Input Error", str(e))
             return
 
+        self.progress_bar.setRange(0, 0)  # Infinite loading style
         self.toggle_ui(False)
-        self.worker = CompressionWorker(in_path, out_path, quality, fmt, resize)
+        self.worker = CompressionWorker(self.make_job(in_path, out_path, fmt))
         self.worker.finished.connect(self.on_success)
         self.worker.error.connect(self.on_error)
         self.worker.start()
 
+    def start_batch_compression(self):
+        from batch import suggest_output_path
+
+        out_dir = self.output_entry.text().strip() or None
+
+        if out_dir and not os.path.isdir(out_dir):
+            QMessageBox.warning(self, "Input Error", "Output folder does not exist!")
+            return
+
+        jobs = [
+            self.make_job(path, suggest_output_path(path, out_dir), self.output_format(path))
+            for path in self.batch_paths
+        ]
+
+        self.progress_bar.setRange(0, len(jobs))
+        self.progress_bar.setValue(0)
+        self.toggle_ui(False)
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setText("Cancel")
+        self.cancel_button.show()
+
+        self.batch_worker = BatchWorker(jobs)
+        self.batch_worker.progress.connect(lambda done, total: self.progress_bar.setValue(done))
+        self.batch_worker.finished.connect(self.on_batch_finished)
+        self.batch_worker.start()
+
+    def cancel_batch(self):
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.setText("Cancelling...")
+        self.batch_worker.cancel()
+
+    def on_batch_finished(self, summary: BatchSummary):
+        self.toggle_ui(True)
+        title = "Cancelled" if summary.cancelled else "Done!"
+        message = (
+            f"Compressed: {len(summary.results)} of {len(self.batch_paths)} files\n\n"
+            f"Size: {summary.original_size_mb:.2f}MB ➝ {summary.compressed_size_mb:.2f}MB\n"
+            f"Savings: -{summary.compression_ratio:.1f}%"
+        )
+        if summary.metadata_bytes_saved:
+            message += f"\nMetadata removed: {summary.metadata_bytes_saved / 1024:.1f} KB"
+        if summary.duplicates:
+            message += f"\nDuplicates reused: {summary.duplicates}"
+        if summary.passthrough_count:
+            message += f"\nKept unchanged (already compressed): {summary.passthrough_count}"
+        if summary.failures:
+            failed = "\n".join(f"{os.path.basename(path)}: {err}" for path, err in summary.failures[:5])
+            message += f"\n\nFailed ({len(summary.failures)}):\n{failed}"
+            QMessageBox.warning(self, title, message)
+        else:
+            QMessageBox.information(self, title, message)
+
     def on_success(self, res: CompressionResult):
         self.toggle_ui(True)
+        details = ""
+        if res.iterations is not None:
+            details = (
+                f"\nResolution: {res.final_resolution[0]} × {res.final_resolution[1]} px"
+                f"\nEncode iterations: {res.iterations}"
+            )
+        if res.ssim is not None:
+            details += f"\nSSIM: {res.ssim:.4f}"
+        if res.metadata_bytes_saved:
+            details += f"\nMetadata removed: {res.metadata_bytes_saved / 1024:.1f} KB"
+        if self.auto_format_checkbox.isChecked():
+            details += f"\nSaved as: {os.path.basename(res.output_path)}"
+        if res.source_action == "passthrough":
+            details += f"\nSource JPEG quality ~{res.source_quality}: kept unchanged"
+        elif res.source_action == "capped":
+            details += f"\nQuality capped at source quality {res.source_quality}"
+        if res.timings:
+            details += f"\n\nTime: {res.timings.total_wall:.2f}s\n{format_stages(res.timings)}"
         QMessageBox.information(self, "Done!", 
             f"✅ Success!\n\n"
             f"Size: {res.original_size_mb:.2f}MB ➝ {res.compressed_size_mb:.2f}MB\n"
-            f"Savings: -{res.compression_ratio:.1f}%")
+            f"Savings: -{res.compression_ratio:.1f}%" + details)
 
     def on_error(self, err_msg):
         self.toggle_ui(True)
@@ -1,9 +1,13 @@
+import multiprocessing
 import os
 import sys
 from PyQt5.QtWidgets import QApplication
 from interface import ImageCompressorApp
 
 if __name__ == "__main__":
+    # Batch compression runs in spawned worker processes (needed for the frozen EXE)
+    multiprocessing.freeze_support()
+
     # Фикс для корректного отображения на HiDPI экранах (4K мониторы)
     if hasattr(sys, 'frozen'):
         os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
@@ -0,0 +1,69 @@
+"""
+Peak-memory estimates for compression jobs.
+
+Only image headers are read (size, mode, JPEG draft scale), so estimating
+a job costs nothing compared to running it.
+"""
+import os
+from typing import Optional
+
+from PIL import Image
+
+from algorithms import AUTO_FORMAT, DEFAULT_EFFORT, EFFORT_PRESETS, draft_for_ratio, pixel_bytes, target_size
+
+# Working copies of the output image in compress_image: resized, converted for the format,
+# encoded buffer - plus the encoders' own buffers. Peak RSS over the RGBA output size,
+# rounded up: PNG quantizes, libwebp keeps several planes of its own (more with alpha),
+# AUTO holds all of its candidates at once.
+_OUTPUT_COPIES = {"PNG": 4, "WEBP": 6, AUTO_FORMAT: 6}
+_ALPHA_OUTPUT_COPIES = {"PNG": 4, "WEBP": 10, AUTO_FORMAT: 10}
+# JPEG and unknown formats
+_DEFAULT_OUTPUT_COPIES = 3
+# Presets with png_search race several PNG strategies (PNG and AUTO), each holding a candidate
+_PNG_SEARCH_COPIES = 2
+# The low-memory path skips the separate resized copy and encodes candidates one by one
+_LOW_MEMORY_SAVED_COPIES = 1
+
+
+def physical_memory() -> Optional[int]:
+    """Total RAM in bytes, or None where it can't be read (Windows)."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_memory_budget() -> Optional[int]:
+    """Half of the physical RAM; None (no budget) if it is unknown."""
+    total = physical_memory()
+    return total // 2 if total else None
+
+
+def estimate_peak_bytes(
+    input_path: str, resize_ratio: float, low_memory: bool = False,
+    output_format: Optional[str] = None, effort: str = DEFAULT_EFFORT
+) -> int:
+    """
+    Upper estimate of the memory compress_image holds at once for this input.
+    The decoded size accounts for JPEG draft decoding at reduced resolution;
+    the output copies depend on the format (WebP and AUTO need the most, more so
+    with alpha) and on whether the effort preset races PNG strategies.
+    """
+    with Image.open(input_path) as img:
+        original_size = img.size
+        has_alpha = "A" in img.mode or "transparency" in img.info
+        if resize_ratio < 1.0:
+            draft_for_ratio(img, resize_ratio, original_size)
+        decoded = img.size[0] * img.size[1] * pixel_bytes(img.mode)
+
+    width, height = target_size(original_size, min(resize_ratio, 1.0))
+    output_format = (output_format or "").upper()
+    copies = (_ALPHA_OUTPUT_COPIES if has_alpha else _OUTPUT_COPIES).get(output_format, _DEFAULT_OUTPUT_COPIES)
+    if low_memory:
+        copies -= _LOW_MEMORY_SAVED_COPIES
+    elif output_format in ("PNG", AUTO_FORMAT) and EFFORT_PRESETS[effort]["png_search"]:
+        copies += _PNG_SEARCH_COPIES
+    if resize_ratio >= 1.0:
+        # Nothing is resized: the decoded image is the first working copy
+        copies -= 1
+    return decoded + copies * width * height * 4
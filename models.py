@@ -1,5 +1,23 @@
-from dataclasses import dataclass
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+@dataclass
+class StageTiming:
+    wall: float = 0.0  # seconds
+    cpu: float = 0.0   # seconds of CPU time in the calling thread
+
+@dataclass
+class CompressionTimings:
+    """Per-stage breakdown of one compress_image call."""
+    stages: Dict[str, StageTiming] = field(default_factory=dict)
+    bytes_read: int = 0
+    bytes_written: int = 0
+    # Most bytes of image buffers and encoded data held at once (profiling.MemoryTracker)
+    peak_memory_bytes: int = 0
+
+    @property
+    def total_wall(self) -> float:
+        return sum(t.wall for t in self.stages.values())
 
 @dataclass
 class CompressionResult:
@@ -8,4 +26,115 @@ class CompressionResult:
     compression_ratio: float
     original_resolution: Tuple[int, int]
     final_resolution: Tuple[int, int]
-    output_path: str
\ No newline at end of file
+    output_path: str
+    # Number of trial encodes (target-size and perceptual modes)
+    iterations: Optional[int] = None
+    # True when served from the result cache without compressing
+    cached: bool = False
+    timings: Optional[CompressionTimings] = None
+    # Achieved SSIM against the resized source (perceptual mode only)
+    ssim: Optional[float] = None
+    # Source metadata (EXIF, ICC, XMP, comments) not written to the output
+    metadata_bytes_saved: int = 0
+    # Estimated quality of a JPEG source and what was done with it (algorithms.SOURCE_ACTIONS)
+    source_quality: Optional[int] = None
+    source_action: str = "reencode"
+    # Input whose compression was reused instead of compressing this one (batch dedupe)
+    duplicate_of: Optional[str] = None
+
+@dataclass
+class BatchSummary:
+    """Aggregate outcome of a batch run."""
+    results: List[CompressionResult] = field(default_factory=list)
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+    cancelled: bool = False
+
+    @property
+    def original_size_mb(self) -> float:
+        return sum(r.original_size_mb for r in self.results)
+
+    @property
+    def compressed_size_mb(self) -> float:
+        return sum(r.compressed_size_mb for r in self.results)
+
+    @property
+    def metadata_bytes_saved(self) -> int:
+        return sum(r.metadata_bytes_saved for r in self.results)
+
+    @property
+    def passthrough_count(self) -> int:
+        return sum(1 for r in self.results if r.source_action == "passthrough")
+
+    @property
+    def duplicates(self) -> int:
+        return sum(1 for r in self.results if r.duplicate_of)
+
+    @property
+    def duplicate_input_mb(self) -> float:
+        """Input that was never decoded or encoded thanks to dedupe."""
+        return sum(r.original_size_mb for r in self.results if r.duplicate_of)
+
+    @property
+    def cache_hits(self) -> int:
+        return sum(1 for r in self.results if r.cached)
+
+    @property
+    def compression_ratio(self) -> float:
+        if self.original_size_mb <= 0:
+            return 0.0
+        return ((self.original_size_mb - self.compressed_size_mb) / self.original_size_mb) * 100
+
+@dataclass
+class QueueStatus:
+    """Progress and aggregate throughput of a shared work queue (see workqueue.py)."""
+    chunks: int = 0
+    files: int = 0
+    done_chunks: int = 0
+    # Claimed chunks whose lease is still valid, and those whose owner stopped renewing it
+    leased_chunks: int = 0
+    expired_leases: int = 0
+    processed: int = 0
+    failed: int = 0
+    input_mb: float = 0.0
+    output_mb: float = 0.0
+    # Earliest chunk start and latest chunk completion over all workers (time.time())
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    # worker id -> files it completed
+    workers: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return self.done_chunks == self.chunks
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return max(self.finished - self.started, 0.0)
+
+    @property
+    def images_per_sec(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.input_mb / self.elapsed if self.elapsed else 0.0
+
+@dataclass
+class ImageInfo:
+    """Header-only facts about an image file (see probe.py)."""
+    path: str
+    file_size: int  # bytes
+    width: int
+    height: int
+    mode: str
+    format: Optional[str]
+    # EXIF orientation tag, 1 = upright
+    orientation: int = 1
+    # JPEG quantization tables: table id -> 64 coefficients
+    quantization: Optional[Dict[int, List[int]]] = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
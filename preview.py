@@ -0,0 +1,128 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PIL import Image
+from algorithms import (
+    DEFAULT_EFFORT, DEFAULT_METADATA, draft_for_ratio, encode_for_format, estimate_jpeg_quality, plan_source
+)
+
+
+@dataclass
+class Preview:
+    """Before/after crop of one file at one setting."""
+    before: Image.Image
+    after: Image.Image
+    encoded_bytes: int    # size of the encoded crop, not of the whole file
+
+
+@dataclass
+class _PreviewSource:
+    original_res: Tuple[int, int]
+    image: Image.Image    # whole image, downscaled to SOURCE_MAX_SIDE
+    source_quality: Optional[int] = None    # JPEG sources only
+    info: Dict[str, Any] = field(default_factory=dict)    # header metadata, for plan_source
+
+
+class PreviewRenderer:
+    """
+    Renders the compressed look of a centre crop with the real encoder settings
+    (encode_for_format), so the user sees the result without running a full compression.
+
+    Each file is decoded once into a downscaled copy; every setting then encodes
+    only a CROP_SIZE crop of it. Rendered previews are memoized per setting.
+    Thread-safe; is_stale lets a background worker abandon a render that a newer
+    request has already replaced.
+    """
+
+    SOURCE_MAX_SIDE = 1600
+    CROP_SIZE = 256
+
+    def __init__(self, cache_size: int = 64, source_cache_size: int = 4):
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._sources = OrderedDict()
+        self._source_cache_size = source_cache_size
+        self._lock = threading.Lock()
+
+    def render(
+        self, path: str, quality: int, resize_ratio: float, output_format: str,
+        effort: str = DEFAULT_EFFORT, is_stale: Optional[Callable[[], bool]] = None,
+        metadata: str = DEFAULT_METADATA, to_srgb: bool = False
+    ) -> Optional[Preview]:
+        """Returns the preview, or None if is_stale() turned true before it was ready."""
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        key = (file_key, quality, round(resize_ratio, 4), output_format.upper(), effort, metadata, to_srgb)
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            if is_stale and is_stale():
+                return None
+            source = self._load_source(file_key)
+
+        # Encoding runs outside the lock: a stale render must not hold up the next one
+        if is_stale and is_stale():
+            return None
+        preview = self._render(source, quality, resize_ratio, output_format, effort, metadata, to_srgb)
+
+        with self._lock:
+            self._cache[key] = preview
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return preview
+
+    def _load_source(self, file_key) -> _PreviewSource:
+        if file_key in self._sources:
+            self._sources.move_to_end(file_key)
+            return self._sources[file_key]
+
+        path = file_key[0]
+        with Image.open(path) as img:
+            original_res = img.size
+            source_quality = estimate_jpeg_quality(getattr(img, "quantization", None)) if img.format == "JPEG" else None
+            info = dict(img.info)
+            scale = min(1.0, self.SOURCE_MAX_SIDE / max(original_res))
+            draft_for_ratio(img, scale, original_res)
+            image = img.copy()
+        image.thumbnail((self.SOURCE_MAX_SIDE, self.SOURCE_MAX_SIDE), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        source = _PreviewSource(original_res, image, source_quality, info)
+        self._sources[file_key] = source
+        if len(self._sources) > self._source_cache_size:
+            self._sources.popitem(last=False)
+        return source
+
+    def _render(
+        self, source: _PreviewSource, quality: int, resize_ratio: float, output_format: str, effort: str,
+        metadata: str = DEFAULT_METADATA, to_srgb: bool = False
+    ) -> Preview:
+        image = source.image
+        crop = min(self.CROP_SIZE, image.width, image.height)
+        left = (image.width - crop) // 2
+        top = (image.height - crop) // 2
+        before = image.crop((left, top, left + crop, top + crop))
+
+        # The output is coarser than the preview copy: downscale the crop to the output
+        # scale before encoding and blow the result back up, so the lost detail shows
+        output_scale = min(resize_ratio, 1.0) * source.original_res[0] / image.width
+        sample = before
+        if output_scale < 1.0:
+            side = max(1, round(crop * output_scale))
+            sample = before.resize((side, side), Image.Resampling.LANCZOS)
+
+        # A passed-through JPEG looks like its own quality, a capped one is encoded at it
+        quality = plan_source(
+            source.source_quality, quality, output_format, resize_ratio, metadata, to_srgb, source.info
+        )[1]
+        encoded = encode_for_format(sample, quality, output_format, effort)
+        with Image.open(io.BytesIO(encoded)) as decoded:
+            after = decoded.convert(before.mode if before.mode in ("RGB", "RGBA", "L") else "RGBA")
+        if after.size != before.size:
+            after = after.resize(before.size, Image.Resampling.LANCZOS)
+        return Preview(before, after, len(encoded))
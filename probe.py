@@ -0,0 +1,87 @@
+"""
+Header-only metadata probing with a cache keyed by (path, mtime, size).
+
+Opening an image with Pillow reads only its header, so probing never decodes
+pixels. One MetadataProbe is shared by the GUI and the size estimator, and a
+dropped batch is probed once for all of them.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from PIL import ExifTags, Image
+from models import ImageInfo
+
+logger = logging.getLogger(__name__)
+
+# Header reads wait on the disk or network share, not on the CPU
+PROBE_WORKERS = 8
+
+
+def probe_image(path: str, file_size: Optional[int] = None) -> ImageInfo:
+    """Reads the header of one image; raises OSError if it isn't a readable image."""
+    if file_size is None:
+        file_size = os.path.getsize(path)
+    with Image.open(path) as img:
+        orientation = 1
+        # info["exif"] is filled from the header; getexif() would decode a PNG to find trailing chunks
+        raw_exif = img.info.get("exif")
+        if raw_exif:
+            exif = Image.Exif()
+            exif.load(raw_exif)
+            orientation = exif.get(ExifTags.Base.Orientation, 1)
+        quantization = getattr(img, "quantization", None)
+        return ImageInfo(
+            path=path,
+            file_size=file_size,
+            width=img.width,
+            height=img.height,
+            mode=img.mode,
+            format=img.format,
+            orientation=orientation,
+            quantization={table: list(values) for table, values in quantization.items()} if quantization else None
+        )
+
+
+class MetadataProbe:
+    """Thread-safe LRU cache around probe_image; a changed file is probed again."""
+
+    def __init__(self, cache_size: int = 4096):
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def probe(self, path: str) -> ImageInfo:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        # Header reads run outside the lock so a slow share doesn't serialize the workers
+        info = probe_image(path, stat.st_size)
+        with self._lock:
+            self._cache[key] = info
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return info
+
+    def probe_many(self, paths: Iterable[str], max_workers: int = PROBE_WORKERS) -> Dict[str, Optional[ImageInfo]]:
+        """Probes paths in parallel; unreadable files map to None."""
+        paths = list(paths)
+
+        def safe_probe(path):
+            try:
+                return self.probe(path)
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                logger.debug("probe failed for %s: %s", path, e)
+                return None
+
+        if len(paths) <= 1:
+            return {path: safe_probe(path) for path in paths}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as pool:
+            return dict(zip(paths, pool.map(safe_probe, paths)))
@@ -0,0 +1,113 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List
+
+from models import CompressionTimings, StageTiming
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Accumulates wall and CPU time per named stage into CompressionTimings."""
+
+    def __init__(self):
+        self.timings = CompressionTimings()
+
+    @contextmanager
+    def stage(self, name: str):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            timing = self.timings.stages.setdefault(name, StageTiming())
+            timing.wall += time.perf_counter() - wall
+            timing.cpu += time.thread_time() - cpu
+
+
+class MemoryTracker:
+    """
+    Peak of the large buffers one call holds at once: Pillow images (pixel bytes)
+    and encoded data (Python bytes). Buffers are held under a name and released by it;
+    thread-safe, so parallel encoders can report into the same tracker.
+    """
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._held: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def hold(self, name: str, nbytes: int):
+        """Records a live buffer; holding a name again replaces its size."""
+        with self._lock:
+            self.current += int(nbytes) - self._held.get(name, 0)
+            self._held[name] = int(nbytes)
+            self.peak = max(self.peak, self.current)
+
+    def replace(self, name: str, nbytes: int):
+        """A new buffer takes over name: both count towards the peak, then only the new one."""
+        with self._lock:
+            self.peak = max(self.peak, self.current + int(nbytes))
+            self.current += int(nbytes) - self._held.get(name, 0)
+            self._held[name] = int(nbytes)
+
+    def release(self, name: str):
+        with self._lock:
+            self.current -= self._held.pop(name, 0)
+
+
+def log_timings(timings: CompressionTimings):
+    """Ready-made timing hook: logs the breakdown at DEBUG level."""
+    logger.debug(
+        "compress: %s | read %d B, written %d B, peak memory %d B",
+        format_stages(timings), timings.bytes_read, timings.bytes_written, timings.peak_memory_bytes
+    )
+
+
+def format_stages(timings: CompressionTimings) -> str:
+    return ", ".join(f"{name} {t.wall * 1000:.0f} ms" for name, t in timings.stages.items())
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class TimingStats:
+    """Aggregates timings of many calls (e.g. a batch run) into per-stage percentiles."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_memory_bytes = 0
+
+    def add(self, timings: CompressionTimings):
+        for name, timing in timings.stages.items():
+            self.samples.setdefault(name, []).append(timing.wall)
+        self.samples.setdefault("total", []).append(timings.total_wall)
+        self.bytes_read += timings.bytes_read
+        self.bytes_written += timings.bytes_written
+        self.peak_memory_bytes = max(self.peak_memory_bytes, timings.peak_memory_bytes)
+
+    def percentiles(self, pcts: Iterable[float] = (50, 90, 99)) -> Dict[str, Dict[str, float]]:
+        """{stage: {"p50": seconds, ...}}"""
+        result = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            result[name] = {f"p{pct:g}": _percentile(ordered, pct) for pct in pcts}
+        return result
+
+    def report(self) -> str:
+        lines = []
+        for name, pcts in self.percentiles().items():
+            values = "  ".join(f"{key} {value * 1000:8.1f} ms" for key, value in pcts.items())
+            lines.append(f"{name:10} {values}")
+        if self.peak_memory_bytes:
+            lines.append(f"{'peak mem':10} {self.peak_memory_bytes / (1024 * 1024):.1f} MB (largest single call)")
+        return "\n".join(lines)
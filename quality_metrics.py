@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+# Стандартные константы SSIM для 8-битных данных
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+# BT.601 luma weights
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _grid_indices(length: int, window: int, stride: int) -> np.ndarray:
+    """Pixel indices of all windows on the grid, window by window."""
+    starts = np.arange(0, length - window + 1, stride)
+    return (starts[:, None] + np.arange(window)[None, :]).ravel()
+
+
+def _sampled_luma(img: Image.Image, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    rgb = np.asarray(img)
+    # Luma only for the sampled pixels, not the whole frame
+    sampled = np.take(np.take(rgb, rows, axis=0), cols, axis=1)
+    return sampled.astype(np.float32) @ _LUMA
+
+
+class SSIMScorer:
+    """
+    Mean SSIM of luma over window x window blocks on a strided grid.
+    Large images are sampled with a wider stride so at most ~max_pixels are scored.
+    Fully vectorized: block statistics come from one reshape, no Python loops per block.
+    The reference statistics are computed once and reused for every candidate.
+    """
+
+    def __init__(self, reference: Image.Image, window: int = 8, max_pixels: int = 4_000_000):
+        self.size = reference.size
+        width, height = reference.size
+        self.window = min(window, width, height)
+        stride = self.window * max(1, math.ceil(math.sqrt(width * height / max_pixels)))
+        self.rows = _grid_indices(height, self.window, stride)
+        self.cols = _grid_indices(width, self.window, stride)
+
+        x = self._blocks(reference)
+        self._mu_x = x.mean(axis=-1)
+        self._var_x = x.var(axis=-1)
+        self._x_centered = x - self._mu_x[..., None]
+
+    def _blocks(self, img: Image.Image) -> np.ndarray:
+        luma = _sampled_luma(img, self.rows, self.cols)
+        grid_h, grid_w = len(self.rows) // self.window, len(self.cols) // self.window
+        return luma.reshape(grid_h, self.window, grid_w, self.window).transpose(0, 2, 1, 3).reshape(grid_h, grid_w, -1)
+
+    def score(self, candidate: Image.Image) -> float:
+        if candidate.size != self.size:
+            raise ValueError(f"Размеры не совпадают: {self.size} != {candidate.size}")
+
+        y = self._blocks(candidate)
+        mu_y = y.mean(axis=-1)
+        var_y = y.var(axis=-1)
+        cov = (self._x_centered * (y - mu_y[..., None])).mean(axis=-1)
+
+        numerator = (2 * self._mu_x * mu_y + _C1) * (2 * cov + _C2)
+        denominator = (self._mu_x ** 2 + mu_y ** 2 + _C1) * (self._var_x + var_y + _C2)
+        return float((numerator / denominator).mean())
+
+
+def ssim(reference: Image.Image, candidate: Image.Image, window: int = 8, max_pixels: int = 4_000_000) -> float:
+    """One-off SSIM between two images of the same size (see SSIMScorer)."""
+    return SSIMScorer(reference, window, max_pixels).score(candidate)
@@ -0,0 +1,467 @@
+"""
+Local HTTP compression service (asyncio, standard library only).
+
+    python -m server --port 8080 --workers 4
+
+    curl --data-binary @photo.jpg -o photo.webp "http://127.0.0.1:8080/compress?format=webp&quality=80"
+
+POST /compress takes the image as the request body (Content-Length or chunked,
+spooled to a temp file as it arrives) and answers with the encoded image.
+Query parameters match compress_image: quality, format (or auto), resize, effort, metadata,
+srgb, plus target_kb / min_ssim for the searching modes. The result is reported
+in X-* headers. GET /metrics serves Prometheus text metrics, GET /health "ok".
+
+Work runs on one shared process pool. Requests beyond max_concurrency are
+refused with 429 before their body is read; inputs above max_pixels get 413
+after a header-only check, so they never reach a worker.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+from algorithms import (
+    AUTO_FORMAT, DEFAULT_EFFORT, DEFAULT_METADATA, EFFORT_PRESETS, FORMAT_EXTENSIONS, METADATA_POLICIES,
+    format_from_path, warm_up, with_format_extension
+)
+from batch import BatchJob, compress_job
+from probe import probe_image
+
+logger = logging.getLogger(__name__)
+
+# Same reasoning as the batch pool: spawn is what Windows and the frozen EXE use anyway
+_POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+DEFAULT_MAX_PIXELS = 100_000_000
+DEFAULT_MAX_BODY_BYTES = 256 * 1024 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+    413: "Payload Too Large", 415: "Unsupported Media Type", 429: "Too Many Requests",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error",
+}
+
+
+def allow_pixels(max_pixels: int):
+    """
+    Raises Pillow's decompression bomb limit (a warning from ~89 MP, an error
+    from twice that) to max_pixels, so Pillow never refuses what the server accepts.
+    """
+    if Image.MAX_IMAGE_PIXELS is not None and Image.MAX_IMAGE_PIXELS < max_pixels:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+def _init_worker(max_pixels: int):
+    allow_pixels(max_pixels)
+    warm_up()
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or _REASONS.get(status, ""))
+        self.status = status
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus exposition format."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {count}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.total:.6f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class ServerMetrics:
+    """Counters and latency histograms; only touched from the event loop thread."""
+
+    def __init__(self):
+        self.responses: Dict[int, int] = {}
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.request_seconds = Histogram("compressor_request_seconds", "Time from request headers to response")
+        self.compress_seconds = Histogram("compressor_compress_seconds", "Time spent in the worker pool")
+
+    def render(self) -> str:
+        lines = ["# HELP compressor_responses_total Responses by status code",
+                 "# TYPE compressor_responses_total counter"]
+        for status, count in sorted(self.responses.items()):
+            lines.append(f'compressor_responses_total{{status="{status}"}} {count}')
+        lines += [
+            "# TYPE compressor_in_flight gauge", f"compressor_in_flight {self.in_flight}",
+            "# TYPE compressor_received_bytes_total counter", f"compressor_received_bytes_total {self.bytes_in}",
+            "# TYPE compressor_sent_bytes_total counter", f"compressor_sent_bytes_total {self.bytes_out}",
+        ]
+        lines += self.request_seconds.render()
+        lines += self.compress_seconds.render()
+        return "\n".join(lines) + "\n"
+
+
+def _param(query: Dict[str, List[str]], name: str, convert, default):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        return convert(values[-1])
+    except ValueError:
+        raise HTTPError(400, f"invalid {name}: {values[-1]!r}")
+
+
+def _flag(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(value)
+
+
+def parse_job_params(query: Dict[str, List[str]]) -> dict:
+    """Validates the query of POST /compress; output_format None means the input's format."""
+    params = {
+        "quality": _param(query, "quality", int, 85),
+        "output_format": _param(query, "format", lambda v: {"JPG": "JPEG"}.get(v.upper(), v.upper()), None),
+        "resize_ratio": _param(query, "resize", float, 1.0),
+        "effort": _param(query, "effort", str, DEFAULT_EFFORT),
+        "metadata": _param(query, "metadata", str, DEFAULT_METADATA),
+        "to_srgb": _param(query, "srgb", _flag, False),
+        "max_bytes": _param(query, "target_kb", lambda v: int(v) * 1024, None),
+        "min_ssim": _param(query, "min_ssim", float, None),
+    }
+    if not 1 <= params["quality"] <= 100:
+        raise HTTPError(400, "quality must be between 1 and 100")
+    if params["output_format"] is not None and params["output_format"] not in (*FORMAT_EXTENSIONS, AUTO_FORMAT):
+        raise HTTPError(400, "format must be one of jpeg, png, webp, auto")
+    if params["output_format"] == AUTO_FORMAT and (params["max_bytes"] is not None or params["min_ssim"] is not None):
+        raise HTTPError(400, "format=auto cannot be combined with target_kb or min_ssim")
+    if not 0 < params["resize_ratio"] <= 1:
+        raise HTTPError(400, "resize must be in (0, 1]")
+    if params["effort"] not in EFFORT_PRESETS:
+        raise HTTPError(400, f"effort must be one of {', '.join(EFFORT_PRESETS)}")
+    if params["metadata"] not in METADATA_POLICIES:
+        raise HTTPError(400, f"metadata must be one of {', '.join(METADATA_POLICIES)}")
+    if params["max_bytes"] is not None and params["min_ssim"] is not None:
+        raise HTTPError(400, "target_kb and min_ssim cannot be combined")
+    if params["max_bytes"] is not None and params["max_bytes"] <= 0:
+        raise HTTPError(400, "target_kb must be positive")
+    if params["min_ssim"] is not None and not 0 < params["min_ssim"] <= 1:
+        raise HTTPError(400, "min_ssim must be in (0, 1]")
+    return params
+
+
+class CompressionServer:
+    """
+    asyncio HTTP/1.1 server (one request per connection) in front of a process pool.
+    executor: pool to run compress_job on; by default a spawn ProcessPoolExecutor
+    with max_workers, shut down by close().
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_pixels: int = DEFAULT_MAX_PIXELS,
+        max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+        tmp_dir: Optional[str] = None,
+        executor: Optional[Executor] = None
+    ):
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # A little queueing keeps every worker busy; beyond that clients get 429
+        self.max_concurrency = max_concurrency or self.max_workers * 2
+        self.max_pixels = max_pixels
+        self.max_body_bytes = max_body_bytes
+        self.tmp_dir = tmp_dir
+        self.metrics = ServerMetrics()
+        self._own_executor = executor is None
+        self._executor = executor
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> Tuple[str, int]:
+        """Starts listening; returns the bound (host, port), useful with port=0."""
+        allow_pixels(self.max_pixels)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=_POOL_CONTEXT,
+                initializer=_init_worker, initargs=(self.max_pixels,)
+            )
+            # Workers start now rather than on the first request, which would wait for them
+            self._executor.submit(warm_up)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+        return self.host, self.port
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        logger.info("listening on http://%s:%d (%d workers, %d concurrent requests)",
+                    self.host, self.port, self.max_workers, self.max_concurrency)
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    # --- HTTP ---
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        start = time.perf_counter()
+        status = 500
+        slot = False
+        try:
+            method, target, headers = await self._read_head(reader)
+            url = urlsplit(target)
+            if url.path == "/compress":
+                if method != "POST":
+                    raise HTTPError(405)
+                # Backpressure: refused before the body is read
+                if self.metrics.in_flight >= self.max_concurrency:
+                    raise HTTPError(429, "too many concurrent requests, retry later")
+                self.metrics.in_flight += 1
+                slot = True
+                params = parse_job_params(parse_qs(url.query))
+                status = await self._compress(reader, writer, headers, params)
+            elif url.path == "/metrics" and method == "GET":
+                status = await self._respond(
+                    writer, 200, self.metrics.render().encode(), "text/plain; version=0.0.4"
+                )
+            elif url.path == "/health" and method == "GET":
+                status = await self._respond(writer, 200, b"ok\n", "text/plain")
+            else:
+                raise HTTPError(404 if url.path not in ("/metrics", "/health") else 405)
+        except HTTPError as e:
+            extra = {"Retry-After": "1"} if e.status == 429 else {}
+            status = await self._respond(writer, e.status, f"{e}\n".encode(), "text/plain", extra)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            status = 499  # client went away
+        except Exception as e:
+            logger.exception("request failed")
+            status = await self._respond(writer, 500, f"{e}\n".encode(), "text/plain")
+        finally:
+            if slot:
+                self.metrics.in_flight -= 1
+            self.metrics.responses[status] = self.metrics.responses.get(status, 0) + 1
+            self.metrics.request_seconds.observe(time.perf_counter() - start)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_head(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431)
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _read_body(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         headers: Dict[str, str], path: str) -> int:
+        """Spools the request body into path chunk by chunk; returns its size."""
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+
+        received = 0
+        with open(path, "wb") as f:
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    size_line = await reader.readuntil(b"\r\n")
+                    try:
+                        size = int(size_line.split(b";", 1)[0], 16)
+                    except ValueError:
+                        raise HTTPError(400, "malformed chunk size")
+                    if size == 0:
+                        # Trailers end with an empty line
+                        while await reader.readuntil(b"\r\n") != b"\r\n":
+                            pass
+                        break
+                    received += size
+                    if received > self.max_body_bytes:
+                        raise HTTPError(413, "request body too large")
+                    f.write(await reader.readexactly(size))
+                    await reader.readexactly(2)
+            else:
+                if "content-length" not in headers:
+                    raise HTTPError(411)
+                try:
+                    remaining = int(headers["content-length"])
+                except ValueError:
+                    raise HTTPError(400, "invalid Content-Length")
+                if remaining > self.max_body_bytes:
+                    raise HTTPError(413, "request body too large")
+                while remaining:
+                    chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    f.write(chunk)
+                    received += len(chunk)
+                    remaining -= len(chunk)
+        self.metrics.bytes_in += received
+        return received
+
+    async def _compress(self, reader, writer, headers: Dict[str, str], params: dict) -> int:
+        work_dir = tempfile.mkdtemp(prefix="compress-", dir=self.tmp_dir)
+        try:
+            input_path = os.path.join(work_dir, "input")
+            if not await self._read_body(reader, writer, headers, input_path):
+                raise HTTPError(400, "empty request body")
+
+            # Header-only check: oversized images never reach a worker
+            try:
+                info = probe_image(input_path)
+            except Image.DecompressionBombError as e:
+                raise HTTPError(413, str(e))
+            except (OSError, ValueError):
+                raise HTTPError(415, "body is not a supported image")
+            if info.width * info.height > self.max_pixels:
+                raise HTTPError(413, f"image has {info.width * info.height} pixels, limit is {self.max_pixels}")
+            output_format = params.pop("output_format") or (info.format if info.format in FORMAT_EXTENSIONS else None)
+            if output_format is None:
+                raise HTTPError(415, f"unsupported input format {info.format}, pass format=")
+            if info.format in FORMAT_EXTENSIONS:
+                # Keep the usual extension: the size fallback copies the original as-is
+                os.rename(input_path, input_path + FORMAT_EXTENSIONS[info.format])
+                input_path += FORMAT_EXTENSIONS[info.format]
+
+            # AUTO keeps the name: compress_image swaps the extension to the chosen format
+            output_path = with_format_extension(os.path.join(work_dir, "output.bin"), output_format)
+            job = BatchJob(input_path, output_path, output_format=output_format, **params)
+            started = time.perf_counter()
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(self._executor, compress_job, job)
+            except (ValueError, RuntimeError) as e:
+                # Impossible target size, unreadable pixel data, ...
+                raise HTTPError(400, str(e))
+            finally:
+                self.metrics.compress_seconds.observe(time.perf_counter() - started)
+
+            extra = {
+                "X-Original-Size": str(os.path.getsize(input_path)),
+                "X-Compression-Ratio": f"{result.compression_ratio:.2f}",
+                "X-Resolution": f"{result.final_resolution[0]}x{result.final_resolution[1]}",
+                "X-Metadata-Bytes-Saved": str(result.metadata_bytes_saved),
+                "X-Source-Action": result.source_action,
+            }
+            if result.iterations is not None:
+                extra["X-Iterations"] = str(result.iterations)
+            if result.source_quality is not None:
+                extra["X-Source-Quality"] = str(result.source_quality)
+            if result.ssim is not None:
+                extra["X-SSIM"] = f"{result.ssim:.4f}"
+            content_type = _CONTENT_TYPES[format_from_path(result.output_path)]
+            return await self._respond_file(writer, result.output_path, content_type, extra)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def _send_head(self, writer, status: int, length: int, content_type: str, extra: Dict[str, str]):
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {length}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in extra.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+    async def _respond(self, writer, status: int, body: bytes, content_type: str,
+                       extra: Optional[Dict[str, str]] = None) -> int:
+        try:
+            await self._send_head(writer, status, len(body), content_type, extra or {})
+            writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        self.metrics.bytes_out += len(body)
+        return status
+
+    async def _respond_file(self, writer, path: str, content_type: str, extra: Dict[str, str]) -> int:
+        """Streams the output in chunks, waiting for the socket to drain between them."""
+        await self._send_head(writer, 200, os.path.getsize(path), content_type, extra)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                writer.write(chunk)
+                await writer.drain()
+                self.metrics.bytes_out += len(chunk)
+        return 200
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m server", description="Local HTTP compression service.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Port (default: 8080)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Requests handled at once, more get 429 (default: 2x workers)")
+    parser.add_argument("--max-pixels", type=int, default=DEFAULT_MAX_PIXELS,
+                        help=f"Reject larger images with 413 (default: {DEFAULT_MAX_PIXELS})")
+    parser.add_argument("--max-body-mb", type=int, default=DEFAULT_MAX_BODY_BYTES // (1024 * 1024),
+                        help="Reject larger uploads with 413 (default: 256)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+    server = CompressionServer(
+        args.host, args.port, args.workers, args.max_concurrency, args.max_pixels, args.max_body_mb * 1024 * 1024
+    )
+
+    async def run():
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
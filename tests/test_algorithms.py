@@ -1,13 +1,25 @@
 import unittest
 from unittest.mock import MagicMock, patch
+import tempfile
+import io
+import math
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from algorithms import compress_image
+from PIL import ExifTags, Image, ImageChops, ImageCms, ImageDraw, ImageFile, ImageFilter, ImageStat
+from algorithms import (
+    EFFORT_PRESETS, compress_image, compress_to_quality, compress_to_target, compress_variants, encode_auto,
+    encode_bounded, estimate_jpeg_quality, optimize_png, plan_source, png_colors, prepare_for_format,
+    srcset_manifest, uses_alpha
+)
 # Импортируем исключение, если нужно, или просто ловим Exception
 
 class TestImageCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
     
     @patch('os.path.exists') # Мокаем проверку пути
     @patch('os.path.getsize')
@@ -28,7 +40,7 @@ class TestImageCompression(unittest.TestCase):
         # Action
         result = compress_image(
             input_path="test.jpg",
-            output_path="out.jpg",
+            output_path=os.path.join(self.tmp.name, "out.jpg"),
             quality=80,
             output_format="JPEG",
             resize_ratio=1.0
@@ -47,5 +59,490 @@ class TestImageCompression(unittest.TestCase):
         # Проверяем, что вернулся объект с данными
         self.assertAlmostEqual(result.original_size_mb, 2.0)
 
+    def test_output_written_once_without_temp_files(self):
+        src = os.path.join(self.tmp.name, "src.png")
+        out = os.path.join(self.tmp.name, "out.webp")
+        Image.linear_gradient("L").convert("RGB").save(src)
+
+        result = compress_image(src, out, 80, "WEBP", 1.0)
+
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["out.webp", "src.png"])
+        self.assertAlmostEqual(result.compressed_size_mb, os.path.getsize(out) / (1024 * 1024))
+        with Image.open(out) as img:
+            self.assertEqual(img.format, "WEBP")
+
+    def test_stage_timings_reported(self):
+        src = os.path.join(self.tmp.name, "src.jpg")
+        out = os.path.join(self.tmp.name, "out.webp")
+        Image.linear_gradient("L").convert("RGB").save(src)
+        hook = MagicMock()
+
+        result = compress_image(src, out, 80, "WEBP", 0.5, timing_hook=hook)
+
+        hook.assert_called_once_with(result.timings)
+        for stage in ("open", "decode", "resize", "prepare", "encode", "write"):
+            self.assertIn(stage, result.timings.stages)
+        self.assertEqual(result.timings.bytes_read, os.path.getsize(src))
+        self.assertEqual(result.timings.bytes_written, os.path.getsize(out))
+        self.assertGreater(result.timings.stages["encode"].wall, 0)
+
+    def test_original_kept_when_output_is_larger(self):
+        src = os.path.join(self.tmp.name, "src.jpg")
+        out = os.path.join(self.tmp.name, "out.jpg")
+        Image.effect_noise((64, 64), 64).convert("RGB").save(src, quality=10)
+
+        result = compress_image(src, out, 100, "JPEG", 1.0)
+
+        with open(src, "rb") as a, open(out, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertEqual(result.compressed_size_mb, result.original_size_mb)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["out.jpg", "src.jpg"])
+
+def psnr(a, b):
+    rms = ImageStat.Stat(ImageChops.difference(a, b)).rms
+    mse = sum(v * v for v in rms) / len(rms)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+class TestReducedResolutionDecode(unittest.TestCase):
+
+    def test_downscale_matches_full_decode_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src.jpg")
+            out = os.path.join(tmp, "out.png")
+            size = (1600, 1200)
+            base = Image.effect_mandelbrot(size, (-2, -1.2, 1, 1.2), 100).convert("RGB")
+            photo = Image.blend(base, Image.linear_gradient("L").resize(size).convert("RGB"), 0.4)
+            photo.filter(ImageFilter.GaussianBlur(1)).save(src, quality=95)
+
+            for ratio in (0.5, 0.25, 0.1):
+                result = compress_image(src, out, 100, "PNG", ratio)
+
+                # Reference: the old path, full decode + single Lanczos resize
+                with Image.open(src) as img:
+                    reference = img.resize(result.final_resolution, Image.Resampling.LANCZOS)
+                with Image.open(out) as img:
+                    self.assertEqual(img.size, (int(1600 * ratio), int(1200 * ratio)))
+                    self.assertGreater(psnr(img.convert("RGB"), reference), 35.0, f"ratio {ratio}")
+
+
+class TestCompressToTarget(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = os.path.join(self.tmp.name, "src.png")
+        noise = Image.effect_noise((400, 300), 40).convert("RGB")
+        Image.blend(noise, Image.linear_gradient("L").resize((400, 300)).convert("RGB"), 0.5).save(self.src)
+
+    def test_fits_budget_with_quality_search(self):
+        out = os.path.join(self.tmp.name, "out.jpg")
+        budget = 20 * 1024
+
+        result = compress_to_target(self.src, out, budget, "JPEG")
+
+        self.assertLessEqual(os.path.getsize(out), budget)
+        self.assertEqual(result.final_resolution, (400, 300))
+        self.assertGreater(result.iterations, 0)
+        self.assertLessEqual(result.iterations, 7)
+
+    def test_falls_back_to_downscaling(self):
+        out = os.path.join(self.tmp.name, "out.webp")
+        budget = 1500
+
+        result = compress_to_target(self.src, out, budget, "WEBP")
+
+        self.assertLessEqual(os.path.getsize(out), budget)
+        self.assertLess(result.final_resolution[0], 400)
+
+    def test_impossible_budget_raises(self):
+        with self.assertRaises(RuntimeError):
+            compress_to_target(self.src, os.path.join(self.tmp.name, "out.png"), 10, "PNG")
+
+    def test_never_grows_a_source_within_budget(self):
+        src = os.path.join(self.tmp.name, "small.jpg")
+        Image.open(self.src).save(src, quality=30)
+        out = os.path.join(self.tmp.name, "out.jpg")
+
+        result = compress_to_target(src, out, 3 * os.path.getsize(src), "JPEG")
+
+        with open(src, "rb") as a, open(out, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertEqual((result.compression_ratio, result.final_resolution), (0, (400, 300)))
+
+    def test_kept_original_gets_its_own_extension(self):
+        icon = os.path.join(self.tmp.name, "icon_src.png")
+        Image.new("RGB", (64, 64), "red").save(icon)
+        out = os.path.join(self.tmp.name, "icon.jpg")
+
+        result = compress_to_target(icon, out, 64 * 1024, "JPEG")
+
+        self.assertEqual(result.output_path, os.path.join(self.tmp.name, "icon.png"))
+        self.assertFalse(os.path.exists(out))
+        with Image.open(result.output_path) as img:
+            self.assertEqual(img.format, "PNG")
+
+def encode_png(img, **save_params):
+    buffer = io.BytesIO()
+    img.save(buffer, **{"format": "PNG", **save_params})
+    return buffer.getvalue()
+
+
+class TestEffortPresets(unittest.TestCase):
+
+    def test_presets_trade_speed_for_size(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src.png")
+            size = (480, 320)
+            base = Image.effect_mandelbrot(size, (-2, -1.2, 1, 1.2), 100).convert("RGB")
+            Image.blend(base, Image.linear_gradient("L").resize(size).convert("RGB"), 0.4).save(src)
+
+            for fmt, ext in (("JPEG", "jpg"), ("WEBP", "webp"), ("PNG", "png")):
+                sizes = {}
+                for effort in EFFORT_PRESETS:
+                    out = os.path.join(tmp, f"{effort}.{ext}")
+                    sizes[effort] = compress_image(src, out, 80, fmt, 1.0, effort=effort).compressed_size_mb
+                self.assertLessEqual(sizes["max"], sizes["balanced"], fmt)
+                self.assertLessEqual(sizes["balanced"], sizes["fast"], fmt)
+
+    def test_unknown_effort_raises(self):
+        img = Image.new("RGB", (8, 8))
+        with self.assertRaises(ValueError):
+            prepare_for_format(img, 80, "JPEG", effort="turbo")
+
+
+class TestOptimizePNG(unittest.TestCase):
+
+    def ui_asset(self):
+        # Flat shapes with few colors, saved as RGBA although nothing is transparent
+        img = Image.new("RGBA", (200, 120), (245, 245, 247, 255))
+        for i in range(12):
+            img.paste((i * 20, 90, 200 - i * 10, 255), (i * 16, 10 + i * 8, i * 16 + 30, 40 + i * 8))
+        return img
+
+    def decode(self, data):
+        return Image.open(io.BytesIO(data))
+
+    def test_lossless_picks_exact_palette_and_drops_opaque_alpha(self):
+        img = self.ui_asset()
+        data = optimize_png(img, 100)
+        decoded = self.decode(data)
+
+        self.assertEqual(decoded.mode, "P")
+        self.assertNotIn("transparency", decoded.info)
+        self.assertEqual(decoded.convert("RGBA").tobytes(), img.tobytes())
+        self.assertLess(len(data), len(encode_png(img)))
+
+    def test_lossy_respects_color_count(self):
+        size = (160, 100)
+        img = Image.effect_mandelbrot(size, (-2, -1.2, 1, 1.2), 100).convert("RGB")
+        img = Image.blend(img, Image.linear_gradient("L").resize(size).convert("RGB"), 0.4)
+        decoded = self.decode(optimize_png(img, 25))
+
+        self.assertLessEqual(len(decoded.convert("RGB").getcolors(256)), png_colors(25))
+
+    def test_never_larger_than_single_strategy(self):
+        img = self.ui_asset()
+        for quality in (100, 60):
+            prepared, save_params = prepare_for_format(img, quality, "PNG")
+            self.assertLessEqual(len(optimize_png(img, quality)), len(encode_png(prepared, **save_params)))
+
+
+class TestCompressToQuality(unittest.TestCase):
+
+    def test_lowest_quality_meeting_threshold(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src.png")
+            size = (480, 320)
+            base = Image.effect_mandelbrot(size, (-2, -1.2, 1, 1.2), 100).convert("RGB")
+            Image.blend(base, Image.linear_gradient("L").resize(size).convert("RGB"), 0.4).save(src)
+
+            strict = compress_to_quality(src, os.path.join(tmp, "strict.jpg"), 0.99, "JPEG")
+            loose = compress_to_quality(src, os.path.join(tmp, "loose.jpg"), 0.90, "JPEG", resize_ratio=1.0)
+
+            self.assertGreaterEqual(strict.ssim, 0.99)
+            self.assertGreaterEqual(loose.ssim, 0.90)
+            self.assertLess(loose.compressed_size_mb, strict.compressed_size_mb)
+            self.assertLessEqual(strict.iterations, 7)
+            self.assertIn("score", strict.timings.stages)
+
+class TestMetadataPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        exif[ExifTags.Base.ImageDescription] = "x" * 2000
+        self.src = os.path.join(self.tmp.name, "photo.jpg")
+        self.img = Image.effect_mandelbrot((300, 200), (-2, -1.2, 1, 1.2), 100).convert("RGB")
+        self.img.save(self.src, quality=95, exif=exif, icc_profile=self.icc)
+        with Image.open(self.src) as img:
+            self.exif_bytes = len(img.info["exif"])
+
+    def compress(self, fmt, metadata, to_srgb=False, quality=80):
+        out = os.path.join(self.tmp.name, f"{metadata}{to_srgb}.{fmt.lower()}")
+        result = compress_image(self.src, out, quality, fmt, 1.0, metadata=metadata, to_srgb=to_srgb)
+        with Image.open(out) as img:
+            return result, img.size, img.info.get("icc_profile"), img.info.get("exif")
+
+    def test_orient_bakes_rotation_and_keeps_icc(self):
+        for fmt in ("JPEG", "WEBP", "PNG"):
+            result, size, icc, exif = self.compress(fmt, "orient", quality=50)
+            self.assertEqual(size, (200, 300), fmt)
+            self.assertEqual(icc, self.icc, fmt)
+            self.assertFalse(exif, fmt)
+            self.assertEqual(result.final_resolution, (200, 300))
+            self.assertEqual(result.metadata_bytes_saved, self.exif_bytes)
+
+    def test_icc_only_and_strip(self):
+        result, size, icc, exif = self.compress("JPEG", "icc")
+        self.assertEqual((size, icc, exif), ((300, 200), self.icc, None))
+        self.assertEqual(result.metadata_bytes_saved, self.exif_bytes)
+
+        result, size, icc, exif = self.compress("JPEG", "strip")
+        self.assertEqual((size, icc, exif), ((300, 200), None, None))
+        self.assertEqual(result.metadata_bytes_saved, self.exif_bytes + len(self.icc))
+
+    def test_srgb_conversion_drops_profile(self):
+        result, size, icc, _ = self.compress("WEBP", "orient", to_srgb=True, quality=95)
+        self.assertIsNone(icc)
+        self.assertEqual(result.metadata_bytes_saved, self.exif_bytes + len(self.icc))
+        # The embedded profile is sRGB already, so the pixels barely move
+        with Image.open(result.output_path) as img:
+            expected = self.img.transpose(Image.Transpose.ROTATE_270)
+            self.assertLess(sum(ImageStat.Stat(ImageChops.difference(img.convert("RGB"), expected)).mean), 6)
+
+    def test_unknown_policy_raises(self):
+        with self.assertRaises(RuntimeError):
+            compress_image(self.src, os.path.join(self.tmp.name, "x.jpg"), 80, "JPEG", 1.0, metadata="all")
+
+    def test_search_and_variant_modes_follow_policy(self):
+        target = os.path.join(self.tmp.name, "target.jpg")
+        perceptual = os.path.join(self.tmp.name, "ssim.jpg")
+        results = [
+            compress_to_target(self.src, target, 12 * 1024, "JPEG"),
+            compress_to_quality(self.src, perceptual, 0.9, "JPEG"),
+        ] + compress_variants(self.src, os.path.join(self.tmp.name, "v"), [150, 400], ["WEBP"], 80)
+        self.assertEqual([r.final_resolution for r in results], [(200, 300), (200, 300), (200, 300), (150, 225)])
+        for result in results:
+            with Image.open(result.output_path) as img:
+                self.assertEqual(img.size, result.final_resolution)
+                self.assertEqual(img.info.get("icc_profile"), self.icc)
+                self.assertFalse(img.info.get("exif"))
+            self.assertEqual(result.metadata_bytes_saved, self.exif_bytes)
+
+        result = compress_to_target(self.src, target, 12 * 1024, "JPEG", metadata="strip")
+        with Image.open(target) as img:
+            self.assertEqual((img.size, img.info.get("icc_profile")), ((300, 200), None))
+        self.assertEqual(result.metadata_bytes_saved, self.exif_bytes + len(self.icc))
+
+    def test_low_quality_source_with_exif_is_not_passed_through(self):
+        # q70 under a q85 request: quality alone would allow a passthrough, the EXIF block doesn't
+        with Image.open(self.src) as img:
+            exif = img.getexif()
+        self.img.save(self.src, quality=70, exif=exif, icc_profile=self.icc)
+        for metadata in ("icc", "orient"):
+            result, size, icc, exif = self.compress("JPEG", metadata, quality=85)
+            self.assertEqual((result.source_action, result.source_quality), ("capped", 70))
+            self.assertEqual((icc, exif), (self.icc, None))
+            self.assertEqual(result.metadata_bytes_saved, self.exif_bytes)
+        self.assertEqual(size, (200, 300))
+
+        self.img.save(self.src, quality=70, icc_profile=self.icc)
+        result, _, icc, _ = self.compress("JPEG", "orient", quality=85)
+        self.assertEqual((result.source_action, icc), ("passthrough", self.icc))
+
+class TestSourceAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = os.path.join(self.tmp.name, "q70.jpg")
+        Image.radial_gradient("L").resize((640, 480)).convert("RGB").save(self.src, quality=70)
+
+    def test_estimates_quality_from_tables(self):
+        for quality in (10, 50, 70, 85, 95, 100):
+            buffer = io.BytesIO()
+            Image.new("RGB", (32, 32)).save(buffer, "JPEG", quality=quality)
+            with Image.open(buffer) as img:
+                self.assertEqual(estimate_jpeg_quality(img.quantization), quality)
+        self.assertIsNone(estimate_jpeg_quality(None))
+
+        self.assertEqual(plan_source(70, 85, "JPEG", 1.0), ("passthrough", 70))
+        self.assertEqual(plan_source(70, 85, "JPEG", 0.5), ("capped", 70))
+        self.assertEqual(plan_source(70, 85, "JPEG", 1.0, metadata="strip"), ("capped", 70))
+        self.assertEqual(plan_source(70, 85, "JPEG", 1.0, info={"exif": b"Exif"}), ("capped", 70))
+        self.assertEqual(plan_source(70, 85, "JPEG", 1.0, info={"icc_profile": b"icc"}), ("passthrough", 70))
+        self.assertEqual(plan_source(90, 85, "JPEG", 1.0), ("reencode", 85))
+        self.assertEqual(plan_source(70, 85, "WEBP", 1.0), ("reencode", 85))
+
+    def test_passthrough_skips_decode(self):
+        out = os.path.join(self.tmp.name, "out.jpg")
+        with patch.object(ImageFile.ImageFile, "load") as mock_load:
+            result = compress_image(self.src, out, 85, "JPEG", 1.0)
+            mock_load.assert_not_called()
+        self.assertEqual((result.source_action, result.source_quality), ("passthrough", 70))
+        with open(self.src, "rb") as a, open(out, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_capped_encode_skips_the_failsafe_retry(self):
+        # Optimized q70 source, unoptimized q70 re-encode: larger, and a q85 retry could only be larger still
+        src = os.path.join(self.tmp.name, "optimized.jpg")
+        Image.effect_mandelbrot((600, 400), (-2, -1.2, 1, 1.2), 100).convert("RGB").save(
+            src, quality=70, optimize=True, progressive=True
+        )
+        result = compress_image(src, os.path.join(self.tmp.name, "out.jpg"), 85, "JPEG", 0.999, effort="fast")
+
+        self.assertEqual(result.source_action, "capped")
+        self.assertNotIn("failsafe", result.timings.stages)
+        self.assertEqual(result.timings.bytes_written, os.path.getsize(src))
+
+    def test_capped_at_source_quality(self):
+        out = os.path.join(self.tmp.name, "out.jpg")
+        result = compress_image(self.src, out, 95, "JPEG", 0.5)
+        self.assertEqual((result.source_action, result.source_quality), ("capped", 70))
+        with Image.open(out) as img:
+            self.assertEqual(estimate_jpeg_quality(img.quantization), 70)
+
+        result = compress_image(self.src, out, 50, "JPEG", 1.0)
+        self.assertEqual(result.source_action, "reencode")
+        with Image.open(out) as img:
+            self.assertEqual(estimate_jpeg_quality(img.quantization), 50)
+
+class TestAutoFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_picks_smallest_format_and_extension(self):
+        # Flat screenshot-like content: the palette PNG wins
+        shot = Image.new("RGB", (400, 300), "white")
+        draw = ImageDraw.Draw(shot)
+        for top in range(0, 300, 20):
+            draw.text((5, top), "compress " * 6, fill="black")
+        shot_path = os.path.join(self.tmp.name, "shot.jpg")
+        shot.save(shot_path, quality=100)
+        result = compress_image(shot_path, os.path.join(self.tmp.name, "shot_out.jpg"), 80, "AUTO", 1.0)
+        self.assertEqual(os.path.basename(result.output_path), "shot_out.png")
+        with Image.open(result.output_path) as img:
+            self.assertEqual(img.format, "PNG")
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "shot_out.jpg")))
+
+        # Noisy photo-like content: a lossy format wins
+        noise = Image.effect_noise((400, 300), 40).convert("RGB").filter(ImageFilter.GaussianBlur(1))
+        fmt, data = encode_auto(noise, 80)
+        self.assertIn(fmt, ("JPEG", "WEBP"))
+        for other in ("JPEG", "WEBP"):
+            prepared, params = prepare_for_format(noise, 80, other)
+            buffer = io.BytesIO()
+            prepared.save(buffer, **params)
+            self.assertLessEqual(len(data), len(buffer.getvalue()))
+
+    def test_alpha_excludes_jpeg(self):
+        alpha = Image.effect_noise((200, 200), 40).convert("RGBA")
+        alpha.putalpha(Image.linear_gradient("L").resize((200, 200)))
+        self.assertTrue(uses_alpha(alpha))
+        self.assertNotEqual(encode_auto(alpha, 60)[0], "JPEG")
+
+        opaque = Image.effect_noise((200, 200), 40).convert("RGBA")
+        self.assertFalse(uses_alpha(opaque))
+        self.assertEqual(encode_auto(opaque, 60, max_workers=1)[0], "JPEG")
+
+    def test_16_bit_png_stays_lossless(self):
+        # JPEG can't write I;16, WebP would clamp it to white: PNG is the only candidate
+        gradient = Image.linear_gradient("L").resize((256, 64)).convert("I")
+        src = os.path.join(self.tmp.name, "depth.png")
+        Image.eval(gradient, lambda v: v * 257).convert("I;16").save(src)
+
+        result = compress_image(src, os.path.join(self.tmp.name, "depth_out.jpg"), 80, "AUTO", 1.0)
+
+        self.assertEqual(os.path.basename(result.output_path), "depth_out.png")
+        with Image.open(src) as original, Image.open(result.output_path) as img:
+            self.assertEqual(img.format, "PNG")
+            self.assertEqual(img.getextrema(), original.getextrema())
+
+        # Quantized, the gradient is scaled down to 8 bits rather than clamped
+        with Image.open(src) as original:
+            data = optimize_png(original, 80)
+        with Image.open(io.BytesIO(data)) as img:
+            low, high = img.convert("L").getextrema()
+        self.assertLess(low, 16)
+        self.assertGreater(high, 240)
+
+    def test_cutoff_keeps_the_smallest_result(self):
+        img = Image.effect_noise((300, 300), 60).convert("RGB")
+        full = encode_bounded(img, lambda: None, format="PNG")
+        self.assertIsNone(encode_bounded(img, lambda: len(full) // 2, format="PNG"))
+        self.assertEqual(encode_bounded(img, lambda: len(full), format="PNG"), full)
+
+        # Racing PNG variants cut each other off without changing the winner
+        def uncut_encode(im, limit, **params):
+            return encode_bounded(im, lambda: None, **params)
+
+        with patch("algorithms.encode_bounded", side_effect=uncut_encode):
+            uncut = optimize_png(img, 80)
+        self.assertEqual(optimize_png(img, 80), uncut)
+        self.assertIsNone(optimize_png(img, 80, limit=lambda: 100))
+
+    def test_keeps_original_with_its_extension(self):
+        src = os.path.join(self.tmp.name, "tiny.jpg")
+        Image.effect_noise((64, 64), 80).convert("RGB").save(src, quality=20)
+        result = compress_image(src, os.path.join(self.tmp.name, "tiny_out.jpg"), 100, "AUTO", 1.0)
+        self.assertEqual(os.path.basename(result.output_path), "tiny_out.jpg")
+        with open(src, "rb") as a, open(result.output_path, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+class TestCompressVariants(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = os.path.join(self.tmp.name, "photo.jpg")
+        Image.effect_mandelbrot((1200, 800), (-2, -1.2, 1, 1.2), 100).convert("RGB").save(self.src, quality=95)
+
+    def test_one_decode_pyramid_for_all_variants(self):
+        base = os.path.join(self.tmp.name, "out", "photo")
+        os.makedirs(os.path.dirname(base))
+        resize_calls = []
+        original_resize = Image.Image.resize
+
+        def counting_resize(img, size, *args, **kwargs):
+            resize_calls.append((img.size, size))
+            return original_resize(img, size, *args, **kwargs)
+
+        with patch("algorithms.Image.open", wraps=Image.open) as mock_open, \
+                patch.object(Image.Image, "resize", counting_resize):
+            results = compress_variants(self.src, base, [320, 640, 2000], ["WEBP", "JPEG"], 80)
+        mock_open.assert_called_once()
+
+        # 2000 is clamped to the source width; each width is resized from the next larger level
+        self.assertEqual(resize_calls, [((1200, 800), (640, 427)), ((640, 427), (320, 213))])
+        self.assertEqual(
+            [(os.path.basename(r.output_path), r.final_resolution) for r in results],
+            [("photo-1200w.webp", (1200, 800)), ("photo-1200w.jpg", (1200, 800)),
+             ("photo-640w.webp", (640, 427)), ("photo-640w.jpg", (640, 427)),
+             ("photo-320w.webp", (320, 213)), ("photo-320w.jpg", (320, 213))]
+        )
+        for result in results:
+            with Image.open(result.output_path) as img:
+                self.assertEqual(img.size, result.final_resolution)
+            self.assertAlmostEqual(os.path.getsize(result.output_path) / (1024 * 1024), result.compressed_size_mb)
+
+    def test_srcset_manifest(self):
+        base = os.path.join(self.tmp.name, "photo")
+        results = compress_variants(self.src, base, [640, 320], ["WEBP", "JPEG"], 80)
+        manifest = srcset_manifest(results, self.tmp.name)
+
+        self.assertEqual((manifest["width"], manifest["height"]), (1200, 800))
+        self.assertEqual(manifest["sources"], [
+            {"type": "image/webp", "srcset": "photo-320w.webp 320w, photo-640w.webp 640w"},
+            {"type": "image/jpeg", "srcset": "photo-320w.jpg 320w, photo-640w.jpg 640w"},
+        ])
+        self.assertEqual(len(manifest["variants"]), 4)
+        self.assertEqual(manifest["variants"][0]["bytes"], os.path.getsize(base + "-320w.webp"))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
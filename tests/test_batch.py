@@ -0,0 +1,103 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+from batch import BatchJob, BatchScheduler, format_from_path, iter_image_files, suggest_output_path
+
+
+def make_image(path, size=(64, 48), color=(200, 100, 50)):
+    Image.new("RGB", size, color).save(path)
+    return path
+
+
+class TestBatchHelpers(unittest.TestCase):
+
+    def test_iter_image_files_walks_folders(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "sub"))
+            make_image(os.path.join(tmp, "a.png"))
+            make_image(os.path.join(tmp, "sub", "b.jpg"))
+            open(os.path.join(tmp, "notes.txt"), "w").close()
+
+            found = list(iter_image_files([tmp]))
+
+            self.assertEqual(
+                [os.path.relpath(p, tmp) for p in found],
+                ["a.png", os.path.join("sub", "b.jpg")]
+            )
+
+    def test_output_path_and_format(self):
+        self.assertEqual(format_from_path("x/photo.JPG"), "JPEG")
+        self.assertEqual(format_from_path("x/icon.webp"), "WEBP")
+        self.assertEqual(suggest_output_path(os.path.join("in", "a.png")), os.path.join("in", "a_compressed.png"))
+        self.assertEqual(suggest_output_path(os.path.join("in", "a.png"), "out"), os.path.join("out", "a_compressed.png"))
+
+
+class TestBatchScheduler(unittest.TestCase):
+
+    def test_runs_all_jobs_and_reports_progress(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = []
+            for i in range(5):
+                path = make_image(os.path.join(tmp, f"img{i}.jpg"), color=(i * 40, 80, 120))
+                jobs.append(BatchJob(path, suggest_output_path(path), 70, "JPEG", 0.5))
+            jobs.append(BatchJob(os.path.join(tmp, "missing.jpg"), os.path.join(tmp, "out.jpg"), 70, "JPEG", 1.0))
+
+            progress = []
+            summary = BatchScheduler(max_workers=2).run(jobs, lambda done, job: progress.append(done))
+
+            self.assertEqual(len(summary.results), 5)
+            self.assertEqual(len(summary.failures), 1)
+            self.assertFalse(summary.cancelled)
+            self.assertEqual(progress, [1, 2, 3, 4, 5, 6])
+            for job in jobs[:5]:
+                self.assertTrue(os.path.exists(job.output_path))
+            self.assertAlmostEqual(
+                summary.original_size_mb, sum(r.original_size_mb for r in summary.results)
+            )
+
+    def test_cancel_skips_queued_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = make_image(os.path.join(tmp, "img.png"))
+            jobs = [BatchJob(path, os.path.join(tmp, f"out{i}.png"), 80, "PNG", 1.0) for i in range(20)]
+
+            scheduler = BatchScheduler(max_workers=1)
+            summary = scheduler.run(jobs, lambda done, job: scheduler.cancel())
+
+            self.assertTrue(summary.cancelled)
+            self.assertLess(len(summary.results), len(jobs))
+
+    def test_dedupe_compresses_each_group_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            original = make_image(os.path.join(tmp, "a.png"), size=(200, 150))
+            jobs = [BatchJob(original, os.path.join(tmp, "a.webp"), 80, "WEBP", 0.5)]
+            for name in ("b.png", "c.png"):
+                shutil.copyfile(original, os.path.join(tmp, name))
+                jobs.append(BatchJob(os.path.join(tmp, name), os.path.join(tmp, name[0] + ".webp"), 80, "WEBP", 0.5))
+            other = make_image(os.path.join(tmp, "d.png"), color=(0, 0, 0))
+            jobs.append(BatchJob(other, os.path.join(tmp, "d.webp"), 80, "WEBP", 0.5))
+            # Identical corrupt files: the leader fails, so its duplicate runs (and fails) on its own
+            for name in ("bad1.png", "bad2.png"):
+                with open(os.path.join(tmp, name), "wb") as f:
+                    f.write(b"not an image")
+                jobs.append(BatchJob(os.path.join(tmp, name), os.path.join(tmp, name + ".webp"), 80, "WEBP", 0.5))
+
+            summary = BatchScheduler(max_workers=2, dedupe="exact").run(jobs)
+
+            self.assertEqual(len(summary.results), 4)
+            self.assertEqual(len(summary.failures), 2)
+            self.assertEqual(summary.duplicates, 2)
+            self.assertAlmostEqual(summary.duplicate_input_mb, 2 * os.path.getsize(original) / (1024 * 1024))
+            by_input = {os.path.basename(r.output_path): r for r in summary.results}
+            self.assertEqual(by_input["b.webp"].duplicate_of, original)
+            self.assertIsNone(by_input["d.webp"].duplicate_of)
+            self.assertTrue(os.path.samefile(os.path.join(tmp, "a.webp"), os.path.join(tmp, "c.webp")))
+            self.assertEqual(by_input["c.webp"].final_resolution, (100, 75))
+
+
+if __name__ == '__main__':
+    unittest.main()
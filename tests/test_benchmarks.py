@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.bench_compress import cell_key, compare
+from benchmarks.bench_startup import DEFERRED_MODULES, MAX_IMAGE_PLUGINS, check, measure_import
+from benchmarks.corpus import make_alpha, make_photo, make_screenshot
+
+
+class TestCorpus(unittest.TestCase):
+
+    def test_generators_are_deterministic(self):
+        for make in (make_photo, make_screenshot, make_alpha):
+            first = make((300, 200), seed=7)
+            second = make((300, 200), seed=7)
+            self.assertEqual(first.tobytes(), second.tobytes(), make.__name__)
+            self.assertNotEqual(first.tobytes(), make((300, 200), seed=8).tobytes(), make.__name__)
+
+
+class TestCompare(unittest.TestCase):
+
+    def report(self, ips, ratio, rss):
+        return {"results": {"photo/JPEG/q85/r1": {
+            "images_per_sec": ips, "mb_per_sec": ips, "output_ratio": ratio, "peak_rss_mb": rss
+        }}}
+
+    def test_within_threshold_passes(self):
+        self.assertEqual(compare(self.report(9.0, 0.5, 110), self.report(10.0, 0.5, 100), threshold=0.15), [])
+
+    def test_detects_each_regression_kind(self):
+        regressions = compare(self.report(8.0, 0.52, 130), self.report(10.0, 0.5, 100), threshold=0.15)
+        self.assertEqual(len(regressions), 3)
+        self.assertIn("throughput", regressions[0])
+        self.assertIn("output ratio", regressions[1])
+        self.assertIn("peak RSS", regressions[2])
+
+    def test_default_effort_keeps_baseline_keys(self):
+        self.assertEqual(cell_key("photo", "JPEG", 85, 1.0, "max"), "photo/JPEG/q85/r1")
+        self.assertEqual(cell_key("photo", "JPEG", 85, 0.5, "fast"), "photo/JPEG/q85/r0.5/fast")
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_headless_entry_points_defer_heavy_imports(self):
+        for module in ("cli", "server"):
+            loaded = set(measure_import(module)["modules"])
+            self.assertEqual([name for name in DEFERRED_MODULES[module] if name in loaded], [], module)
+            self.assertLessEqual(len([name for name in loaded if name.endswith("ImagePlugin")]), MAX_IMAGE_PLUGINS)
+
+    def test_check_reports_each_violation(self):
+        results = {
+            "cli": {"ms": 180.0, "deferred_loaded": ["numpy"], "image_plugins": ["PIL.TiffImagePlugin"] * 40},
+            "server": {"ms": 90.0, "deferred_loaded": [], "image_plugins": []},
+        }
+        violations = check(results, {"cli": 150, "server": 100})
+        self.assertEqual(len(violations), 3)
+        self.assertTrue(all(v.startswith("cli:") for v in violations))
+
+
+if __name__ == '__main__':
+    unittest.main()
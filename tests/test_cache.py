@@ -0,0 +1,92 @@
+import unittest
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+from algorithms import compress_image
+from batch import BatchJob, BatchScheduler
+from cache import ResultCache, file_digest, make_key
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = os.path.join(self.tmp.name, "src.png")
+        self.out = os.path.join(self.tmp.name, "out.jpg")
+        Image.linear_gradient("L").convert("RGB").save(self.src)
+        self.cache = ResultCache(os.path.join(self.tmp.name, "cache"))
+        self.addCleanup(self.cache.close)
+        self.key = make_key(file_digest(self.src), {"quality": 80, "output_format": "JPEG"})
+
+    def test_miss_then_validated_hit(self):
+        self.assertIsNone(self.cache.restore(self.key, self.out))
+        result = compress_image(self.src, self.out, 80, "JPEG", 1.0)
+        self.cache.store(self.key, result)
+
+        cached = self.cache.restore(self.key, self.out)
+
+        self.assertTrue(cached.cached)
+        self.assertEqual(cached.final_resolution, result.final_resolution)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_missing_output_restored_from_blob(self):
+        self.cache.store(self.key, compress_image(self.src, self.out, 80, "JPEG", 1.0))
+        with open(self.out, "rb") as f:
+            expected = f.read()
+        os.remove(self.out)
+
+        other = os.path.join(self.tmp.name, "copy.jpg")
+        self.assertIsNotNone(self.cache.restore(self.key, other))
+        with open(other, "rb") as f:
+            self.assertEqual(f.read(), expected)
+
+    def test_key_depends_on_content_and_params(self):
+        digest = file_digest(self.src)
+        self.assertNotEqual(make_key(digest, {"quality": 80}), make_key(digest, {"quality": 81}))
+        Image.linear_gradient("L").rotate(90).convert("RGB").save(self.src)
+        self.assertNotEqual(file_digest(self.src), digest)
+
+    def test_eviction_keeps_blob_store_under_limit(self):
+        cache = ResultCache(os.path.join(self.tmp.name, "small"), max_bytes=3000)
+        self.addCleanup(cache.close)
+        for quality in (90, 91, 92):
+            result = compress_image(self.src, self.out, quality, "JPEG", 1.0)
+            cache.store(make_key("x", {"quality": quality}), result)
+
+        self.assertLessEqual(cache.stats()["blob_bytes"], 3000)
+        self.assertEqual(cache.stats()["entries"], 3)
+
+    def test_auto_format_restores_chosen_extension(self):
+        self.cache.store(self.key, compress_image(self.src, self.out, 80, "JPEG", 1.0))
+        other = os.path.join(self.tmp.name, "auto.png")
+        cached = self.cache.restore(self.key, other, match_stored_extension=True)
+        self.assertEqual(cached.output_path, os.path.join(self.tmp.name, "auto.jpg"))
+        self.assertTrue(os.path.exists(cached.output_path))
+        self.assertFalse(os.path.exists(other))
+
+
+class TestSchedulerCache(unittest.TestCase):
+
+    def test_second_run_is_served_from_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = []
+            for i in range(3):
+                src = os.path.join(tmp, f"img{i}.png")
+                Image.new("RGB", (40, 40), (i * 60, 10, 10)).save(src)
+                jobs.append(BatchJob(src, os.path.join(tmp, f"out{i}.webp"), 75, "WEBP", 1.0))
+            cache_dir = os.path.join(tmp, "cache")
+
+            first = BatchScheduler(2, cache_dir=cache_dir).run(jobs)
+            second = BatchScheduler(2, cache_dir=cache_dir).run(jobs)
+
+            self.assertEqual(first.cache_hits, 0)
+            self.assertEqual(second.cache_hits, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
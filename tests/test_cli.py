@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import patch
+import subprocess
+import tempfile
+import json
+import io
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from PIL import Image
+from algorithms import FORMAT_EXTENSIONS
+import cli
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = os.path.join(self.tmp.name, "src")
+        os.makedirs(os.path.join(self.src, "icons"))
+        for rel in ["a.jpg", "b.png", os.path.join("icons", "c.png"), os.path.join("icons", "skip.png")]:
+            Image.linear_gradient("L").convert("RGB").save(os.path.join(self.src, rel))
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with patch("sys.stdout", out), patch("sys.stderr", io.StringIO()):
+            code = cli.main(list(argv))
+        return code, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_mirrors_tree_and_writes_json_lines(self):
+        out_dir = os.path.join(self.tmp.name, "out")
+        code, records = self.run_cli(
+            self.src, "-o", out_dir, "-f", "webp", "-q", "70", "-r", "0.5",
+            "--exclude", "skip.*", "--jobs", "2"
+        )
+
+        self.assertEqual(code, 0)
+        self.assertEqual(len(records), 3)
+        self.assertTrue(os.path.exists(os.path.join(out_dir, "a.webp")))
+        self.assertTrue(os.path.exists(os.path.join(out_dir, "icons", "c.webp")))
+        self.assertFalse(os.path.exists(os.path.join(out_dir, "icons", "skip.webp")))
+        for record in records:
+            self.assertEqual(record["final_resolution"], [128, 128])
+            self.assertIn("compression_ratio", record)
+
+    def test_include_filter_and_default_output(self):
+        code, records = self.run_cli(self.src, "--include", "icons/*")
+
+        self.assertEqual(code, 0)
+        self.assertEqual(
+            sorted(os.path.basename(r["output_path"]) for r in records),
+            ["c_compressed.png", "skip_compressed.png"]
+        )
+
+    def test_auto_format_sets_extension(self):
+        out_dir = os.path.join(self.tmp.name, "out")
+        code, records = self.run_cli(self.src, "-o", out_dir, "-f", "auto", "--include", "icons/c.*")
+
+        self.assertEqual(code, 0)
+        output_path = records[0]["output_path"]
+        self.assertTrue(os.path.exists(output_path))
+        with Image.open(output_path) as img:
+            self.assertEqual(FORMAT_EXTENSIONS[img.format], os.path.splitext(output_path)[1])
+
+    def test_queue_enqueue_work_and_status(self):
+        queue_dir = os.path.join(self.tmp.name, "queue")
+        out_dir = os.path.join(self.tmp.name, "out")
+        code, records = self.run_cli(self.src, "-o", out_dir, "-f", "webp", "--queue", queue_dir, "--chunk-size", "3")
+        self.assertEqual((code, records), (0, []))
+
+        code, records = self.run_cli("--queue", queue_dir, "--work", "--jobs", "1")
+        self.assertEqual(code, 0)
+        self.assertEqual(len(records), 4)
+        self.assertTrue(all(os.path.exists(r["output_path"]) for r in records))
+
+        code, records = self.run_cli("--queue", queue_dir, "--status")
+        self.assertEqual(code, 0)
+        self.assertEqual((records[0]["chunks"], records[0]["processed"], records[0]["complete"]), (2, 4, True))
+
+    def test_responsive_variants_and_manifest(self):
+        out_dir = os.path.join(self.tmp.name, "out")
+        manifest_path = os.path.join(out_dir, "srcset.json")
+        code, records = self.run_cli(
+            self.src, "-o", out_dir, "--include", "a.*", "--widths", "64", "128",
+            "--variant-formats", "webp", "jpeg", "--manifest", manifest_path
+        )
+
+        self.assertEqual(code, 0)
+        self.assertEqual(
+            sorted(os.path.basename(r["output_path"]) for r in records),
+            ["a-128w.jpg", "a-128w.webp", "a-64w.jpg", "a-64w.webp"]
+        )
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        self.assertEqual(list(manifest), ["../src/a.jpg"])
+        self.assertEqual(manifest["../src/a.jpg"]["sources"][0]["srcset"], "a-64w.webp 64w, a-128w.webp 128w")
+
+    def test_does_not_import_pyqt(self):
+        code = "import sys, cli; sys.exit(any(m.startswith('PyQt5') for m in sys.modules))"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code], cwd=ROOT).returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageDraw, ImageFilter
+from batch import BatchJob
+from dedupe import Deduplicator
+
+
+class TestDeduplicator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        photo = Image.merge("RGB", [
+            Image.radial_gradient("L").resize((320, 240)), Image.linear_gradient("L").resize((320, 240)),
+            Image.linear_gradient("L").rotate(90).resize((320, 240)),
+        ]).filter(ImageFilter.GaussianBlur(2))
+        self.photo = self.path("photo.jpg")
+        photo.save(self.photo, quality=95)
+        self.copy = self.path("copy.jpg")
+        shutil.copyfile(self.photo, self.copy)
+        # Re-exported at another quality: different bytes, same picture
+        self.reexport = self.path("reexport.jpg")
+        photo.save(self.reexport, quality=70)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def job(self, path, quality=80):
+        return BatchJob(path, path + ".out.webp", quality, "WEBP", 1.0)
+
+    def test_exact_groups_identical_bytes_and_settings(self):
+        dedupe = Deduplicator("exact")
+        group = dedupe.group(self.job(self.photo))
+        self.assertEqual(dedupe.group(self.job(self.copy)), group)
+        self.assertNotEqual(dedupe.group(self.job(self.reexport)), group)
+        # Other settings give another output
+        self.assertNotEqual(dedupe.group(self.job(self.copy, quality=60)), group)
+        self.assertIsNone(dedupe.group(self.job(self.path("missing.jpg"))))
+
+    def test_near_groups_reexports_only(self):
+        dedupe = Deduplicator("near")
+        group = dedupe.group(self.job(self.photo))
+        self.assertEqual(dedupe.group(self.job(self.reexport)), group)
+
+        # A resized copy and a different picture stay apart
+        with Image.open(self.photo) as img:
+            img.resize((160, 120)).save(self.path("small.jpg"))
+            img.transpose(Image.Transpose.FLIP_LEFT_RIGHT).save(self.path("flipped.jpg"))
+        self.assertNotEqual(dedupe.group(self.job(self.path("small.jpg"))), group)
+        self.assertNotEqual(dedupe.group(self.job(self.path("flipped.jpg"))), group)
+
+        # Flat images have equal dHashes; the colour thumbnail keeps them apart
+        Image.new("RGB", (64, 64), (255, 0, 0)).save(self.path("red.png"))
+        Image.new("RGB", (64, 64), (0, 0, 255)).save(self.path("blue.png"))
+        self.assertNotEqual(dedupe.group(self.job(self.path("red.png"))), dedupe.group(self.job(self.path("blue.png"))))
+
+    def test_near_keeps_same_layout_screenshots_apart(self):
+        # Product screenshots that differ only in a price or SKU label share every hash
+        paths = []
+        for i, label in enumerate(["$19.99", "$29.99", "SKU 4411", "SKU 4471"]):
+            shot = Image.new("RGB", (800, 600), (245, 245, 245))
+            draw = ImageDraw.Draw(shot)
+            draw.rectangle((40, 40, 760, 120), fill=(30, 60, 120))
+            draw.rectangle((40, 160, 400, 520), fill=(200, 200, 210))
+            draw.text((450, 300), label, fill=(20, 20, 20))
+            paths.append(self.path(f"shot{i}.png"))
+            shot.save(paths[-1])
+
+        dedupe = Deduplicator("near")
+        groups = [dedupe.group(self.job(path)) for path in paths]
+        self.assertEqual(len(set(groups)), 4)
+        # A re-export of one of them still joins its group
+        with Image.open(paths[1]) as img:
+            img.save(self.path("shot1.jpg"), quality=95)
+        self.assertEqual(dedupe.group(self.job(self.path("shot1.jpg"))), groups[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import ExifTags, Image, ImageFilter
+from algorithms import BYTES_PER_MB, compress_image
+from estimator import SizeEstimator
+
+
+def make_photo(path, size):
+    # Детерминированная "фотография": фрактал + градиент
+    base = Image.effect_mandelbrot(size, (-2, -1.2, 1, 1.2), 100).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    Image.blend(base, gradient, 0.4).filter(ImageFilter.GaussianBlur(1)).save(path, quality=95)
+    return path
+
+
+class TestSizeEstimator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = make_photo(os.path.join(self.tmp.name, "photo.jpg"), (2400, 1600))
+
+    def test_estimate_close_to_real_output(self):
+        estimator = SizeEstimator()
+        for fmt, quality, resize in [("JPEG", 80, 1.0), ("WEBP", 80, 0.5), ("PNG", 50, 0.25)]:
+            out = os.path.join(self.tmp.name, "out." + fmt.lower())
+            actual = compress_image(self.src, out, quality, fmt, resize).compressed_size_mb
+            estimated = estimator.estimate(self.src, quality, resize, fmt)
+            self.assertLess(abs(estimated / actual - 1), 0.5, f"{fmt} q{quality} r{resize}")
+
+    def test_decodes_once_and_caches_results(self):
+        estimator = SizeEstimator()
+        with patch("estimator.Image.open", wraps=Image.open) as mock_open:
+            first = estimator.estimate(self.src, 70, 0.5, "JPEG")
+            estimator.estimate(self.src, 40, 1.0, "WEBP")
+            again = estimator.estimate(self.src, 70, 0.5, "JPEG")
+
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertEqual(first, again)
+
+    def test_follows_the_metadata_policy_like_compress_image(self):
+        # A q70 source at q85 is only passed through when the policy would drop nothing from it
+        exif = Image.Exif()
+        exif[ExifTags.Base.ImageDescription] = "x" * 20000
+        with Image.open(self.src) as img:
+            plain = os.path.join(self.tmp.name, "plain.jpg")
+            tagged = os.path.join(self.tmp.name, "tagged.jpg")
+            img.resize((600, 400)).save(plain, quality=70)
+            img.resize((600, 400)).save(tagged, quality=70, exif=exif)
+
+        estimator = SizeEstimator()
+        for path, metadata in [(plain, "orient"), (plain, "strip"), (tagged, "orient"), (tagged, "strip")]:
+            result = compress_image(path, os.path.join(self.tmp.name, "out.jpg"), 85, "JPEG", 1.0, metadata=metadata)
+            estimated = estimator.estimate(path, 85, 1.0, "JPEG", metadata=metadata)
+            original = os.path.getsize(path) / BYTES_PER_MB
+            self.assertEqual(estimated == original, result.source_action == "passthrough", f"{path} {metadata}")
+        self.assertLess(estimator.estimate(tagged, 85, 1.0, "JPEG", metadata="icc"), os.path.getsize(tagged) / BYTES_PER_MB)
+
+    def test_estimate_many_sums_items(self):
+        estimator = SizeEstimator()
+        items = [(self.src, "JPEG"), (self.src, "WEBP")]
+        total = estimator.estimate_many(items, 60, 0.5)
+        self.assertAlmostEqual(
+            total, estimator.estimate(self.src, 60, 0.5, "JPEG") + estimator.estimate(self.src, 60, 0.5, "WEBP")
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
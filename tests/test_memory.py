@@ -0,0 +1,198 @@
+import unittest
+from unittest.mock import patch
+import subprocess
+import tempfile
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from PIL import Image, ImageChops
+from algorithms import compress_image, image_bytes, resize_in_strips
+from batch import BatchJob, BatchScheduler
+from memory import estimate_peak_bytes, pixel_bytes
+
+
+class TestPeakEstimate(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def save(self, name, img):
+        path = os.path.join(self.tmp.name, name)
+        img.save(path)
+        return path
+
+    def test_counts_decoded_and_output_buffers(self):
+        path = self.save("a.png", Image.new("RGB", (400, 300)))
+        decoded = 400 * 300 * pixel_bytes("RGB")
+
+        self.assertEqual(estimate_peak_bytes(path, 1.0), decoded + 2 * 400 * 300 * 4)
+        self.assertEqual(estimate_peak_bytes(path, 0.5), decoded + 3 * 200 * 150 * 4)
+        self.assertLess(estimate_peak_bytes(path, 0.5, low_memory=True), estimate_peak_bytes(path, 0.5))
+
+    def test_scales_with_format_and_alpha(self):
+        path = self.save("a.png", Image.new("RGB", (400, 300)))
+        alpha = self.save("b.png", Image.new("RGBA", (400, 300)))
+        decoded = 400 * 300 * 4
+        formats = ("JPEG", "PNG", "WEBP", "AUTO")
+        fast = [estimate_peak_bytes(path, 1.0, output_format=fmt, effort="fast") for fmt in formats]
+        balanced = [estimate_peak_bytes(path, 1.0, output_format=fmt) for fmt in formats]
+
+        self.assertEqual(fast, [decoded + copies * 400 * 300 * 4 for copies in (2, 3, 5, 5)])
+        # Racing PNG strategies holds more candidates at once
+        self.assertEqual(balanced, [decoded + copies * 400 * 300 * 4 for copies in (2, 5, 5, 7)])
+        self.assertEqual(estimate_peak_bytes(path, 1.0), balanced[0])
+        self.assertGreater(estimate_peak_bytes(alpha, 1.0, output_format="AUTO"), balanced[3])
+
+    def test_jpeg_draft_shrinks_decoded_size(self):
+        png = self.save("a.png", Image.new("RGB", (1600, 1200)))
+        jpg = self.save("a.jpg", Image.new("RGB", (1600, 1200)))
+        self.assertLess(estimate_peak_bytes(jpg, 0.1), estimate_peak_bytes(png, 0.1))
+
+
+class TestLowMemoryPath(unittest.TestCase):
+
+    def test_strip_resize_matches_whole_resize(self):
+        img = Image.effect_mandelbrot((900, 700), (-2, -1.2, 1, 1.2), 100).convert("RGB")
+        size = (301, 233)
+        whole = img.resize(size, Image.Resampling.LANCZOS)
+        strips = resize_in_strips(img, size, strip_rows=32)
+
+        self.assertEqual(strips.size, size)
+        self.assertLessEqual(max(high for _, high in ImageChops.difference(whole, strips).getextrema()), 1)
+
+    def test_compress_image_low_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src.png")
+            Image.linear_gradient("L").resize((800, 600)).convert("RGBA").save(src)
+
+            result = compress_image(src, os.path.join(tmp, "out.jpg"), 80, "JPEG", 0.5, low_memory=True)
+
+            self.assertEqual(result.final_resolution, (400, 300))
+
+
+# Measures peak RSS growth of one compress_image call in a fresh interpreter
+_RSS_SCRIPT = """
+import resource, sys
+from algorithms import compress_image
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+compress_image(sys.argv[1], sys.argv[2], 80, sys.argv[3], 1.0)
+print((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024)
+"""
+
+# Same, from the process's own high-water mark: ru_maxrss carries over the parent's peak
+_HWM_SCRIPT = """
+import sys
+from algorithms import compress_image
+
+def status(key):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) * 1024 for line in f if line.startswith(key))
+
+before = status("VmRSS:")
+compress_image(sys.argv[1], sys.argv[2], 80, sys.argv[3], 1.0)
+print(status("VmHWM:") - before)
+"""
+
+
+class TestPeakMemory(unittest.TestCase):
+
+    def test_tracked_peak_without_full_copies(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src.png")
+            Image.effect_mandelbrot((800, 600), (-2, -1.2, 1, 1.2), 100).convert("RGBA").save(src)
+            decoded = 800 * 600 * 4
+
+            with patch.object(Image.Image, "copy") as mock_copy:
+                jpeg = compress_image(src, os.path.join(tmp, "out.jpg"), 80, "JPEG", 1.0)
+                webp = compress_image(src, os.path.join(tmp, "out.webp"), 80, "WEBP", 1.0)
+            mock_copy.assert_not_called()
+
+            # JPEG: the RGBA decode is freed once converted to RGB, so the conversion is the peak;
+            # WebP encodes the decode as is
+            self.assertEqual(jpeg.timings.peak_memory_bytes, 2 * decoded)
+            self.assertEqual(webp.timings.peak_memory_bytes, decoded + os.path.getsize(webp.output_path))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "ru_maxrss is in KB only on Linux")
+    def test_reference_24mp_peak_rss(self):
+        # Peak RSS as a multiple of the decoded reference image (6000x4000 RGB)
+        limits = {"JPEG": 2.0, "PNG": 4.0}
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "ref.jpg")
+            img = Image.effect_mandelbrot((1500, 1000), (-2, -1.2, 1, 1.2), 100).convert("RGB")
+            img = img.resize((6000, 4000), Image.Resampling.BILINEAR)
+            decoded = image_bytes(img)
+            img.save(src, quality=90)
+            del img
+
+            for fmt, limit in limits.items():
+                out = os.path.join(tmp, "out." + fmt.lower())
+                run = subprocess.run(
+                    [sys.executable, "-c", _RSS_SCRIPT, src, out, fmt],
+                    cwd=ROOT, capture_output=True, text=True, check=True
+                )
+                peak = int(run.stdout)
+                self.assertLess(peak, limit * decoded, f"{fmt}: {peak / decoded:.2f}x decoded size")
+
+    @unittest.skipUnless(os.path.exists("/proc/self/status"), "needs VmHWM from /proc")
+    def test_estimate_covers_candidate_formats(self):
+        # WebP and AUTO on an image with alpha hold the most buffers at once
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "alpha.png")
+            img = Image.effect_mandelbrot((2000, 1500), (-2, -1.2, 1, 1.2), 100).convert("RGBA")
+            img.putalpha(Image.linear_gradient("L").resize(img.size))
+            img.save(src, compress_level=1)
+            del img
+
+            for fmt in ("PNG", "WEBP", "AUTO"):
+                run = subprocess.run(
+                    [sys.executable, "-c", _HWM_SCRIPT, src, os.path.join(tmp, "out.png"), fmt],
+                    cwd=ROOT, capture_output=True, text=True, check=True
+                )
+                estimate = estimate_peak_bytes(src, 1.0, output_format=fmt)
+                self.assertLess(int(run.stdout), estimate, f"{fmt}: {int(run.stdout) / estimate:.2f}x the estimate")
+
+
+class TestMemoryBudget(unittest.TestCase):
+
+    def test_oversized_jobs_switch_to_low_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = []
+            for i in range(3):
+                src = os.path.join(tmp, f"img{i}.png")
+                Image.new("RGB", (300, 200), (i * 60, 10, 10)).save(src)
+                jobs.append(BatchJob(src, os.path.join(tmp, f"out{i}.jpg"), 75, "JPEG", 0.5))
+
+            scheduler = BatchScheduler(max_workers=2, memory_budget=1024)
+            admitted, peak = scheduler.admit(jobs[0])
+            self.assertTrue(admitted.low_memory)
+            self.assertGreater(peak, 1024)
+
+            seen = []
+            summary = scheduler.run(jobs, on_result=lambda job, result, error: seen.append(job.low_memory))
+            self.assertEqual(len(summary.results), 3)
+            self.assertEqual(seen, [True, True, True])
+
+    def test_no_budget_keeps_jobs_unchanged(self):
+        job = BatchJob("missing.png", "out.png", 75, "PNG", 1.0)
+        self.assertEqual(BatchScheduler(memory_budget=0).admit(job), (job, 0))
+
+    def test_unknown_ram_disables_the_budget(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = []
+            for i in range(3):
+                src = os.path.join(tmp, f"img{i}.png")
+                Image.new("RGB", (64, 48), (i * 60, 10, 10)).save(src)
+                jobs.append(BatchJob(src, os.path.join(tmp, f"out{i}.jpg"), 75, "JPEG", 1.0))
+
+            with patch("memory.physical_memory", return_value=None):
+                scheduler = BatchScheduler(max_workers=2)
+            self.assertEqual(scheduler.memory_budget, 0)
+            summary = scheduler.run(jobs)
+            self.assertEqual((len(summary.results), len(summary.failures)), (3, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
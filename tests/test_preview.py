@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageChops, ImageStat
+from preview import PreviewRenderer
+
+
+def mean_diff(a, b):
+    return sum(ImageStat.Stat(ImageChops.difference(a, b)).mean)
+
+
+class TestPreviewRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = os.path.join(self.tmp.name, "photo.jpg")
+        Image.effect_mandelbrot((3000, 2000), (-2, -1.2, 1, 1.2), 100).convert("RGB").save(self.src, quality=95)
+
+    def test_before_after_crop(self):
+        preview = PreviewRenderer().render(self.src, 80, 1.0, "JPEG")
+        size = (PreviewRenderer.CROP_SIZE, PreviewRenderer.CROP_SIZE)
+        self.assertEqual(preview.before.size, size)
+        self.assertEqual(preview.after.size, size)
+        self.assertGreater(preview.encoded_bytes, 0)
+
+    def test_lower_settings_look_worse(self):
+        renderer = PreviewRenderer()
+        good = renderer.render(self.src, 95, 1.0, "JPEG")
+        low_quality = renderer.render(self.src, 10, 1.0, "JPEG")
+        downscaled = renderer.render(self.src, 95, 0.1, "JPEG")
+        self.assertLess(mean_diff(good.before, good.after), mean_diff(low_quality.before, low_quality.after))
+        self.assertLess(mean_diff(good.before, good.after), mean_diff(downscaled.before, downscaled.after))
+
+    def test_decodes_once_and_memoizes(self):
+        renderer = PreviewRenderer()
+        with patch("preview.Image.open", wraps=Image.open) as mock_open:
+            first = renderer.render(self.src, 70, 0.5, "JPEG")
+            renderer.render(self.src, 40, 1.0, "WEBP")
+            decodes = mock_open.call_count
+            self.assertIs(renderer.render(self.src, 70, 0.5, "JPEG"), first)
+            self.assertEqual(mock_open.call_count, decodes)
+        # One source decode plus one decode of each encoded crop
+        self.assertEqual(decodes, 3)
+
+    def test_stale_request_is_abandoned(self):
+        renderer = PreviewRenderer()
+        with patch("preview.encode_for_format") as mock_encode:
+            self.assertIsNone(renderer.render(self.src, 70, 1.0, "JPEG", is_stale=lambda: True))
+            mock_encode.assert_not_called()
+        # Nothing was memoized for the abandoned request
+        self.assertIsNotNone(renderer.render(self.src, 70, 1.0, "JPEG", is_stale=lambda: False))
+
+
+if __name__ == "__main__":
+    unittest.main()
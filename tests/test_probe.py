@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import ExifTags, Image, ImageFile
+from probe import MetadataProbe, probe_image
+
+
+class TestMetadataProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.jpg = os.path.join(self.tmp.name, "photo.jpg")
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        Image.new("RGB", (640, 480), (200, 100, 50)).save(self.jpg, quality=75, exif=exif)
+        self.png = os.path.join(self.tmp.name, "icon.png")
+        Image.new("LA", (32, 16)).save(self.png)
+
+    def test_reads_header_without_decoding(self):
+        with patch.object(ImageFile.ImageFile, "load") as mock_load:
+            info = probe_image(self.jpg)
+            png_info = probe_image(self.png)
+            mock_load.assert_not_called()
+
+        self.assertEqual(info.size, (640, 480))
+        self.assertEqual((info.mode, info.format), ("RGB", "JPEG"))
+        self.assertEqual(info.orientation, 6)
+        self.assertEqual(info.file_size, os.path.getsize(self.jpg))
+        self.assertEqual(len(info.quantization[0]), 64)
+
+        self.assertEqual((png_info.size, png_info.mode, png_info.format), ((32, 16), "LA", "PNG"))
+        self.assertEqual(png_info.orientation, 1)
+        self.assertIsNone(png_info.quantization)
+
+    def test_cached_until_file_changes(self):
+        probe = MetadataProbe()
+        with patch("probe.Image.open", wraps=Image.open) as mock_open:
+            first = probe.probe(self.jpg)
+            self.assertIs(probe.probe(self.jpg), first)
+            self.assertEqual(mock_open.call_count, 1)
+
+            Image.new("RGB", (100, 60)).save(self.jpg)
+            self.assertEqual(probe.probe(self.jpg).size, (100, 60))
+            self.assertEqual(mock_open.call_count, 2)
+
+    def test_probe_many_maps_unreadable_files_to_none(self):
+        broken = os.path.join(self.tmp.name, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        missing = os.path.join(self.tmp.name, "missing.png")
+
+        infos = MetadataProbe().probe_many([self.jpg, self.png, broken, missing])
+        self.assertEqual(infos[self.jpg].size, (640, 480))
+        self.assertEqual(infos[self.png].size, (32, 16))
+        self.assertIsNone(infos[broken])
+        self.assertIsNone(infos[missing])
+
+        # Over Pillow's decompression bomb limit: unreadable as well
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            infos = MetadataProbe().probe_many([self.jpg, self.png])
+        self.assertIsNone(infos[self.jpg])
+        self.assertEqual(infos[self.png].size, (32, 16))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import CompressionTimings, StageTiming
+from profiling import MemoryTracker, StageTimer, TimingStats
+
+
+class TestStageTimer(unittest.TestCase):
+
+    def test_stages_accumulate(self):
+        timer = StageTimer()
+        for _ in range(3):
+            with timer.stage("encode"):
+                sum(range(10000))
+        with self.assertRaises(ValueError):
+            with timer.stage("write"):
+                raise ValueError()
+
+        self.assertEqual(list(timer.timings.stages), ["encode", "write"])
+        self.assertGreater(timer.timings.stages["encode"].wall, 0)
+
+
+class TestMemoryTracker(unittest.TestCase):
+
+    def test_peak_of_overlapping_buffers(self):
+        memory = MemoryTracker()
+        memory.hold("image", 100)
+        memory.hold("converted", 80)
+        memory.release("image")
+        memory.hold("encoded", 10)
+        memory.hold("encoded", 30)
+        memory.release("converted")
+
+        self.assertEqual(memory.peak, 180)
+        self.assertEqual(memory.current, 30)
+
+
+class TestTimingStats(unittest.TestCase):
+
+    def test_percentiles_per_stage(self):
+        stats = TimingStats()
+        for i in range(1, 101):
+            stats.add(CompressionTimings({"encode": StageTiming(wall=i / 1000)}, bytes_read=10, bytes_written=5))
+
+        pcts = stats.percentiles()
+
+        self.assertAlmostEqual(pcts["encode"]["p50"], 0.050)
+        self.assertAlmostEqual(pcts["encode"]["p90"], 0.090)
+        self.assertAlmostEqual(pcts["total"]["p99"], 0.099)
+        self.assertEqual((stats.bytes_read, stats.bytes_written), (1000, 500))
+        self.assertIn("encode", stats.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import io
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageFilter
+from quality_metrics import SSIMScorer, ssim
+
+
+def jpeg_roundtrip(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+class TestSSIM(unittest.TestCase):
+
+    def setUp(self):
+        size = (640, 480)
+        base = Image.effect_mandelbrot(size, (-2, -1.2, 1, 1.2), 100).convert("RGB")
+        self.img = Image.blend(base, Image.linear_gradient("L").resize(size).convert("RGB"), 0.4)
+
+    def test_identical_images_score_one(self):
+        self.assertAlmostEqual(ssim(self.img, self.img.copy()), 1.0, places=5)
+
+    def test_score_drops_with_quality(self):
+        scorer = SSIMScorer(self.img)
+        scores = [scorer.score(jpeg_roundtrip(self.img, q)) for q in (95, 60, 20, 5)]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertLess(scorer.score(self.img.filter(ImageFilter.GaussianBlur(3))), scores[0])
+
+    def test_strided_sampling_close_to_full_grid(self):
+        candidate = jpeg_roundtrip(self.img, 40)
+        full = ssim(self.img, candidate)
+        sampled = ssim(self.img, candidate, max_pixels=20_000)
+        self.assertAlmostEqual(full, sampled, delta=0.02)
+
+    def test_size_mismatch_raises(self):
+        with self.assertRaises(ValueError):
+            ssim(self.img, self.img.resize((320, 240)))
+
+
+if __name__ == '__main__':
+    unittest.main()
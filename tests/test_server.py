@@ -0,0 +1,136 @@
+import unittest
+import asyncio
+import http.client
+import io
+import socket
+import threading
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+from server import CompressionServer, allow_pixels
+
+
+def jpeg_bytes(size=(400, 300)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (30, 120, 200)).save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+class ServerThread:
+    """Runs a CompressionServer on its own event loop in a background thread."""
+
+    def __init__(self, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.server = CompressionServer(port=0, **kwargs)
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.host, self.port = asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result(10)
+
+    def request(self, method, path, body=None, headers=None, **kwargs):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers or {}, **kwargs)
+            response = conn.getresponse()
+            return response, response.read()
+        finally:
+            conn.close()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(30)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+
+
+class TestCompressionServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ServerThread(max_workers=1, max_concurrency=1, max_pixels=1_000_000)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_compresses_upload(self):
+        body = jpeg_bytes()
+        response, data = self.server.request("POST", "/compress?format=webp&quality=70&resize=0.5", body)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Type"), "image/webp")
+        self.assertEqual(int(response.getheader("X-Original-Size")), len(body))
+        self.assertEqual(response.getheader("X-Resolution"), "200x150")
+        with Image.open(io.BytesIO(data)) as img:
+            self.assertEqual((img.format, img.size), ("WEBP", (200, 150)))
+
+        # Chunked uploads are spooled the same way; the input format is kept by default
+        response, data = self.server.request(
+            "POST", "/compress", iter([body[:1000], body[1000:]]), encode_chunked=True
+        )
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Type"), "image/jpeg")
+        self.assertLessEqual(len(data), len(body))
+
+    def test_rejects_bad_requests(self):
+        body = jpeg_bytes()
+        self.assertEqual(self.server.request("POST", "/compress?quality=0", body)[0].status, 400)
+        self.assertEqual(self.server.request("POST", "/compress?format=gif", body)[0].status, 400)
+        self.assertEqual(self.server.request("POST", "/compress", b"not an image")[0].status, 415)
+        self.assertEqual(self.server.request("GET", "/compress")[0].status, 405)
+        self.assertEqual(self.server.request("GET", "/nowhere")[0].status, 404)
+
+        # Pixel guard: the header alone decides, no worker is involved
+        response, data = self.server.request("POST", "/compress", jpeg_bytes((1200, 1000)))
+        self.assertEqual(response.status, 413)
+        self.assertIn(b"pixels", data)
+
+        # Pillow's own bomb limit is a 413 too, not a crashed request
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 10_000):
+            response, data = self.server.request("POST", "/compress", body)
+        self.assertEqual(response.status, 413)
+        self.assertIn(b"decompression bomb", data)
+
+    def test_pillow_limit_follows_max_pixels(self):
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 89_478_485):
+            allow_pixels(300_000_000)
+            self.assertEqual(Image.MAX_IMAGE_PIXELS, 300_000_000)
+            allow_pixels(1_000_000)
+            self.assertEqual(Image.MAX_IMAGE_PIXELS, 300_000_000)
+
+    def test_backpressure(self):
+        body = jpeg_bytes()
+        # A client that sent its headers but is still uploading holds the only slot
+        slow = socket.create_connection((self.server.host, self.server.port))
+        try:
+            slow.sendall(b"POST /compress HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n" % len(body) + body[:100])
+            for _ in range(100):
+                if self.server.server.metrics.in_flight:
+                    break
+                threading.Event().wait(0.05)
+            response, _ = self.server.request("POST", "/compress", body)
+            self.assertEqual(response.status, 429)
+            self.assertEqual(response.getheader("Retry-After"), "1")
+
+            slow.sendall(body[100:])
+            reply = b""
+            while chunk := slow.recv(65536):
+                reply += chunk
+            self.assertTrue(reply.startswith(b"HTTP/1.1 200"))
+        finally:
+            slow.close()
+
+    def test_metrics(self):
+        self.server.request("POST", "/compress?quality=60", jpeg_bytes())
+        response, data = self.server.request("GET", "/metrics")
+        self.assertEqual(response.status, 200)
+        text = data.decode()
+        self.assertIn('compressor_responses_total{status="200"}', text)
+        self.assertIn('compressor_compress_seconds_bucket{le="+Inf"}', text)
+        self.assertIn("compressor_request_seconds_count", text)
+        self.assertIn("compressor_in_flight 0", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import tempfile
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+from batch import BatchJob, BatchScheduler, suggest_output_path
+from watch import FolderWatcher, InotifyWatcher, PollingWatcher, WatchState
+
+
+def make_image(path, color=(200, 100, 50)):
+    Image.new("RGB", (48, 32), color).save(path)
+    return path
+
+
+def poll_until(watcher, predicate, timeout=5.0):
+    changed = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        changed |= watcher.poll(0.1)
+        if predicate(changed):
+            break
+    return changed
+
+
+class TestWatchers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+
+    def test_polling_reports_new_and_modified_files(self):
+        existing = make_image(os.path.join(self.root, "a.png"))
+        watcher = PollingWatcher([self.root], interval=0)
+
+        new = make_image(os.path.join(self.root, "b.png"))
+        make_image(existing, color=(1, 2, 3))
+        os.utime(existing, ns=(0, 10**9))
+
+        self.assertEqual(watcher.poll(0.1), {existing, new})
+        self.assertEqual(watcher.poll(0.1), set())
+
+    @unittest.skipUnless(InotifyWatcher.available(), "inotify is Linux only")
+    def test_inotify_sees_files_in_new_folders(self):
+        watcher = InotifyWatcher([self.root])
+        self.addCleanup(watcher.close)
+        os.makedirs(os.path.join(self.root, "new", "deeper"))
+        path = make_image(os.path.join(self.root, "new", "deeper", "c.png"))
+        open(os.path.join(self.root, "notes.txt"), "w").close()
+
+        changed = poll_until(watcher, lambda found: path in found)
+
+        self.assertEqual(changed, {path})
+
+
+class TestFolderWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, "in")
+        self.out = os.path.join(self.tmp.name, "out")
+        os.makedirs(self.root)
+        os.makedirs(self.out)
+        self.state_path = os.path.join(self.tmp.name, "state.json")
+
+    def make_watcher(self):
+        def job_for(path):
+            return BatchJob(path, suggest_output_path(path, self.out, "JPEG"), 70, "JPEG", 1.0)
+        scheduler = BatchScheduler(max_workers=1, memory_budget=0)
+        return FolderWatcher(
+            [self.root], job_for, scheduler, self.state_path,
+            settle=0.2, batch_window=0.1, watcher=PollingWatcher([self.root], interval=0)
+        )
+
+    def run_until_idle(self, watcher, timeout=20.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            watcher.run_once(0.05)
+            if not watcher.backlog:
+                return
+
+    def test_debounces_processes_and_remembers(self):
+        watcher = self.make_watcher()
+        path = make_image(os.path.join(self.root, "a.png"))
+        watcher.run_once(0.05)
+        self.assertEqual(watcher.processed, 0)  # not settled yet
+
+        self.run_until_idle(watcher)
+
+        self.assertEqual(watcher.processed, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.out, "a_compressed.jpg")))
+        self.assertTrue(WatchState(self.state_path).is_current(path, (os.path.getsize(path), os.stat(path).st_mtime_ns)))
+
+    def test_restart_only_catches_up_on_changes(self):
+        make_image(os.path.join(self.root, "a.png"))
+        make_image(os.path.join(self.root, "b.png"))
+        first = self.make_watcher()
+        self.assertEqual(first.catch_up(), 2)
+        self.run_until_idle(first)
+        self.assertEqual(first.processed, 2)
+
+        make_image(os.path.join(self.root, "c.png"))
+        second = self.make_watcher()
+
+        self.assertEqual(second.catch_up(), 1)
+        self.assertEqual(list(second._settling), [os.path.join(self.root, "c.png")])
+
+if __name__ == '__main__':
+    unittest.main()
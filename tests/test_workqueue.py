@@ -0,0 +1,123 @@
+import unittest
+import tempfile
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+from batch import BatchJob, BatchScheduler
+from workqueue import QueueWorker, WorkQueue, chunk_name, create_queue, run_local_nodes
+
+
+def make_jobs(tmp, count):
+    os.makedirs(os.path.join(tmp, "out"), exist_ok=True)
+    jobs = []
+    for i in range(count):
+        path = os.path.join(tmp, f"img{i}.png")
+        Image.new("RGB", (64, 48), (i * 20, 80, 120)).save(path)
+        jobs.append(BatchJob(path, os.path.join(tmp, "out", f"img{i}.webp"), 70, "WEBP", 1.0))
+    return jobs
+
+
+def expire_lease(queue_dir, chunk):
+    path = os.path.join(queue_dir, "leases", chunk_name(chunk))
+    with open(path, encoding="utf-8") as f:
+        lease = json.load(f)
+    lease["expires"] = 0
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(lease, f)
+
+
+def in_process_worker(queue, wait=False):
+    return QueueWorker(queue, lambda: BatchScheduler(1, memory_budget=0), wait=wait, poll_interval=0.05)
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def test_leases_are_exclusive_until_they_expire(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_dir = os.path.join(tmp, "queue")
+            manifest = create_queue(queue_dir, make_jobs(tmp, 5), chunk_size=2)
+            self.assertEqual((manifest["chunks"], manifest["files"]), (3, 5))
+            with self.assertRaises(FileExistsError):
+                create_queue(queue_dir, [], chunk_size=2)
+
+            first, second = WorkQueue(queue_dir, "a"), WorkQueue(queue_dir, "b")
+            claimed = [first.claim(), second.claim(), first.claim()]
+            self.assertEqual(sorted(claimed), [0, 1, 2])
+            self.assertIsNone(second.claim())
+
+            # A crashed owner stops renewing: its chunk goes to the next claimer, and the
+            # old owner finds out at its next renewal
+            expire_lease(queue_dir, claimed[0])
+            self.assertEqual(second.claim(), claimed[0])
+            self.assertFalse(first.renew(claimed[0]))
+            self.assertTrue(second.renew(claimed[0]))
+            self.assertTrue(first.renew(claimed[2]))
+
+            status = first.status()
+            self.assertEqual((status.chunks, status.leased_chunks, status.done_chunks), (3, 3, 0))
+
+    def test_renewal_after_the_read_keeps_the_lease(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_dir = os.path.join(tmp, "queue")
+            create_queue(queue_dir, make_jobs(tmp, 2), chunk_size=2)
+            owner, other = WorkQueue(queue_dir, "owner"), WorkQueue(queue_dir, "other")
+            chunk = owner.claim()
+            expire_lease(queue_dir, chunk)
+
+            # other sees the expired lease, then the owner's heartbeat renews it (same token)
+            expired = other.read_lease(chunk)
+            self.assertTrue(owner.renew(chunk))
+            self.assertFalse(other._take_over(chunk, expired))
+
+            self.assertEqual(owner.read_lease(chunk)["worker"], "owner")
+            self.assertTrue(owner.renew(chunk))
+            self.assertIsNone(other.claim())
+
+    def test_worker_resumes_crashed_nodes_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_dir = os.path.join(tmp, "queue")
+            jobs = make_jobs(tmp, 4)
+            create_queue(queue_dir, jobs, chunk_size=2)
+            crashed = WorkQueue(queue_dir, "crashed")
+            crashed.claim()
+            crashed.claim()
+
+            # Both chunks are validly leased: nothing to do yet
+            summary = in_process_worker(WorkQueue(queue_dir, "alive")).run()
+            self.assertEqual(len(summary.results), 0)
+
+            expire_lease(queue_dir, 0)
+            expire_lease(queue_dir, 1)
+            summary = in_process_worker(WorkQueue(queue_dir, "alive")).run()
+            self.assertEqual(len(summary.results), 4)
+            for job in jobs:
+                self.assertTrue(os.path.exists(job.output_path))
+
+            status = WorkQueue(queue_dir).status()
+            self.assertTrue(status.complete)
+            self.assertEqual((status.processed, status.failed, status.expired_leases), (4, 0, 0))
+            self.assertEqual(status.workers, {"alive": 4})
+            self.assertEqual(os.listdir(os.path.join(queue_dir, "leases")), [])
+
+    def test_local_nodes_share_the_queue(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_dir = os.path.join(tmp, "queue")
+            jobs = make_jobs(tmp, 6)
+            jobs.append(BatchJob(os.path.join(tmp, "missing.png"), os.path.join(tmp, "out", "missing.webp"),
+                                 70, "WEBP", 1.0))
+            create_queue(queue_dir, jobs, chunk_size=2)
+
+            status = run_local_nodes(queue_dir, 2, {"max_workers": 1, "memory_budget": 0}, poll_interval=0.1)
+
+            self.assertTrue(status.complete)
+            self.assertEqual((status.processed, status.failed), (6, 1))
+            self.assertEqual(sum(status.workers.values()), 7)
+            self.assertGreater(status.images_per_sec, 0)
+            self.assertEqual(len(os.listdir(os.path.join(tmp, "out"))), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
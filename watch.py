@@ -0,0 +1,355 @@
+"""
+Watch-folder mode: compresses new or changed images as they appear.
+
+    python -m cli exports/ -o compressed/ --watch
+
+Changes come from inotify on Linux (via ctypes, no extra dependency) and from
+periodic directory scans elsewhere. A file is processed once its size and mtime
+have been stable for `settle` seconds; ready files are coalesced into batches
+for the BatchScheduler. Processed inputs are recorded in a small JSON state
+file, so a restart only picks up what changed while the watcher was down.
+"""
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from algorithms import write_bytes_atomic
+from batch import BatchJob, BatchScheduler, is_image_file
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+# (size, mtime_ns) of a file
+Signature = Tuple[int, int]
+
+
+def file_signature(path: str) -> Optional[Signature]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def scan_images(roots: Iterable[str]) -> Iterator[Tuple[str, Signature]]:
+    """Yields (path, signature) of every image under the roots, using scandir's stat."""
+    stack = list(roots)
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file() and is_image_file(entry.name):
+                            stat = entry.stat()
+                            yield entry.path, (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+class PollingWatcher:
+    """Portable fallback: rescans the roots every `interval` seconds and diffs signatures."""
+
+    def __init__(self, roots: List[str], interval: float = 2.0):
+        self.roots = roots
+        self.interval = interval
+        self._snapshot = dict(scan_images(roots))
+        self._next_scan = time.monotonic() + interval
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Returns paths changed since the last call, waiting up to timeout."""
+        delay = self._next_scan - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            if time.monotonic() < self._next_scan:
+                return set()
+        self._next_scan = time.monotonic() + self.interval
+
+        snapshot = dict(scan_images(self.roots))
+        changed = {path for path, sig in snapshot.items() if self._snapshot.get(path) != sig}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux inotify through ctypes. Every folder gets its own watch; folders
+    created later are added and scanned, since files may land before the watch.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, roots: List[str]):
+        self.roots = roots
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._folders: Dict[int, str] = {}
+        for root in roots:
+            self._add_tree(root)
+
+    @staticmethod
+    def available() -> bool:
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return False
+        return hasattr(ctypes.CDLL(libc_name), "inotify_init1")
+
+    def _add_tree(self, root: str) -> Set[str]:
+        """Watches root and its subfolders; returns the images already inside."""
+        found = set()
+        for folder, dirs, files in os.walk(root):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), self.MASK)
+            if wd >= 0:
+                self._folders[wd] = folder
+            found.update(os.path.join(folder, name) for name in files if is_image_file(name))
+        return found
+
+    def poll(self, timeout: float) -> Set[str]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = self._EVENT.unpack_from(buffer, offset)
+                name = os.fsdecode(buffer[offset + self._EVENT.size:offset + self._EVENT.size + length].rstrip(b"\0"))
+                offset += self._EVENT.size + length
+
+                if mask & self.IN_Q_OVERFLOW:
+                    # Events were dropped: fall back to a full scan
+                    logger.warning("inotify queue overflow, rescanning")
+                    changed.update(path for path, _ in scan_images(self.roots))
+                    continue
+                if mask & self.IN_IGNORED:
+                    self._folders.pop(wd, None)
+                    continue
+                folder = self._folders.get(wd)
+                if folder is None or not name:
+                    continue
+                path = os.path.join(folder, name)
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        changed.update(self._add_tree(path))
+                elif is_image_file(name):
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def make_watcher(roots: List[str], poll_interval: float = 2.0):
+    if InotifyWatcher.available():
+        try:
+            return InotifyWatcher(roots)
+        except OSError as e:
+            # e.g. the inotify watch limit is reached
+            logger.warning("inotify unavailable (%s), polling every %.1fs", e, poll_interval)
+    return PollingWatcher(roots, poll_interval)
+
+
+class WatchState:
+    """Signatures of processed inputs plus the outputs written for them (JSON file)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.inputs: Dict[str, Signature] = {}
+        self.outputs: Set[str] = set()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                self.inputs = {p: tuple(sig) for p, sig in data["inputs"].items()}
+                self.outputs = set(data["outputs"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def is_current(self, path: str, signature: Signature) -> bool:
+        return self.inputs.get(os.path.abspath(path)) == signature
+
+    def is_output(self, path: str) -> bool:
+        return os.path.abspath(path) in self.outputs
+
+    def mark_done(self, path: str, signature: Signature, output_path: Optional[str]):
+        self.inputs[os.path.abspath(path)] = signature
+        if output_path:
+            self.outputs.add(os.path.abspath(output_path))
+
+    def prune(self):
+        """Forgets inputs that no longer exist."""
+        self.inputs = {p: sig for p, sig in self.inputs.items() if os.path.exists(p)}
+
+    def save(self):
+        data = {"version": STATE_VERSION, "inputs": self.inputs, "outputs": sorted(self.outputs)}
+        write_bytes_atomic(self.path, json.dumps(data).encode())
+
+
+class FolderWatcher:
+    """
+    Debounces changes, coalesces them into batches and runs them on the scheduler.
+    make_job maps a changed path to its BatchJob, or None to skip the file.
+    """
+
+    def __init__(
+        self,
+        roots: List[str],
+        make_job: Callable[[str], Optional[BatchJob]],
+        scheduler: BatchScheduler,
+        state_path: str,
+        settle: float = 2.0,
+        batch_window: float = 1.0,
+        max_batch: int = 256,
+        poll_interval: float = 2.0,
+        watcher=None
+    ):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.make_job = make_job
+        self.scheduler = scheduler
+        self.state = WatchState(state_path)
+        self.settle = settle
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.watcher = watcher or make_watcher(self.roots, poll_interval)
+        self._stop = threading.Event()
+        # path -> (signature, time it was last seen changing)
+        self._settling: Dict[str, Tuple[Signature, float]] = {}
+        self._ready: Dict[str, Signature] = {}
+        self._last_change = 0.0
+        self.processed = 0
+        self.failed = 0
+
+    def stop(self):
+        """Thread-safe; the current batch finishes first."""
+        self._stop.set()
+        self.scheduler.cancel()
+
+    def _note_change(self, path: str, now: float):
+        if self.state.is_output(path):
+            return
+        signature = file_signature(path)
+        if signature is None or self.state.is_current(path, signature):
+            self._settling.pop(path, None)
+            return
+        if self._settling.get(path, (None,))[0] != signature:
+            self._settling[path] = (signature, now)
+            self._ready.pop(path, None)
+            self._last_change = now
+
+    def _check_settled(self, now: float):
+        for path, (signature, since) in list(self._settling.items()):
+            current = file_signature(path)
+            if current is None:
+                del self._settling[path]
+            elif current != signature:
+                # Still being written
+                self._settling[path] = (current, now)
+                self._last_change = now
+            elif now - since >= self.settle:
+                del self._settling[path]
+                self._ready[path] = signature
+
+    @property
+    def backlog(self) -> int:
+        return len(self._settling) + len(self._ready)
+
+    def _run_batch(self):
+        batch = dict(list(self._ready.items())[:self.max_batch])
+        for path in batch:
+            del self._ready[path]
+
+        jobs = []
+        for path, signature in batch.items():
+            job = self.make_job(path)
+            if job is None:
+                self.state.mark_done(path, signature, None)
+            else:
+                jobs.append(job)
+
+        input_bytes = sum(batch[job.input_path][0] for job in jobs)
+
+        def on_result(job, result, error):
+            if error:
+                logger.error("%s: %s", job.input_path, error)
+            # AUTO jobs learn their output extension only from the result
+            output_path = result.output_path if result is not None else job.output_path
+            self.state.mark_done(job.input_path, batch[job.input_path], output_path)
+
+        start = time.perf_counter()
+        summary = self.scheduler.run(jobs, on_result=on_result)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.state.save()
+
+        self.processed += len(summary.results)
+        self.failed += len(summary.failures)
+        logger.info(
+            "batch: %d files in %.2fs (%.2f img/s, %.2f MB/s), %d failed; backlog %d; total %d processed, %d failed",
+            len(jobs), elapsed, len(jobs) / elapsed, input_bytes / (1024 * 1024) / elapsed,
+            len(summary.failures), self.backlog, self.processed, self.failed
+        )
+
+    def run_once(self, timeout: float = 0.5) -> bool:
+        """One loop step: collect changes, promote settled files, run a batch if due. True if a batch ran."""
+        changed = self.watcher.poll(timeout)
+        now = time.monotonic()
+        for path in changed:
+            self._note_change(path, now)
+        self._check_settled(now)
+
+        burst_over = now - self._last_change >= self.batch_window
+        if self._ready and (burst_over or len(self._ready) >= self.max_batch):
+            self._run_batch()
+            return True
+        return False
+
+    def catch_up(self) -> int:
+        """Queues files that changed while the watcher was down; returns their count."""
+        self.state.prune()
+        now = time.monotonic()
+        for path, signature in scan_images(self.roots):
+            if not self.state.is_output(path) and not self.state.is_current(path, signature):
+                # Already on disk before we started: no need to wait for it to settle
+                self._settling[path] = (signature, now - self.settle)
+        return len(self._settling)
+
+    def run(self):
+        """Processes what changed while the watcher was down, then watches until stop()."""
+        pending = self.catch_up()
+        logger.info("watching %s (%s), %d files to catch up",
+                    ", ".join(self.roots), type(self.watcher).__name__, pending)
+        try:
+            while not self._stop.is_set():
+                self.run_once()
+        finally:
+            self.watcher.close()
+            self.state.save()
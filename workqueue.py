@@ -0,0 +1,421 @@
+"""
+Distributed batch mode: a work queue in a folder shared by any number of worker
+processes or hosts (NFS, SMB, or a local disk for testing).
+
+    python -m cli photos/ -o /shared/out --format webp --queue /shared/q   # enqueue
+    python -m cli --queue /shared/q --work --jobs 8                        # on every node
+    python -m cli --queue /shared/q --status
+
+Layout of the queue folder:
+    manifest.json     chunk and file count, lease TTL; written last, a queue exists once it does
+    chunks/<n>.json   the BatchJobs of chunk n
+    leases/<n>.json   owner, token and expiry of a claimed chunk, renewed by a heartbeat
+    done/<n>.json     completion record: per-file results, worker, start and end time
+
+A chunk is finished once its completion record exists. A node that crashes stops
+renewing its leases; they expire and other workers claim the chunks again, so a
+run can be interrupted and resumed at any point. Expiry compares wall clocks, so
+hosts need roughly synchronized clocks (NTP) and the TTL must cover their skew.
+Outputs are written atomically: a chunk that runs twice after a lost lease only
+costs time.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from algorithms import write_bytes_atomic
+from batch import BatchJob, BatchScheduler
+from models import BatchSummary, CompressionResult, QueueStatus
+
+logger = logging.getLogger(__name__)
+
+QUEUE_VERSION = 1
+DEFAULT_CHUNK_SIZE = 256
+# Seconds a claimed chunk stays leased without renewal; the owner renews it every third of that
+DEFAULT_LEASE_TTL = 120.0
+# Idle workers look for expired leases this often until every chunk is done
+DEFAULT_POLL_INTERVAL = 5.0
+
+_MANIFEST = "manifest.json"
+# Local stand-in nodes: spawned like the batch pool, each node runs its own pool
+_NODE_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def chunk_name(chunk: int) -> str:
+    return f"{chunk:08d}.json"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _read_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Any) -> None:
+    write_bytes_atomic(path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+
+def _listed_chunks(folder: str) -> Set[int]:
+    """Chunk numbers with a record in folder (temp files of atomic writes are skipped)."""
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return set()
+    return {int(name[:-5]) for name in names if name.endswith(".json") and name[:-5].isdigit()}
+
+
+def create_queue(
+    queue_dir: str, jobs: Iterable[BatchJob], chunk_size: int = DEFAULT_CHUNK_SIZE,
+    lease_ttl: float = DEFAULT_LEASE_TTL
+) -> Dict[str, Any]:
+    """
+    Writes jobs into queue_dir in chunks of chunk_size and returns the manifest.
+    jobs is consumed lazily, so a directory walk of any size never sits in memory.
+    """
+    if os.path.exists(os.path.join(queue_dir, _MANIFEST)):
+        raise FileExistsError(f"queue already exists: {queue_dir}")
+    for folder in ("chunks", "leases", "done"):
+        os.makedirs(os.path.join(queue_dir, folder), exist_ok=True)
+
+    chunks = 0
+    files = 0
+    current: List[Dict[str, Any]] = []
+
+    def flush():
+        nonlocal chunks, files
+        _write_json(os.path.join(queue_dir, "chunks", chunk_name(chunks)), current)
+        chunks += 1
+        files += len(current)
+        current.clear()
+
+    for job in jobs:
+        current.append(asdict(job))
+        if len(current) == chunk_size:
+            flush()
+    if current:
+        flush()
+
+    manifest = {
+        "version": QUEUE_VERSION, "chunks": chunks, "files": files, "chunk_size": chunk_size,
+        "lease_ttl": lease_ttl, "created": time.time()
+    }
+    _write_json(os.path.join(queue_dir, _MANIFEST), manifest)
+    return manifest
+
+
+class WorkQueue:
+    """
+    One worker's handle on a queue folder: claims, renews and completes chunks.
+    Every state change is a single atomic file operation (exclusive create, rename,
+    replace), which shared filesystems provide without any lock service.
+    """
+
+    def __init__(self, queue_dir: str, worker_id: Optional[str] = None):
+        manifest = _read_json(os.path.join(queue_dir, _MANIFEST))
+        if manifest is None:
+            raise FileNotFoundError(f"no queue in {queue_dir} (manifest.json missing)")
+        if manifest.get("version") != QUEUE_VERSION:
+            raise ValueError(f"unsupported queue version: {manifest.get('version')}")
+        self.queue_dir = queue_dir
+        self.worker_id = worker_id or default_worker_id()
+        self.chunks: int = manifest["chunks"]
+        self.files: int = manifest["files"]
+        self.lease_ttl: float = manifest["lease_ttl"]
+        # Workers scan from different offsets, so they don't all race for the same chunk
+        self._offset = zlib.crc32(self.worker_id.encode()) % max(self.chunks, 1)
+        # chunk -> token of the leases held by this worker
+        self._tokens: Dict[int, str] = {}
+
+    def _path(self, folder: str, chunk: int) -> str:
+        return os.path.join(self.queue_dir, folder, chunk_name(chunk))
+
+    def done_chunks(self) -> Set[int]:
+        return _listed_chunks(os.path.join(self.queue_dir, "done"))
+
+    def is_finished(self) -> bool:
+        return len(self.done_chunks()) >= self.chunks
+
+    def load_jobs(self, chunk: int) -> List[BatchJob]:
+        with open(self._path("chunks", chunk), "r", encoding="utf-8") as f:
+            return [BatchJob(**job) for job in json.load(f)]
+
+    # --- leases ---
+
+    def _lease_record(self, token: str) -> Dict[str, Any]:
+        return {"worker": self.worker_id, "token": token, "expires": time.time() + self.lease_ttl}
+
+    def read_lease(self, chunk: int) -> Optional[Dict[str, Any]]:
+        """The lease on chunk, None if unclaimed. A lease still being written expires lease_ttl after its mtime."""
+        path = self._path("leases", chunk)
+        lease = _read_json(path)
+        if lease is None:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                return None
+            return {"worker": None, "token": None, "expires": mtime + self.lease_ttl}
+        return lease
+
+    def _create_lease(self, chunk: int) -> bool:
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(self._path("leases", chunk), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._lease_record(token), f)
+        self._tokens[chunk] = token
+        return True
+
+    def _take_over(self, chunk: int, expired: Dict[str, Any]) -> bool:
+        """
+        Claims a chunk whose lease expired. The lease is renamed away first: of several
+        workers only one rename succeeds, and if the file changed since it was read
+        (renewed or claimed again) it is put back. A renewal keeps the token, so the
+        whole record is compared, not just the token.
+        """
+        path = self._path("leases", chunk)
+        stale = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return False
+        taken = _read_json(stale)
+        if taken is not None and taken != expired:
+            try:
+                os.link(stale, path)
+            except OSError:
+                # Claimed again meanwhile, or no hardlinks: the owner notices at its next renewal
+                pass
+            os.unlink(stale)
+            return False
+        os.unlink(stale)
+        logger.info("chunk %d: lease of %s expired, taking over", chunk, expired.get("worker"))
+        return self._create_lease(chunk)
+
+    def claim(self) -> Optional[int]:
+        """Leases a chunk that is neither done nor validly leased; None if there is none right now."""
+        done = self.done_chunks()
+        leased = _listed_chunks(os.path.join(self.queue_dir, "leases"))
+        order = [(self._offset + i) % self.chunks for i in range(self.chunks)]
+        now = time.time()
+        for chunk in order:
+            if chunk in done:
+                continue
+            if chunk in leased:
+                lease = self.read_lease(chunk)
+                if lease is None or lease["expires"] >= now or not self._take_over(chunk, lease):
+                    continue
+            elif not self._create_lease(chunk):
+                continue
+            # Completed between the listing and the claim
+            if os.path.exists(self._path("done", chunk)):
+                self.release(chunk)
+                continue
+            return chunk
+        return None
+
+    def renew(self, chunk: int) -> bool:
+        """Extends this worker's lease on chunk; False if it expired and was taken over."""
+        token = self._tokens.get(chunk)
+        lease = _read_json(self._path("leases", chunk))
+        if token is None or lease is None or lease.get("token") != token:
+            self._tokens.pop(chunk, None)
+            return False
+        _write_json(self._path("leases", chunk), self._lease_record(token))
+        return True
+
+    def release(self, chunk: int):
+        """Drops this worker's lease on chunk (a lease taken over by another worker is left alone)."""
+        token = self._tokens.pop(chunk, None)
+        lease = _read_json(self._path("leases", chunk))
+        if token is not None and lease is not None and lease.get("token") == token:
+            try:
+                os.unlink(self._path("leases", chunk))
+            except FileNotFoundError:
+                pass
+
+    # --- completion ---
+
+    def complete(self, chunk: int, records: List[Dict[str, Any]], started: float, finished: float):
+        """Writes the completion record of chunk; records hold one entry per file (see QueueWorker)."""
+        _write_json(self._path("done", chunk), {
+            "chunk": chunk, "worker": self.worker_id, "started": started, "finished": finished,
+            "results": records
+        })
+
+    def status(self) -> QueueStatus:
+        """Progress and aggregate throughput of all workers, from the completion records."""
+        status = QueueStatus(chunks=self.chunks, files=self.files)
+        done = self.done_chunks()
+        for chunk in done:
+            record = _read_json(self._path("done", chunk))
+            if record is None:
+                continue
+            status.done_chunks += 1
+            files = record["results"]
+            failed = sum(1 for entry in files if entry["error"])
+            status.failed += failed
+            status.processed += len(files) - failed
+            status.input_mb += sum(entry["original_size_mb"] for entry in files)
+            status.output_mb += sum(entry["compressed_size_mb"] for entry in files)
+            status.workers[record["worker"]] = status.workers.get(record["worker"], 0) + len(files)
+            status.started = record["started"] if status.started is None else min(status.started, record["started"])
+            status.finished = max(status.finished or record["finished"], record["finished"])
+
+        now = time.time()
+        for chunk in _listed_chunks(os.path.join(self.queue_dir, "leases")) - done:
+            lease = self.read_lease(chunk)
+            if lease is None:
+                continue
+            if lease["expires"] >= now:
+                status.leased_chunks += 1
+            else:
+                status.expired_leases += 1
+        return status
+
+
+class QueueWorker:
+    """
+    Claims chunks until every chunk of the queue is done and compresses each one
+    with a fresh BatchScheduler from make_scheduler. A heartbeat thread renews the
+    lease every lease_ttl / 3; if it is lost, the chunk is cancelled and left to
+    its new owner. wait=False returns as soon as nothing is claimable instead of
+    waiting for other workers' leases to finish or expire.
+    """
+
+    def __init__(
+        self, queue: WorkQueue, make_scheduler: Callable[[], BatchScheduler], wait: bool = True,
+        poll_interval: float = DEFAULT_POLL_INTERVAL
+    ):
+        self.queue = queue
+        self.make_scheduler = make_scheduler
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.summary = BatchSummary()
+        self.chunks_done = 0
+        self._stop = threading.Event()
+        self._scheduler: Optional[BatchScheduler] = None
+
+    def stop(self):
+        """Thread-safe. The current chunk is cancelled and released for other workers."""
+        self._stop.set()
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+
+    def run(
+        self, on_result: Optional[Callable[[BatchJob, Optional[CompressionResult], Optional[str]], None]] = None
+    ) -> BatchSummary:
+        """Returns the results of the chunks this worker completed."""
+        while not self._stop.is_set():
+            chunk = self.queue.claim()
+            if chunk is not None:
+                self.run_chunk(chunk, on_result)
+            elif not self.wait or self.queue.is_finished():
+                break
+            else:
+                self._stop.wait(self.poll_interval)
+        self.summary.cancelled = self._stop.is_set()
+        return self.summary
+
+    def run_chunk(self, chunk: int, on_result=None) -> bool:
+        """Compresses a claimed chunk; True if its completion record was written."""
+        scheduler = self._scheduler = self.make_scheduler()
+        if self._stop.is_set():
+            scheduler.cancel()
+        lost = threading.Event()
+        finished = threading.Event()
+
+        def heartbeat():
+            while not finished.wait(self.queue.lease_ttl / 3):
+                if not self.queue.renew(chunk):
+                    logger.warning("chunk %d: lease lost, leaving the chunk to its new owner", chunk)
+                    lost.set()
+                    scheduler.cancel()
+                    return
+
+        records = []
+
+        def collect(job, result, error):
+            records.append({
+                "input_path": job.input_path,
+                "output_path": result.output_path if result is not None else job.output_path,
+                "original_size_mb": result.original_size_mb if result is not None else 0.0,
+                "compressed_size_mb": result.compressed_size_mb if result is not None else 0.0,
+                "error": error,
+            })
+            if on_result:
+                on_result(job, result, error)
+
+        thread = threading.Thread(target=heartbeat, name=f"lease-{chunk}", daemon=True)
+        thread.start()
+        started = time.time()
+        try:
+            summary = scheduler.run(self.queue.load_jobs(chunk), on_result=collect)
+        finally:
+            finished.set()
+            thread.join()
+            self._scheduler = None
+
+        if lost.is_set() or summary.cancelled:
+            self.queue.release(chunk)
+            return False
+        self.queue.complete(chunk, records, started, time.time())
+        self.queue.release(chunk)
+        self.summary.results.extend(summary.results)
+        self.summary.failures.extend(summary.failures)
+        self.chunks_done += 1
+        logger.info("chunk %d: %d files in %.2fs", chunk, len(records), time.time() - started)
+        return True
+
+
+def _run_node(queue_dir: str, worker_id: str, scheduler_options: Dict[str, Any], poll_interval: float):
+    """Entry point of a local stand-in node (must stay module-level to be picklable)."""
+    queue = WorkQueue(queue_dir, worker_id)
+    QueueWorker(queue, lambda: BatchScheduler(**scheduler_options), poll_interval=poll_interval).run()
+
+
+def run_local_nodes(
+    queue_dir: str, nodes: int, scheduler_options: Optional[Dict[str, Any]] = None,
+    poll_interval: float = DEFAULT_POLL_INTERVAL
+) -> QueueStatus:
+    """
+    Runs `nodes` worker processes on this machine, standing in for separate hosts,
+    until the queue is finished; returns its status. Each node runs its own
+    BatchScheduler pool (scheduler_options are its keyword arguments).
+    """
+    base_id = default_worker_id()
+    processes = [
+        _NODE_CONTEXT.Process(
+            target=_run_node, name=f"node-{i}",
+            args=(queue_dir, f"{base_id}-node{i}", scheduler_options or {}, poll_interval)
+        )
+        for i in range(nodes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    for process in processes:
+        if process.exitcode:
+            logger.error("%s exited with code %s", process.name, process.exitcode)
+    return WorkQueue(queue_dir).status()